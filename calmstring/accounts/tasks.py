@@ -0,0 +1,33 @@
+from django.core.mail import send_mail
+from django.utils.translation import gettext_lazy as _
+from django.template.loader import render_to_string
+from huey.contrib.djhuey import db_task
+
+from utils.task_queue import Priorities
+from . import conf
+
+
+@db_task(priority=Priorities.EMAIL, retries=3, retry_delay=60)
+def send_verification_email(email, code):
+    """
+    Sends verification email to user
+    """
+
+    html_message = render_to_string(
+        "accounts/verification_email.html",
+        {
+            "code": code,
+            "expiration_minutes": int(conf.ACCOUNTS_CODE_EXPIRATION_TIME / 60),
+        },
+    )
+
+    send_mail(
+        _("Verify your email address"),
+        "Thanks for starting the new Calmstring account creation process. We want to make sure it's really you. Please enter the following verification code when prompted. If you don’t want to create an account, you can ignore this message.\n\nVerification code:\n{}\n(This code is valid for {} minutes)\n\nThanks,\nThe Calmstring team".format(
+            code, int(conf.ACCOUNTS_CODE_EXPIRATION_TIME / 60)
+        ),
+        None,
+        [email],
+        fail_silently=False,
+        html_message=html_message,
+    )
@@ -76,6 +76,7 @@ MIDDLEWARE = [
     "django.contrib.auth.middleware.AuthenticationMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    "utils.outbox.OutboxMiddleware",
 ]
 
 ROOT_URLCONF = "calmstring.urls"
@@ -160,10 +161,31 @@ ROOM_MODEL = "rooms.Room"
 
 # Huey settings
 # https://huey.readthedocs.io/en/latest/
-HUEY = {
-    "huey_class": "huey.MemoryHuey",
-    # "filename": BASE_DIR / "huey.db",
-    "immediate": True,
+# By default tasks run in place, HUEY_STORAGE=sqlite or redis enqueues them for
+# consumer started with `python manage.py run_huey`
+HUEY_STORAGE = os.environ.get("HUEY_STORAGE", "memory")
+
+if HUEY_STORAGE == "sqlite":
+    HUEY = {
+        "huey_class": "utils.task_queue.MetricsSqliteHuey",
+        "filename": os.environ.get("HUEY_FILENAME", str(BASE_DIR / "huey.db")),
+        "immediate": False,
+    }
+elif HUEY_STORAGE == "redis":
+    HUEY = {
+        "huey_class": "utils.task_queue.MetricsPriorityRedisHuey",
+        "url": os.environ.get("HUEY_REDIS_URL", os.environ.get("REDIS_URL")),
+        "immediate": False,
+    }
+else:
+    HUEY = {
+        "huey_class": "utils.task_queue.MetricsMemoryHuey",
+        "immediate": True,
+    }
+
+HUEY["consumer"] = {
+    "workers": int(os.environ.get("HUEY_WORKERS", 4)),
+    "worker_type": os.environ.get("HUEY_WORKER_TYPE", "thread"),  # or "process"
 }
 
 # allauth settings
@@ -204,6 +226,12 @@ if DEBUG:
 
 CALMSTRING = {}
 
+# Shared cache, when not set huey sqlite storage (or process local store when tasks
+# run in place) is used
+REDIS_URL = os.environ.get("REDIS_URL", None)
+if not REDIS_URL and HUEY_STORAGE == "redis":
+    REDIS_URL = HUEY["url"]
+
 
 # Email configuration
 # https://docs.djangoproject.com/en/3.2/topics/email/
@@ -20,6 +20,7 @@ api_urlpatterns = [
     path("auth/", include("accounts.urls")),
     path("events/", include("events.urls")),
     path("rooms/", include("rooms.urls")),
+    path("changes/", include("changes.urls")),
 ]
 
 urlpatterns = [
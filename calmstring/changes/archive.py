@@ -0,0 +1,212 @@
+"""Archive of old changes in append-only, gzip compressed NDJSON segment files.
+
+Every archival run writes new segment file to CHANGES_ARCHIVE_DIR, changes of each
+object are written as separate gzip member, so they can be read without decompressing
+whole segment. ChangeArchiveEntry rows point to the members.
+
+Changes of object are archived only up to its latest checkpoint created before the
+cutoff, so every change left in the table still replays from a checkpoint in the table
+and the head of object is never archived. Archived changes keep full state in changes
+(as checkpoints), snapshots of archived changes are removed with them.
+"""
+
+import gzip
+import json
+import os
+import uuid
+from contextlib import ExitStack
+from datetime import datetime, timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Change, ChangeArchiveEntry
+from . import conf
+
+FIELDS = (
+    "id",
+    "uuid",
+    "created_at",
+    "updated_at",
+    "author_id",
+    "name",
+    "message",
+    "message_params",
+    "type",
+    "parent_id",
+    "content_type_id",
+    "content_id",
+    "object_uuid",
+    "metadata",
+    "content_hash",
+)
+
+
+def get_segment_path(segment: str) -> str:
+    return os.path.join(conf.CHANGES_ARCHIVE_DIR, segment)
+
+
+def new_segment() -> str:
+    return f"changes-{timezone.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}.ndjson.gz"
+
+
+def get_archive_boundaries(before: datetime) -> dict:
+    """Returns {object_uuid: id} of the latest checkpoints created before <before>,
+    older changes of objects can be archived"""
+    return dict(
+        Change.objects.filter(created_at__lt=before, delta_depth=0)
+        .values("object_uuid")
+        .annotate(boundary_id=Max("id"))
+        .values_list("object_uuid", "boundary_id")
+    )
+
+
+def get_rows(boundaries: dict) -> dict:
+    """Returns {object_uuid: [row]} of changes older than boundaries, with full states"""
+    rows = {}
+    for object_uuid, boundary_id in boundaries.items():
+        changes = (
+            Change.objects.filter(object_uuid=object_uuid, id__lt=boundary_id)
+            .order_by("id")
+            .values(*FIELDS, "changes", "removed", "delta_depth")
+        )
+
+        object_rows = []
+        state = {}
+        for change in changes:
+            if change.pop("delta_depth") == 0:
+                state = {}
+            state = {**state, **change.pop("changes")}
+            for field_name in change.pop("removed"):
+                state.pop(field_name, None)
+            object_rows.append({**change, "changes": state})
+
+        if object_rows:
+            rows[object_uuid] = object_rows
+    return rows
+
+
+def archive_changes(before: datetime = None, chunk_size: int = 100) -> int:
+    """Moves changes created before <before> to new segment file.
+
+    Args:
+        before (datetime, optional): Defaults to now - CHANGES_ARCHIVE_AGE.
+        chunk_size (int, optional): Number of objects archived in one transaction.
+            Defaults to 100.
+
+    Returns:
+        int: number of archived changes
+    """
+    if before is None:
+        before = timezone.now() - timedelta(seconds=conf.CHANGES_ARCHIVE_AGE)
+
+    boundaries = list(get_archive_boundaries(before).items())
+
+    segment = new_segment()
+    archived = 0
+    with ExitStack() as stack:
+        file = None
+        for start in range(0, len(boundaries), chunk_size):
+            rows = get_rows(dict(boundaries[start : start + chunk_size]))
+            if not rows:
+                continue
+
+            # segment is created with the first archived rows
+            if file is None:
+                os.makedirs(conf.CHANGES_ARCHIVE_DIR, exist_ok=True)
+                file = stack.enter_context(open(get_segment_path(segment), "ab"))
+
+            entries = []
+            for object_uuid, object_rows in rows.items():
+                data = "".join(
+                    json.dumps(row, cls=DjangoJSONEncoder) + "\n" for row in object_rows
+                )
+                member = gzip.compress(data.encode())
+                entries.append(
+                    ChangeArchiveEntry(
+                        object_uuid=object_uuid,
+                        segment=segment,
+                        offset=file.tell(),
+                        size=len(member),
+                        count=len(object_rows),
+                        first_change_id=object_rows[0]["id"],
+                        first_created_at=object_rows[0]["created_at"],
+                        last_created_at=object_rows[-1]["created_at"],
+                    )
+                )
+                file.write(member)
+
+            # rows are deleted only when they are safely in segment
+            file.flush()
+            os.fsync(file.fileno())
+
+            ids = [row["id"] for object_rows in rows.values() for row in object_rows]
+            with transaction.atomic():
+                ChangeArchiveEntry.objects.bulk_create(entries)
+                for start_id in range(0, len(ids), 500):
+                    Change.objects.filter(
+                        id__in=ids[start_id : start_id + 500]
+                    ).delete()
+            archived += len(ids)
+
+    return archived
+
+
+def read_entry(entry: ChangeArchiveEntry) -> list:
+    """Returns rows of changes stored in archive entry"""
+    with open(get_segment_path(entry.segment), "rb") as file:
+        file.seek(entry.offset)
+        data = gzip.decompress(file.read(entry.size))
+
+    rows = []
+    for line in data.decode().splitlines():
+        row = json.loads(line)
+        row["uuid"] = uuid.UUID(row["uuid"])
+        row["object_uuid"] = uuid.UUID(row["object_uuid"])
+        for field_name in ("created_at", "updated_at"):
+            if row[field_name]:
+                row[field_name] = parse_datetime(row[field_name])
+        rows.append(row)
+    return rows
+
+
+def get_archived_rows(
+    object_uuids, until: datetime = None, after: datetime = None
+) -> list:
+    """Returns rows of archived changes of objects (created after <after> and until
+    <until>), ordered by object_uuid and id. Object_uuids None reads changes of all
+    objects."""
+    entries = ChangeArchiveEntry.objects.all()
+    if object_uuids is not None:
+        entries = entries.filter(object_uuid__in=object_uuids)
+    if until is not None:
+        entries = entries.filter(first_created_at__lte=until)
+    if after is not None:
+        entries = entries.filter(last_created_at__gt=after)
+
+    rows = []
+    for entry in entries.order_by("object_uuid", "first_change_id"):
+        rows.extend(
+            row
+            for row in read_entry(entry)
+            if (until is None or row["created_at"] <= until)
+            and (after is None or row["created_at"] > after)
+        )
+    return rows
+
+
+def get_archived_changes(object_uuid) -> list:
+    """Returns archived changes of object as unsaved Change objects, ordered by id"""
+    changes = [
+        Change(**row, removed=[], delta_depth=0)
+        for row in get_archived_rows([object_uuid])
+    ]
+
+    by_id = {change.id: change for change in changes}
+    for change in changes:
+        if change.parent_id in by_id:
+            change.parent = by_id[change.parent_id]
+    return changes
@@ -0,0 +1,34 @@
+import os
+import sys
+from django.conf import settings as dj_settings
+
+
+class Conf:
+    def _setting(self, name, default):
+        conf = getattr(dj_settings, "CALMSTRING", {})
+        return conf.get(name, default)
+
+    @property
+    def CHANGES_CHECKPOINT_INTERVAL(self):
+        return self._setting("CHANGES_CHECKPOINT_INTERVAL", 10)
+
+    @property
+    def CHANGES_SNAPSHOT_INTERVAL(self):
+        return self._setting("CHANGES_SNAPSHOT_INTERVAL", 100)
+
+    @property
+    def CHANGES_ARCHIVE_AGE(self):
+        """Age (seconds) of changes moved to archive segments"""
+        return self._setting("CHANGES_ARCHIVE_AGE", 60 * 60 * 24 * 180)
+
+    @property
+    def CHANGES_ARCHIVE_DIR(self):
+        return self._setting(
+            "CHANGES_ARCHIVE_DIR", os.path.join(dj_settings.BASE_DIR, "changes_archive")
+        )
+
+
+conf = Conf()
+
+conf.__name__ = __name__
+sys.modules[__name__] = conf
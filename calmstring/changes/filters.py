@@ -0,0 +1,12 @@
+from django_filters import rest_framework as filters
+from .models import Change
+
+
+class ChangeFeedFilter(filters.FilterSet):
+    author = filters.UUIDFilter(field_name="author__uuid")
+    created_after = filters.DateTimeFilter(field_name="created_at", lookup_expr="gte")
+    created_before = filters.DateTimeFilter(field_name="created_at", lookup_expr="lt")
+
+    class Meta:
+        model = Change
+        fields = ["object_uuid", "type"]
@@ -0,0 +1,135 @@
+from datetime import datetime
+import uuid
+
+from django.db import IntegrityError, transaction
+from django.db.models import Max, Q
+
+from .models import Change, ChangeSnapshot, parse_content_key
+from . import archive, conf
+
+
+def get_snapshots(object_uuids, at: datetime) -> list:
+    """Returns snapshots of objects created until <at>, ordered by change"""
+    return list(
+        ChangeSnapshot.objects.filter(object_uuid__in=object_uuids, created_at__lte=at)
+        .order_by("change_id")
+        .select_related("change")
+    )
+
+
+def get_states_at(object_uuids, at: datetime) -> dict:
+    """Reconstructs states of all content objects of changes of object_uuids as they
+    were at <at>. Archived changes are read first, then snapshots created until <at>
+    are merged, each of them keeps states of objects changed since the previous one.
+    Changes after the latest snapshot of every object are replayed in single ordered
+    pass. Nothing is written, snapshots are stored when changes are created.
+
+    Args:
+        object_uuids (list): uuids of changed objects
+        at (datetime): point in time
+
+    Returns:
+        dict: {object_uuid: {(content_type_id, content_id): state}}
+    """
+    object_uuids = [uuid.UUID(str(object_uuid)) for object_uuid in object_uuids]
+
+    states = {object_uuid: {} for object_uuid in object_uuids}
+    # full state of the last replayed change of object, deltas are applied to it
+    chain_states = {}
+
+    # archived changes keep full states, snapshots of them are removed with them
+    for row in archive.get_archived_rows(object_uuids, until=at):
+        object_uuid = row["object_uuid"]
+        chain_states[object_uuid] = row["changes"]
+        states[object_uuid][(row["content_type_id"], row["content_id"])] = row[
+            "changes"
+        ]
+
+    latest_snapshots = {}
+    for snapshot in get_snapshots(object_uuids, at):
+        object_uuid = snapshot.object_uuid
+        states[object_uuid].update(
+            (parse_content_key(key), state) for key, state in snapshot.states.items()
+        )
+        chain_states[object_uuid] = states[object_uuid][
+            (snapshot.change.content_type_id, snapshot.change.content_id)
+        ]
+        latest_snapshots[object_uuid] = snapshot
+
+    replay_from = Q(
+        object_uuid__in=[u for u in object_uuids if u not in latest_snapshots]
+    )
+    for object_uuid, snapshot in latest_snapshots.items():
+        replay_from |= Q(object_uuid=object_uuid, id__gt=snapshot.change_id)
+
+    rows = (
+        Change.objects.filter(replay_from, created_at__lte=at)
+        .order_by("object_uuid", "id")
+        .values_list(
+            "object_uuid",
+            "content_type_id",
+            "content_id",
+            "changes",
+            "removed",
+            "delta_depth",
+        )
+    )
+
+    for (
+        object_uuid,
+        content_type_id,
+        content_id,
+        changes,
+        removed,
+        delta_depth,
+    ) in rows.iterator(chunk_size=500):
+        if delta_depth == 0:
+            state = dict(changes)
+        else:
+            state = {**chain_states.get(object_uuid, {}), **changes}
+            for field_name in removed:
+                state.pop(field_name, None)
+
+        chain_states[object_uuid] = state
+        states[object_uuid][(content_type_id, content_id)] = state
+
+    return states
+
+
+def store_snapshots(object_uuids) -> int:
+    """Stores snapshot every CHANGES_SNAPSHOT_INTERVAL changes of objects after their
+    latest snapshot, for changes created before snapshots were stored on write.
+
+    Args:
+        object_uuids (list): uuids of changed objects
+
+    Returns:
+        int: number of stored snapshots
+    """
+    interval = conf.CHANGES_SNAPSHOT_INTERVAL
+    latest_change_ids = dict(
+        ChangeSnapshot.objects.filter(object_uuid__in=object_uuids)
+        .values("object_uuid")
+        .annotate(latest_change_id=Max("change_id"))
+        .values_list("object_uuid", "latest_change_id")
+    )
+
+    stored = 0
+    for object_uuid in object_uuids:
+        changes = (
+            Change.objects.filter(
+                object_uuid=object_uuid,
+                id__gt=latest_change_ids.get(object_uuid, 0),
+            )
+            .order_by("id")
+            .only("id", "object_uuid", "created_at")
+        )
+        for change in changes[interval - 1 :: interval]:
+            try:
+                with transaction.atomic():
+                    ChangeSnapshot.store(change)
+            except IntegrityError:
+                # snapshot of change was stored on write meanwhile
+                continue
+            stored += 1
+    return stored
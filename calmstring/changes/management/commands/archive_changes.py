@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from changes import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Moves changes older than CHANGES_ARCHIVE_AGE to new gzip compressed NDJSON "
+        "segment in CHANGES_ARCHIVE_DIR."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--age",
+            type=int,
+            default=None,
+            help="Age in seconds of archived changes. Defaults to CHANGES_ARCHIVE_AGE.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100,
+            help="Number of objects whose changes are archived at once.",
+        )
+
+    def handle(self, *args, **options):
+        before = None
+        if options["age"] is not None:
+            before = timezone.now() - timedelta(seconds=options["age"])
+
+        archived = archive.archive_changes(before, chunk_size=options["chunk_size"])
+
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} changes"))
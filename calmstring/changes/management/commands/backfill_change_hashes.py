@@ -0,0 +1,93 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from changes.models import Change, ChangeHead, get_content_hash
+
+
+class Command(BaseCommand):
+    help = (
+        "Sets content hash of changes created before hashes were stored and of "
+        "heads of their objects. States are replayed once per object in order of "
+        "changes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100,
+            help="Number of objects whose changes are read and written at once.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+
+        object_uuids = sorted(
+            set(
+                Change.objects.filter(content_hash="").values_list(
+                    "object_uuid", flat=True
+                )
+            )
+            | set(
+                ChangeHead.objects.filter(content_hash="").values_list(
+                    "object_uuid", flat=True
+                )
+            )
+        )
+        total = len(object_uuids)
+
+        updated = 0
+        for start in range(0, total, chunk_size):
+            chunk = object_uuids[start : start + chunk_size]
+            changes, latest_hashes = self.hash_changes(chunk)
+            Change.objects.bulk_update(changes, ["content_hash"], batch_size=500)
+            self.set_heads_hash(chunk, latest_hashes)
+
+            updated += len(changes)
+            self.stdout.write(
+                f"Processed {min(start + chunk_size, total)}/{total} objects"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Set hash of {updated} changes"))
+
+    def hash_changes(self, object_uuids):
+        """Returns Change objects with missing content hash of given objects and
+        {object_uuid: (id, content hash)} of their latest changes"""
+        rows = (
+            Change.objects.filter(object_uuid__in=object_uuids)
+            .order_by("object_uuid", "id")
+            .values_list(
+                "id", "object_uuid", "changes", "removed", "delta_depth", "content_hash"
+            )
+        )
+
+        changes = []
+        latest_hashes = {}
+        state = {}
+        for id, object_uuid, delta, removed, delta_depth, content_hash in rows:
+            if delta_depth == 0:
+                state = {}
+            state.update(delta)
+            for field_name in removed:
+                state.pop(field_name, None)
+
+            if not content_hash:
+                content_hash = get_content_hash(state)
+                changes.append(Change(id=id, content_hash=content_hash))
+            latest_hashes[object_uuid] = (id, content_hash)
+        return changes, latest_hashes
+
+    def set_heads_hash(self, object_uuids, latest_hashes):
+        """Sets hash of heads still pointing to the latest change that was hashed,
+        heads moved meanwhile already have hash of their new change"""
+        with transaction.atomic():
+            heads = ChangeHead.objects.select_for_update().filter(
+                object_uuid__in=object_uuids
+            )
+            updated_heads = []
+            for head in heads:
+                change_id, content_hash = latest_hashes.get(head.object_uuid, (0, ""))
+                if head.change_id == change_id and head.content_hash != content_hash:
+                    head.content_hash = content_hash
+                    updated_heads.append(head)
+            ChangeHead.objects.bulk_update(updated_heads, ["content_hash"])
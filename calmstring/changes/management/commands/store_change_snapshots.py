@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from changes import logic
+from changes.models import Change
+
+
+class Command(BaseCommand):
+    help = (
+        "Stores snapshots of changes created before snapshots were stored on write, "
+        "every CHANGES_SNAPSHOT_INTERVAL changes of object after its latest snapshot."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100,
+            help="Number of objects whose snapshots are stored at once.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+
+        object_uuids = sorted(
+            set(Change.objects.values_list("object_uuid", flat=True).distinct())
+        )
+        total = len(object_uuids)
+
+        stored = 0
+        for start in range(0, total, chunk_size):
+            stored += logic.store_snapshots(object_uuids[start : start + chunk_size])
+            self.stdout.write(
+                f"Processed {min(start + chunk_size, total)}/{total} objects"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"Stored {stored} snapshots"))
@@ -0,0 +1,46 @@
+"""Lazily rendered names of changes.
+
+Instead of rendered name change may keep message key and small dict of params, which
+are rendered when history is read, in active language. Apps register renderer for keys
+of their messages, renderer gets all changes with its keys at once, so it can resolve
+params (eg. names of rooms) with single query.
+"""
+
+from collections import defaultdict
+
+renderers = {}
+
+
+def register(keys, renderer):
+    """Registers renderer of messages with given keys
+
+    Args:
+        keys (Iterable[str]): message keys
+        renderer (callable): Takes list of changes, returns list of their names
+    """
+    for key in keys:
+        renderers[key] = renderer
+
+
+def render_names(changes) -> list:
+    """Renders names of changes, changes without message (or with unknown one) keep
+    their stored name
+
+    Returns:
+        list: names in order of changes
+    """
+    changes = list(changes)
+    names = [change.name for change in changes]
+
+    grouped = defaultdict(list)
+    for index, change in enumerate(changes):
+        renderer = renderers.get(change.message)
+        if renderer:
+            grouped[renderer].append(index)
+
+    for renderer, indexes in grouped.items():
+        rendered = renderer([changes[index] for index in indexes])
+        for index, name in zip(indexes, rendered):
+            names[index] = name
+
+    return names
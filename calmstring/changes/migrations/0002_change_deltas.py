@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 00:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='delta_depth',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='change',
+            name='removed',
+            field=models.JSONField(blank=True, default=list),
+        ),
+    ]
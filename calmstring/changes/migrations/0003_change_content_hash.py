@@ -0,0 +1,22 @@
+# Generated by Django 3.2 on 2026-10-18 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changes', '0002_change_deltas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['object_uuid', 'content_hash'], name='changes_cha_object__01f440_idx'),
+        ),
+    ]
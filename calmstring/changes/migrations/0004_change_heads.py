@@ -0,0 +1,62 @@
+# Generated by Django 3.2 on 2026-10-18 01:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_heads(apps, schema_editor):
+    Change = apps.get_model("changes", "Change")
+    ChangeHead = apps.get_model("changes", "ChangeHead")
+
+    latest = list(
+        Change.objects.values("object_uuid")
+        .annotate(latest_id=models.Max("id"), version=models.Count("id"))
+        .order_by()
+    )
+    for start in range(0, len(latest), 500):
+        chunk = latest[start : start + 500]
+        hashes = dict(
+            Change.objects.filter(
+                id__in=[row["latest_id"] for row in chunk]
+            ).values_list("id", "content_hash")
+        )
+        ChangeHead.objects.bulk_create(
+            [
+                ChangeHead(
+                    object_uuid=row["object_uuid"],
+                    change_id=row["latest_id"],
+                    content_hash=hashes[row["latest_id"]],
+                    version=row["version"],
+                )
+                for row in chunk
+            ]
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changes', '0003_change_content_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeHead',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_uuid', models.UUIDField(unique=True)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('version', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='change',
+            index=models.Index(fields=['object_uuid', 'id'], name='changes_cha_object__2d1df2_idx'),
+        ),
+        migrations.AddField(
+            model_name='changehead',
+            name='change',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='changes.change'),
+        ),
+        migrations.RunPython(create_heads, migrations.RunPython.noop),
+    ]
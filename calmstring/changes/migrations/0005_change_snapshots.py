@@ -0,0 +1,28 @@
+# Generated by Django 3.2 on 2026-10-18 01:03
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('changes', '0004_change_heads'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChangeSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_uuid', models.UUIDField()),
+                ('created_at', models.DateTimeField()),
+                ('states', models.JSONField(default=dict)),
+                ('change', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='changes.change')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='changesnapshot',
+            index=models.Index(fields=['object_uuid', 'created_at'], name='changes_cha_object__668217_idx'),
+        ),
+    ]
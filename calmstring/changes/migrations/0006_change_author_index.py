@@ -0,0 +1,19 @@
+# Generated by Django 3.2 on 2026-10-18 01:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("changes", "0005_change_snapshots"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="change",
+            index=models.Index(
+                fields=["author", "id"], name="changes_cha_author__f7a390_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2 on 2026-10-18 01:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("changes", "0006_change_author_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="change",
+            name="message",
+            field=models.CharField(blank=True, default="", max_length=100),
+        ),
+        migrations.AddField(
+            model_name="change",
+            name="message_params",
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2 on 2026-10-18 01:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("changes", "0007_change_message"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ChangeArchiveEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("object_uuid", models.UUIDField()),
+                ("segment", models.CharField(max_length=255)),
+                ("offset", models.PositiveBigIntegerField()),
+                ("size", models.PositiveIntegerField()),
+                ("count", models.PositiveIntegerField()),
+                ("first_change_id", models.PositiveBigIntegerField()),
+                ("first_created_at", models.DateTimeField(null=True)),
+                ("last_created_at", models.DateTimeField(null=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="changearchiveentry",
+            index=models.Index(
+                fields=["object_uuid", "first_change_id"],
+                name="changes_cha_object__e95e05_idx",
+            ),
+        ),
+    ]
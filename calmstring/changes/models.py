@@ -1,15 +1,27 @@
+import hashlib
 import json
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
 from django.dispatch import receiver
 
 
 from utils.models import UUIDModel, TimestampsModel
 
 from .signals import change_reverted, change_done
+from . import conf, messages
+
+
+def content_key(content_type_id, content_id) -> str:
+    return f"{content_type_id}:{content_id}"
+
+
+def parse_content_key(key: str) -> tuple:
+    content_type_id, content_id = key.split(":")
+    return int(content_type_id), int(content_id)
 
 
 class ChangeTypeError(Exception):
@@ -28,7 +40,22 @@ def metadata_default_value():
     return {"reverted_from": None, "hidden": False}
 
 
+def get_content_hash(state: dict) -> str:
+    """Stable hash of full state of change, independent of keys order"""
+    data = json.dumps(
+        state, sort_keys=True, separators=(",", ":"), cls=DjangoJSONEncoder
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
 class Change(UUIDModel, TimestampsModel):
+    """Version of object identified by object_uuid.
+
+    Every CHANGES_CHECKPOINT_INTERVAL-th change of object is a checkpoint which keeps
+    all fields in changes, others keep just fields that differ from parent (and names
+    of fields removed since parent). Full state of change is rebuilt by get_state().
+    """
+
     author = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         verbose_name="Change author",
@@ -51,6 +78,192 @@ class Change(UUIDModel, TimestampsModel):
 
     metadata = models.JSONField(default=metadata_default_value)
 
+    removed = models.JSONField(default=list, blank=True)
+    # number of changes since the last checkpoint, 0 for checkpoints
+    delta_depth = models.PositiveIntegerField(default=0)
+    # hash of full state, see get_content_hash()
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+    # key and params of name rendered on read, see changes.messages
+    message = models.CharField(max_length=100, blank=True, default="")
+    message_params = models.JSONField(default=dict, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["object_uuid", "content_hash"]),
+            models.Index(fields=["object_uuid", "id"]),
+            models.Index(fields=["author", "id"]),
+        ]
+
+    def get_name(self) -> str:
+        """Name of change, rendered from message if change has one"""
+        return messages.render_names([self])[0]
+
+    @property
+    def is_checkpoint(self):
+        return self.delta_depth == 0
+
+    def get_state(self) -> dict:
+        """Returns all fields of this version of object, replayed from the nearest
+        checkpoint."""
+        if self.is_checkpoint:
+            return dict(self.changes)
+
+        fields = ("id", "parent_id", "changes", "removed", "delta_depth")
+        rows = {
+            row["id"]: row
+            for row in Change.objects.filter(
+                object_uuid=self.object_uuid, id__lt=self.id
+            )
+            .order_by("-id")
+            .values(*fields)[: self.delta_depth]
+        }
+
+        chain = [
+            {
+                "changes": self.changes,
+                "removed": self.removed,
+                "parent_id": self.parent_id,
+                "delta_depth": self.delta_depth,
+            }
+        ]
+        while chain[-1]["delta_depth"]:
+            parent_id = chain[-1]["parent_id"]
+            chain.append(
+                rows.get(parent_id) or Change.objects.values(*fields).get(id=parent_id)
+            )
+
+        state = {}
+        for row in reversed(chain):
+            state.update(row["changes"])
+            for field_name in row["removed"]:
+                state.pop(field_name, None)
+        return state
+
+    @classmethod
+    def get_states(cls, changes) -> dict:
+        """Returns {change id: state} of given changes. Changes of each object are
+        replayed together, with two queries per object instead of replay per change.
+        """
+        states = {}
+        by_object = {}
+        for change in changes:
+            if change.is_checkpoint:
+                states[change.id] = dict(change.changes)
+            else:
+                by_object.setdefault(change.object_uuid, []).append(change)
+
+        fields = ("id", "parent_id", "changes", "removed", "delta_depth")
+        for object_uuid, object_changes in by_object.items():
+            first = min(object_changes, key=lambda change: change.id)
+            last_id = max(change.id for change in object_changes)
+            object_rows = Change.objects.filter(object_uuid=object_uuid)
+            # chain of the first change and all changes up to the last one
+            rows = {
+                row["id"]: row
+                for row in object_rows.filter(id__lt=first.id)
+                .order_by("-id")
+                .values(*fields)[: first.delta_depth]
+            }
+            rows.update(
+                (row["id"], row)
+                for row in object_rows.filter(id__gte=first.id, id__lte=last_id).values(
+                    *fields
+                )
+            )
+
+            resolved = {}
+            for change in object_changes:
+                row = rows[change.id]
+                chain = []
+                while row["id"] not in resolved and row["delta_depth"]:
+                    chain.append(row)
+                    parent_id = row["parent_id"]
+                    row = rows.get(parent_id) or Change.objects.values(*fields).get(
+                        id=parent_id
+                    )
+
+                if row["id"] not in resolved:
+                    resolved[row["id"]] = dict(row["changes"])
+                state = resolved[row["id"]]
+                for row in reversed(chain):
+                    state = {**state, **row["changes"]}
+                    for field_name in row["removed"]:
+                        state.pop(field_name, None)
+                    resolved[row["id"]] = state
+                states[change.id] = state
+        return states
+
+    @classmethod
+    def create_from_state(cls, state, object_uuid, omit_same=False, **kwargs):
+        """Creates change of given full state, stored as delta against the latest change
+        of object or as checkpoint, and moves head of object to it. Head row is locked
+        until the change is created, so concurrent changes of object are chained.
+
+        First change of object creates its head, when concurrent first change creates
+        it meanwhile unique object_uuid is violated and the change is created again
+        chained to the concurrent one.
+
+        Returns:
+            (Change|None): Change object or None if state is same as parent's one and
+            omit_same is set
+        """
+        try:
+            return cls._create_from_state(state, object_uuid, omit_same, **kwargs)
+        except IntegrityError:
+            if not ChangeHead.objects.filter(object_uuid=object_uuid).exists():
+                raise
+        return cls._create_from_state(state, object_uuid, omit_same, **kwargs)
+
+    @classmethod
+    def _create_from_state(cls, state, object_uuid, omit_same, **kwargs):
+        content_hash = get_content_hash(state)
+
+        with transaction.atomic():
+            head = ChangeHead.get(object_uuid, lock=True)
+            parent = head.change if head else cls.latest_change(object_uuid)
+
+            if parent and omit_same:
+                # rows created before hashes and not backfilled yet are compared by state
+                if parent.content_hash:
+                    is_same = parent.content_hash == content_hash
+                else:
+                    is_same = parent.get_state() == state
+                if is_same:
+                    return None
+
+            if (
+                parent is None
+                or parent.delta_depth + 1 >= conf.CHANGES_CHECKPOINT_INTERVAL
+            ):
+                changes, removed, delta_depth = state, [], 0
+            else:
+                parent_state = parent.get_state()
+                changes = {
+                    field_name: value
+                    for field_name, value in state.items()
+                    if field_name not in parent_state
+                    or parent_state[field_name] != value
+                }
+                removed = [
+                    field_name for field_name in parent_state if field_name not in state
+                ]
+                delta_depth = parent.delta_depth + 1
+
+            change = cls.objects.create(
+                changes=changes,
+                removed=removed,
+                delta_depth=delta_depth,
+                content_hash=content_hash,
+                parent=parent,
+                object_uuid=object_uuid,
+                **kwargs,
+            )
+            head = ChangeHead.move(head, change)
+            if head.version % conf.CHANGES_SNAPSHOT_INTERVAL == 0:
+                ChangeSnapshot.store(change)
+
+        return change
+
     @classmethod
     def on_change(cls, omit_same=True, *args, **kwargs):
         """on_change adds new change object to referenced content_object
@@ -62,6 +275,8 @@ class Change(UUIDModel, TimestampsModel):
             type (str,optional): Slug name to identify changes. Default to content_object._meta.app_label
             uuid (uuid|str,optional): uuid that should belongs to content_object. Default to content_object.uuid
             name (str,optional): name of the change
+            message (str,optional): key of message rendered as name of the change on read
+            message_params (dict,optional): params of message
             omit_same (bool, optional): Skips creating objects where no changes was done. Defaults to True.
         Raises:
             serializers.SerializationError: When changes are not serializable
@@ -76,6 +291,9 @@ class Change(UUIDModel, TimestampsModel):
         if "name" in kwargs.keys():
             name = kwargs["name"]
 
+        message = kwargs.get("message", "")
+        message_params = kwargs.get("message_params", {})
+
         changes = None
         if "changes" in kwargs.keys():
             changes = kwargs["changes"]
@@ -111,26 +329,25 @@ class Change(UUIDModel, TimestampsModel):
         else:
             object_uuid = content_object.uuid
 
-        # get parent
-        parent = cls.objects.filter(object_uuid=object_uuid).order_by("-id").first()
-
-        if parent and omit_same:
-            if parent.changes == changes:
-                return
-
-        return cls.objects.create(
+        return cls.create_from_state(
+            changes,
+            object_uuid,
+            omit_same=omit_same,
             author=author,
             name=name,
-            changes=changes,
+            message=message,
+            message_params=message_params,
             content_object=content_object,
             type=type_,
-            object_uuid=object_uuid,
-            parent=parent,
         )
 
     @classmethod
     def latest_change(cls, object_uuid):
         """Get latest change for gived object_uuid"""
+        head = ChangeHead.get(object_uuid)
+        if head:
+            return head.change
+        # changes created without head
         return cls.objects.filter(object_uuid=object_uuid).order_by("-id").first()
 
     @classmethod
@@ -138,6 +355,8 @@ class Change(UUIDModel, TimestampsModel):
 
         type_ = change_obj.type
         name = change_obj.name
+        message = change_obj.message
+        message_params = change_obj.message_params
         author = change_obj.author
 
         if "type" in kwargs.keys():
@@ -145,6 +364,7 @@ class Change(UUIDModel, TimestampsModel):
 
         if "name" in kwargs.keys():
             name = kwargs["name"]
+            message, message_params = "", {}
 
         if "author" in kwargs.keys():
             author = kwargs["author"]
@@ -155,13 +375,14 @@ class Change(UUIDModel, TimestampsModel):
             "hidden": False,
         }
 
-        return cls.objects.create(
+        return cls.create_from_state(
+            change_obj.get_state(),
+            change_obj.object_uuid,
             content_object=change_obj.content_object,
-            changes=change_obj.changes,
-            object_uuid=str(change_obj.object_uuid),
-            parent=cls.latest_change(change_obj.object_uuid),
             type=type_,
             name=name,
+            message=message,
+            message_params=message_params,
             author=author,
             metadata=metadata,
         )
@@ -189,7 +410,7 @@ class Change(UUIDModel, TimestampsModel):
         # generated new reverted version of content_object
         content_object = to.content_object
 
-        for field_name, value in to.changes.items(**kwargs):
+        for field_name, value in to.get_state().items():
 
             # get django db.models field
             field = content_object._meta.get_field(field_name)
@@ -221,6 +442,107 @@ class Change(UUIDModel, TimestampsModel):
         return (reverted_changes, content_object)
 
 
+class ChangeHead(models.Model):
+    """Latest change of object, moved on every created change"""
+
+    object_uuid = models.UUIDField(unique=True)
+    change = models.ForeignKey(Change, related_name="+", on_delete=models.CASCADE)
+    content_hash = models.CharField(max_length=64, blank=True, default="")
+    # number of changes of object
+    version = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def get(cls, object_uuid, lock=False):
+        heads = cls.objects.select_related("change")
+        if lock:
+            heads = heads.select_for_update()
+        return heads.filter(object_uuid=object_uuid).first()
+
+    @classmethod
+    def move(cls, head, change):
+        if head is None:
+            version = Change.objects.filter(object_uuid=change.object_uuid).count()
+            return cls.objects.create(
+                object_uuid=change.object_uuid,
+                change=change,
+                content_hash=change.content_hash,
+                version=version,
+            )
+
+        head.change = change
+        head.content_hash = change.content_hash
+        head.version += 1
+        head.save(update_fields=["change", "content_hash", "version"])
+        return head
+
+
+class ChangeSnapshot(models.Model):
+    """Materialized states of content objects of changes of object_uuid changed since
+    the previous snapshot of object, as they were right after change. Stored on write
+    every CHANGES_SNAPSHOT_INTERVAL changes of object, replay of changes starts from
+    them, see changes.logic.get_states_at()."""
+
+    object_uuid = models.UUIDField()
+    change = models.OneToOneField(Change, related_name="+", on_delete=models.CASCADE)
+    created_at = models.DateTimeField()
+    # {"<content_type_id>:<content_id>": state}
+    states = models.JSONField(default=dict)
+
+    class Meta:
+        indexes = [models.Index(fields=["object_uuid", "created_at"])]
+
+    @classmethod
+    def store(cls, change):
+        """Stores snapshot of change with states of content objects changed since the
+        previous snapshot of its object, so size of snapshot doesn't grow with history
+        of object.
+
+        Returns:
+            ChangeSnapshot: created snapshot
+        """
+        previous_change_id = (
+            cls.objects.filter(object_uuid=change.object_uuid, change_id__lt=change.id)
+            .order_by("-change_id")
+            .values_list("change_id", flat=True)
+            .first()
+        )
+        changes = list(
+            Change.objects.filter(
+                object_uuid=change.object_uuid,
+                id__gt=previous_change_id or 0,
+                id__lte=change.id,
+            ).order_by("id")
+        )
+        change_states = Change.get_states(changes)
+        return cls.objects.create(
+            object_uuid=change.object_uuid,
+            change=change,
+            created_at=change.created_at,
+            states={
+                content_key(c.content_type_id, c.content_id): change_states[c.id]
+                for c in changes
+            },
+        )
+
+
+class ChangeArchiveEntry(models.Model):
+    """Changes of object_uuid archived in one gzip member of segment file, see
+    changes.archive"""
+
+    object_uuid = models.UUIDField()
+    # file name in CHANGES_ARCHIVE_DIR
+    segment = models.CharField(max_length=255)
+    offset = models.PositiveBigIntegerField()
+    size = models.PositiveIntegerField()
+    count = models.PositiveIntegerField()
+    first_change_id = models.PositiveBigIntegerField()
+    first_created_at = models.DateTimeField(null=True)
+    last_created_at = models.DateTimeField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["object_uuid", "first_change_id"])]
+
+
 @receiver(change_done)
 def proccess_change(sender, **kwargs):
     return Change.on_change(**kwargs)
@@ -0,0 +1,86 @@
+from rest_framework import serializers
+
+from django.db import models
+
+from .models import Change
+from . import messages
+
+
+class ContentObjectField(serializers.Field):
+    """Content type label and uuid of changed object (None when it doesn't exist)"""
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, change):
+        uuid = getattr(change.content_object, "uuid", None)
+        return {
+            "type": f"{change.content_type.app_label}.{change.content_type.model}",
+            "uuid": str(uuid) if uuid else None,
+        }
+
+
+class ChangeListSerializer(serializers.ListSerializer):
+    """Renders names and replays states of all listed changes at once"""
+
+    def to_representation(self, data):
+        changes = list(data.all() if isinstance(data, models.Manager) else data)
+        states = Change.get_states(changes)
+        for change, name in zip(changes, messages.render_names(changes)):
+            change.rendered_name = name
+            change.replayed_state = states[change.id]
+        return super().to_representation(changes)
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    """Change with full state of object after it. Changes and removed are the stored
+    delta against parent change, or full state when is_checkpoint is set."""
+
+    name = serializers.SerializerMethodField()
+    state = serializers.SerializerMethodField()
+    author = serializers.UUIDField(source="author.uuid", default=None)
+    parent = serializers.UUIDField(source="parent.uuid", default=None)
+    content_object = ContentObjectField()
+
+    class Meta:
+        model = Change
+        fields = [
+            "uuid",
+            "created_at",
+            "author",
+            "name",
+            "type",
+            "object_uuid",
+            "content_object",
+            "state",
+            "changes",
+            "removed",
+            "is_checkpoint",
+            "parent",
+            "metadata",
+        ]
+        list_serializer_class = ChangeListSerializer
+
+    def get_name(self, change):
+        if hasattr(change, "rendered_name"):
+            return change.rendered_name
+        return change.get_name()
+
+    def get_state(self, change):
+        if hasattr(change, "replayed_state"):
+            return change.replayed_state
+        return change.get_state()
+
+    @classmethod
+    def setup_queryset(cls, queryset):
+        """Related objects are joined, content objects are prefetched with single query
+        per content type"""
+        return queryset.select_related(
+            "author", "parent", "content_type"
+        ).prefetch_related("content_object")
+
+
+class ArchivedChangesSearchSerializer(serializers.Serializer):
+    object_uuid = serializers.UUIDField()
@@ -1,7 +1,32 @@
+from datetime import datetime
+from io import StringIO
+import os
+import tempfile
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from freezegun import freeze_time
+
+from utils.for_tests import TestCaseWithUsers
+from . import archive, logic, messages
+from django.contrib.auth.models import Group
 from django.test import TestCase
+from rest_framework import status
+from rest_framework.reverse import reverse
+from rest_framework.test import APIClient
 from django.conf import settings
-
-from .models import Change, DifferentContentObjectError
+from django.test import override_settings
+
+from .models import (
+    Change,
+    ChangeHead,
+    ChangeSnapshot,
+    DifferentContentObjectError,
+    get_content_hash,
+)
 from .signals import change_done
 from django.contrib.auth import get_user_model
 
@@ -203,3 +228,637 @@ class TestReverted(TestCase):
         _, reverted_content_object = Change.reverted(to=change1)
 
         self.assertEqual(reverted_content_object.groups.all().count(), 1)
+
+
+class TestCaseWithChanges(TestCase):
+    """Changes of single content object made by single author"""
+
+    def setUp(self) -> None:
+        self.author = User.objects.create_user("user", "user@user.com", "user")
+        self.content_object = User.objects.create_user("adam", "adam@adam.com", "adam")
+        return super().setUp()
+
+    def change(self, changes):
+        return Change.on_change(
+            author=self.author,
+            content_object=self.content_object,
+            type="USER_EDITED",
+            changes=changes,
+        )
+
+
+@override_settings(CALMSTRING={"CHANGES_CHECKPOINT_INTERVAL": 3})
+class TestDeltaStorage(TestCaseWithChanges):
+    def test_deltas_and_checkpoints(self):
+        changes = [
+            self.change({"first_name": "a", "last_name": "b"}),
+            self.change({"first_name": "c", "last_name": "b"}),
+            self.change({"first_name": "c", "last_name": "d"}),
+            self.change({"first_name": "e", "last_name": "d"}),
+        ]
+
+        self.assertEqual([change.delta_depth for change in changes], [0, 1, 2, 0])
+        self.assertEqual(changes[1].changes, {"first_name": "c"})
+        self.assertEqual(changes[2].changes, {"last_name": "d"})
+        self.assertEqual(changes[3].changes, {"first_name": "e", "last_name": "d"})
+
+    def test_get_state(self):
+        self.change({"first_name": "a", "last_name": "b"})
+        self.change({"first_name": "c", "last_name": "b"})
+        change = self.change({"first_name": "c"})
+
+        self.assertEqual(change.removed, ["last_name"])
+        with self.assertNumQueries(1):
+            self.assertEqual(change.get_state(), {"first_name": "c"})
+
+        change.refresh_from_db()
+        self.assertEqual(
+            change.parent.get_state(), {"first_name": "c", "last_name": "b"}
+        )
+
+    def test_omit_same_compares_state(self):
+        self.change({"first_name": "a", "last_name": "b"})
+        self.change({"first_name": "c", "last_name": "b"})
+
+        self.assertIsNone(self.change({"first_name": "c", "last_name": "b"}))
+        self.assertEqual(Change.objects.count(), 2)
+
+    def test_revert_from_delta(self):
+        self.content_object.full_name = "origin"
+        self.content_object.save()
+        change_done.send(
+            sender=self.__class__,
+            author=self.author,
+            content_object=self.content_object,
+            type="USER_EDITED",
+            changes=self.content_object,
+        )
+        self.content_object.full_name = "master"
+        self.content_object.save()
+        _, change = change_done.send_robust(
+            sender=self.__class__,
+            author=self.author,
+            content_object=self.content_object,
+            type="USER_EDITED",
+            changes=self.content_object,
+        )[0]
+        self.content_object.full_name = "last"
+        self.content_object.save()
+        change_done.send(
+            sender=self.__class__,
+            author=self.author,
+            content_object=self.content_object,
+            type="USER_EDITED",
+            changes=self.content_object,
+        )
+
+        self.assertEqual(change.changes, {"full_name": "master"})
+
+        reverted_change, reverted_content_object = Change.reverted(to=change)
+
+        self.assertEqual(reverted_content_object.full_name, "master")
+        self.assertEqual(reverted_change.get_state(), change.get_state())
+
+
+@override_settings(CALMSTRING={"CHANGES_CHECKPOINT_INTERVAL": 3})
+class TestContentHash(TestCaseWithChanges):
+    def test_hash_of_state(self):
+        self.assertEqual(
+            get_content_hash({"a": 1, "b": 2}), get_content_hash({"b": 2, "a": 1})
+        )
+        self.assertNotEqual(get_content_hash({"a": 1}), get_content_hash({"a": 2}))
+
+        self.change({"first_name": "a", "last_name": "b"})
+        change = self.change({"first_name": "c", "last_name": "b"})
+
+        self.assertEqual(
+            change.content_hash,
+            get_content_hash({"first_name": "c", "last_name": "b"}),
+        )
+
+    def test_omit_same_does_not_replay(self):
+        self.change({"first_name": "a", "last_name": "b"})
+        self.change({"first_name": "c", "last_name": "b"})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIsNone(self.change({"last_name": "b", "first_name": "c"}))
+
+        # parent lookup only
+        selects = [q for q in queries.captured_queries if q["sql"].startswith("SELECT")]
+        self.assertEqual(len(selects), 1)
+
+    def test_backfill(self):
+        changes = [
+            self.change({"first_name": "a", "last_name": "b"}),
+            self.change({"first_name": "c", "last_name": "b"}),
+            self.change({"first_name": "c"}),
+            self.change({"first_name": "d"}),
+        ]
+        Change.objects.update(content_hash="")
+
+        out = StringIO()
+        call_command("backfill_change_hashes", chunk_size=1, stdout=out)
+
+        self.assertIn("Set hash of 4 changes", out.getvalue())
+        self.assertEqual(
+            list(Change.objects.order_by("id").values_list("content_hash", flat=True)),
+            [change.content_hash for change in changes],
+        )
+        head = ChangeHead.objects.get(object_uuid=self.content_object.uuid)
+        self.assertEqual(head.content_hash, changes[-1].content_hash)
+
+    def test_backfill_head(self):
+        change = self.change({"first_name": "a"})
+        ChangeHead.objects.update(content_hash="")
+
+        out = StringIO()
+        call_command("backfill_change_hashes", stdout=out)
+
+        self.assertIn("Set hash of 0 changes", out.getvalue())
+        head = ChangeHead.objects.get(object_uuid=self.content_object.uuid)
+        self.assertEqual(head.content_hash, change.content_hash)
+
+
+class TestChangeHead(TestCaseWithChanges):
+    def test_head_moved(self):
+        self.change({"first_name": "a"})
+        change = self.change({"first_name": "b"})
+
+        head = ChangeHead.objects.get(object_uuid=self.content_object.uuid)
+        self.assertEqual(head.change, change)
+        self.assertEqual(head.content_hash, change.content_hash)
+        self.assertEqual(head.version, 2)
+
+    def test_latest_change(self):
+        for name in "abc":
+            change = self.change({"first_name": name})
+
+        with self.assertNumQueries(1):
+            self.assertEqual(Change.latest_change(self.content_object.uuid), change)
+
+    def test_changes_without_head(self):
+        first = self.change({"first_name": "a"})
+        ChangeHead.objects.all().delete()
+
+        self.assertEqual(Change.latest_change(self.content_object.uuid), first)
+
+        change = self.change({"first_name": "b"})
+        self.assertEqual(change.parent, first)
+        self.assertEqual(
+            ChangeHead.objects.get(object_uuid=self.content_object.uuid).version, 2
+        )
+
+    def test_head_created_concurrently(self):
+        first = self.change({"first_name": "a"})
+        get_head = ChangeHead.get
+        calls = []
+
+        def get_before_first_commit(object_uuid, lock=False):
+            # the first change was not committed yet when head was locked
+            calls.append(lock)
+            if len(calls) == 1:
+                return None
+            return get_head(object_uuid, lock)
+
+        with mock.patch.object(ChangeHead, "get", side_effect=get_before_first_commit):
+            change = self.change({"first_name": "b"})
+
+        self.assertEqual(calls[0], True)
+        self.assertEqual(change.parent, first)
+        self.assertEqual(Change.objects.count(), 2)
+        head = ChangeHead.objects.get(object_uuid=self.content_object.uuid)
+        self.assertEqual(head.change, change)
+        self.assertEqual(head.version, 2)
+
+
+@override_settings(
+    CALMSTRING={"CHANGES_CHECKPOINT_INTERVAL": 3, "CHANGES_SNAPSHOT_INTERVAL": 4}
+)
+class TestGetStatesAt(TestCase):
+    def setUp(self) -> None:
+        self.author = User.objects.create_user("user", "user@user.com", "user")
+        self.first = User.objects.create_user("adam", "adam@adam.com", "adam")
+        self.second = User.objects.create_user("eve", "eve@eve.com", "eve")
+        self.uuid = self.first.uuid
+        return super().setUp()
+
+    def change(self, content_object, hour, changes):
+        with freeze_time(f"2020-01-01 {hour:02}:00:00"):
+            return Change.on_change(
+                author=self.author,
+                content_object=content_object,
+                type="USER_EDITED",
+                changes=changes,
+                uuid=self.uuid,
+            )
+
+    def states_at(self, hour, **kwargs):
+        at = timezone.make_aware(datetime(2020, 1, 1, hour, 30))
+        return logic.get_states_at([self.uuid], at, **kwargs)[self.uuid]
+
+    def test_replay(self):
+        self.change(self.first, 1, {"name": "a"})
+        self.change(self.second, 2, {"name": "b"})
+        self.change(self.first, 3, {"name": "c"})
+
+        content_type_id = Change.objects.first().content_type_id
+        first = (content_type_id, self.first.id)
+        second = (content_type_id, self.second.id)
+
+        self.assertEqual(self.states_at(0), {})
+        self.assertEqual(self.states_at(1), {first: {"name": "a"}})
+        self.assertEqual(
+            self.states_at(3), {first: {"name": "c"}, second: {"name": "b"}}
+        )
+
+    def test_snapshots(self):
+        for hour in range(1, 11):
+            self.change(self.first, hour, {"name": str(hour)})
+
+        # stored on write every 4 changes of object
+        self.assertEqual(
+            list(
+                ChangeSnapshot.objects.values_list(
+                    "change__created_at__hour", flat=True
+                )
+            ),
+            [4, 8],
+        )
+        expected = {hour: self.states_at(hour) for hour in range(0, 11)}
+        self.assertEqual(list(expected[10].values()), [{"name": "10"}])
+        self.assertEqual(list(expected[5].values()), [{"name": "5"}])
+
+        # replay starts from the latest snapshot before <at>
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.states_at(10), expected[10])
+        replay = queries.captured_queries[-1]["sql"]
+        self.assertIn(str(ChangeSnapshot.objects.last().change_id), replay)
+
+        ChangeSnapshot.objects.all().delete()
+        self.assertEqual(
+            {hour: self.states_at(hour) for hour in range(0, 11)}, expected
+        )
+
+    def test_snapshot_keeps_objects_changed_since_previous_one(self):
+        self.change(self.second, 1, {"name": "b"})
+        for hour in range(2, 9):
+            self.change(self.first, hour, {"name": str(hour)})
+
+        content_type_id = Change.objects.first().content_type_id
+        first = f"{content_type_id}:{self.first.id}"
+        second = f"{content_type_id}:{self.second.id}"
+        self.assertEqual(
+            [snapshot.states for snapshot in ChangeSnapshot.objects.order_by("id")],
+            [
+                {first: {"name": "4"}, second: {"name": "b"}},
+                {first: {"name": "8"}},
+            ],
+        )
+        self.assertEqual(
+            self.states_at(8),
+            {
+                (content_type_id, self.first.id): {"name": "8"},
+                (content_type_id, self.second.id): {"name": "b"},
+            },
+        )
+
+    def test_reads_dont_store_snapshots(self):
+        with override_settings(CALMSTRING={"CHANGES_SNAPSHOT_INTERVAL": 100}):
+            for hour in range(1, 11):
+                self.change(self.first, hour, {"name": str(hour)})
+
+        with CaptureQueriesContext(connection) as queries:
+            self.states_at(10)
+
+        self.assertFalse(ChangeSnapshot.objects.exists())
+        self.assertFalse(
+            [query for query in queries.captured_queries if "INSERT" in query["sql"]]
+        )
+
+    def test_store_snapshots_command(self):
+        with override_settings(CALMSTRING={"CHANGES_SNAPSHOT_INTERVAL": 100}):
+            for hour in range(1, 11):
+                self.change(self.first, hour, {"name": str(hour)})
+        expected = self.states_at(10)
+
+        out = StringIO()
+        call_command("store_change_snapshots", stdout=out)
+
+        self.assertIn("Stored 2 snapshots", out.getvalue())
+        self.assertEqual(self.states_at(10), expected)
+
+        call_command("store_change_snapshots", stdout=out)
+        self.assertEqual(ChangeSnapshot.objects.count(), 2)
+
+
+class TestChangesListAPIView(TestCaseWithUsers):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.groups = [Group.objects.create(name=f"group{i}") for i in range(2)]
+        with freeze_time("2020-01-01 07:00:00"):
+            for group in self.groups:
+                self.change(self.user, group, "GROUP_CREATED")
+            self.change(self.user, self.normal_user, "USER_CREATED")
+        with freeze_time("2020-01-01 08:00:00"):
+            self.change(self.competitive_user, self.normal_user, "USER_EDITED")
+
+    def change(self, author, content_object, type):
+        return Change.on_change(
+            author=author,
+            content_object=content_object,
+            type=type,
+            changes={"type": type},
+            uuid=getattr(content_object, "uuid", self.user.uuid),
+            omit_same=False,
+        )
+
+    def get(self, params=None):
+        self.client.force_authenticate(user=self.competitive_user)
+        return self.client.get(reverse("ChangesListAPIView"), params or {})
+
+    def test_feed(self):
+        response = self.get()
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [change["type"] for change in response.data["results"]],
+            ["USER_EDITED", "USER_CREATED", "GROUP_CREATED", "GROUP_CREATED"],
+        )
+        self.assertEqual(
+            response.data["results"][0]["content_object"],
+            {"type": "accounts.user", "uuid": str(self.normal_user.uuid)},
+        )
+        self.assertEqual(
+            response.data["results"][0]["author"], str(self.competitive_user.uuid)
+        )
+
+    @override_settings(CALMSTRING={"CHANGES_CHECKPOINT_INTERVAL": 3})
+    def test_full_states(self):
+        for name in "abcd":
+            Change.on_change(
+                author=self.user,
+                content_object=self.normal_user,
+                type="USER_EDITED",
+                changes={"first_name": name, "last_name": "x"},
+            )
+
+        results = self.get({"object_uuid": self.normal_user.uuid}).data["results"]
+
+        self.assertEqual(
+            [change["state"] for change in results[:4]],
+            [{"first_name": name, "last_name": "x"} for name in reversed("abcd")],
+        )
+        # "b" is stored as checkpoint, following changes as deltas against it
+        self.assertEqual(results[0]["changes"], {"first_name": "d"})
+        self.assertEqual(
+            [change["is_checkpoint"] for change in results[:4]],
+            [False, False, True, False],
+        )
+
+    def test_states_replayed_once_per_object(self):
+        for name in "abc":
+            self.change(self.user, self.normal_user, name)
+
+        self.client.force_authenticate(user=self.competitive_user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("ChangesListAPIView"))
+        count = len(queries)
+
+        for name in "def":
+            self.change(self.user, self.normal_user, name)
+
+        with self.assertNumQueries(count):
+            self.client.get(reverse("ChangesListAPIView"))
+
+    def test_content_objects_prefetched_by_content_type(self):
+        for group in self.groups:
+            self.change(self.user, group, "GROUP_EDITED")
+
+        self.client.force_authenticate(user=self.competitive_user)
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("ChangesListAPIView"))
+        count = len(queries)
+
+        for group in [Group.objects.create(name=f"new{i}") for i in range(3)]:
+            self.change(self.user, group, "GROUP_CREATED")
+
+        with self.assertNumQueries(count):
+            self.client.get(reverse("ChangesListAPIView"))
+
+    def test_filters(self):
+        def types(params):
+            return [change["type"] for change in self.get(params).data["results"]]
+
+        self.assertEqual(
+            types({"object_uuid": self.normal_user.uuid}),
+            ["USER_EDITED", "USER_CREATED"],
+        )
+        self.assertEqual(types({"author": self.competitive_user.uuid}), ["USER_EDITED"])
+        self.assertEqual(types({"type": "USER_CREATED"}), ["USER_CREATED"])
+        self.assertEqual(
+            types({"created_before": "2020-01-01T07:30:00Z"}),
+            ["USER_CREATED", "GROUP_CREATED", "GROUP_CREATED"],
+        )
+        self.assertEqual(
+            types({"created_after": "2020-01-01T07:30:00Z"}), ["USER_EDITED"]
+        )
+
+    def test_paginated_by_cursor(self):
+        response = self.get({"page_size": 3})
+        self.assertEqual(len(response.data["results"]), 3)
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [change["type"] for change in response.data["results"]], ["GROUP_CREATED"]
+        )
+
+    def test_permissions(self):
+        self.client.force_authenticate(user=self.normal_user)
+        response = self.client.get(reverse("ChangesListAPIView"))
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class TestRenderNames(TestCaseWithUsers):
+    def setUp(self):
+        super().setUp()
+        self.rendered = []
+        messages.register(["tests.GREETING"], self.render)
+
+    def tearDown(self):
+        messages.renderers.pop("tests.GREETING")
+        super().tearDown()
+
+    def render(self, changes):
+        self.rendered.append(len(changes))
+        return [f"Hello {change.message_params['who']}" for change in changes]
+
+    def change(self, name="", message="", **params):
+        return Change.on_change(
+            author=self.user,
+            content_object=self.user,
+            changes={"full_name": name or params.get("who", "")},
+            name=name,
+            message=message,
+            message_params=params,
+            omit_same=False,
+        )
+
+    def test_render_names(self):
+        changes = [
+            self.change(message="tests.GREETING", who="world"),
+            self.change(name="Stored name"),
+            self.change(name="Stored name", message="tests.UNKNOWN"),
+            self.change(message="tests.GREETING", who="you"),
+        ]
+
+        self.assertEqual(
+            messages.render_names(changes),
+            ["Hello world", "Stored name", "Stored name", "Hello you"],
+        )
+        self.assertEqual(self.rendered, [2])
+
+    def test_message_kept_on_revert(self):
+        change = self.change(message="tests.GREETING", who="world")
+        self.change(name="Other")
+
+        reverted, _ = Change.reverted(change)
+
+        self.assertEqual(reverted.get_name(), "Hello world")
+
+    def test_feed_renders_names_at_once(self):
+        self.change(message="tests.GREETING", who="world")
+        self.change(message="tests.GREETING", who="you")
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.competitive_user)
+
+        response = self.client.get(reverse("ChangesListAPIView"))
+
+        self.assertEqual(
+            [change["name"] for change in response.data["results"]],
+            ["Hello you", "Hello world"],
+        )
+        self.assertEqual(self.rendered, [2])
+
+
+class TestArchive(TestCaseWithUsers):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+        settings_override = override_settings(
+            CALMSTRING={
+                "CHANGES_CHECKPOINT_INTERVAL": 3,
+                "CHANGES_ARCHIVE_DIR": self.directory,
+            }
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.uuid = self.user.uuid
+        # checkpoints are changes of hours 1, 4 and 7
+        for hour in range(1, 9):
+            content_object = self.user if hour % 2 else self.normal_user
+            self.change(content_object, hour, {"full_name": str(hour)})
+
+    def change(self, content_object, hour, changes):
+        with freeze_time(f"2020-01-01 {hour:02}:00:00"):
+            return Change.on_change(
+                author=self.user,
+                content_object=content_object,
+                type="USER_EDITED",
+                changes=changes,
+                uuid=self.uuid,
+            )
+
+    def at(self, hour):
+        return timezone.make_aware(datetime(2020, 1, 1, hour, 30))
+
+    def history(self):
+        states = {change.id: change.get_state() for change in Change.objects.all()}
+        states_at = [
+            logic.get_states_at([self.uuid], self.at(hour)) for hour in range(0, 9)
+        ]
+        return states, states_at
+
+    def test_archive(self):
+        states, states_at = self.history()
+        latest = Change.latest_change(self.uuid)
+
+        self.assertEqual(archive.archive_changes(self.at(5)), 3)
+
+        self.assertEqual(Change.objects.count(), 5)
+        self.assertEqual(len(os.listdir(self.directory)), 1)
+        self.assertEqual(Change.latest_change(self.uuid), latest)
+        for change in Change.objects.all():
+            self.assertEqual(change.get_state(), states[change.id])
+        self.assertEqual(self.history()[1], states_at)
+
+        archived = archive.get_archived_changes(self.uuid)
+        self.assertEqual(
+            [change.get_state() for change in archived],
+            [states[change_id] for change_id in sorted(states)[:3]],
+        )
+        self.assertEqual(archived[1].parent, archived[0])
+
+    def test_archive_appends_segments(self):
+        states, states_at = self.history()
+
+        archive.archive_changes(self.at(5))
+        self.assertEqual(archive.archive_changes(self.at(5)), 0)
+        self.assertEqual(archive.archive_changes(self.at(8)), 3)
+
+        self.assertEqual(Change.objects.count(), 2)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+        self.assertEqual(self.history()[1], states_at)
+        self.assertEqual(
+            [change.id for change in archive.get_archived_changes(self.uuid)],
+            sorted(states)[:6],
+        )
+
+        change = self.change(self.user, 9, {"full_name": "9"})
+        self.assertEqual(change.get_state(), {"full_name": "9"})
+
+    def test_snapshots_of_archived_changes_removed(self):
+        with override_settings(
+            CALMSTRING={
+                "CHANGES_CHECKPOINT_INTERVAL": 3,
+                "CHANGES_SNAPSHOT_INTERVAL": 2,
+                "CHANGES_ARCHIVE_DIR": self.directory,
+            }
+        ):
+            logic.store_snapshots([self.uuid])
+            self.assertEqual(ChangeSnapshot.objects.count(), 4)
+
+            archive.archive_changes(self.at(5))
+
+            self.assertEqual(ChangeSnapshot.objects.count(), 3)
+            self.assertEqual(
+                self.history()[1][8], logic.get_states_at([self.uuid], self.at(8))
+            )
+
+    def test_command(self):
+        with freeze_time("2020-01-01 05:30:00"):
+            out = StringIO()
+            call_command("archive_changes", "--age", "0", stdout=out)
+
+        self.assertIn("Archived 3 changes", out.getvalue())
+
+    def test_archived_changes_api(self):
+        archive.archive_changes(self.at(5))
+        client = APIClient()
+        client.force_authenticate(user=self.competitive_user)
+
+        response = client.get(
+            reverse("ArchivedChangesListAPIView"), {"object_uuid": self.uuid}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [change["changes"] for change in response.data],
+            [{"full_name": "3"}, {"full_name": "2"}, {"full_name": "1"}],
+        )
+        self.assertEqual(response.data[0]["author"], str(self.user.uuid))
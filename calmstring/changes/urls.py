@@ -0,0 +1,12 @@
+from django.urls import path
+
+from .views import ChangesListAPIView, ArchivedChangesListAPIView
+
+urlpatterns = [
+    path("", ChangesListAPIView.as_view(), name="ChangesListAPIView"),
+    path(
+        "archived/",
+        ArchivedChangesListAPIView.as_view(),
+        name="ArchivedChangesListAPIView",
+    ),
+]
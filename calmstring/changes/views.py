@@ -1,3 +1,41 @@
-from django.shortcuts import render
+from django.db.models import prefetch_related_objects
+from rest_framework import generics
+from rest_framework.response import Response
 
-# Create your views here.
+from accounts.permissions import IsCompetitiveUser
+
+from .filters import ChangeFeedFilter
+from .models import Change
+from .pagination import ChangesCursorPagination
+from .serializers import ChangeSerializer, ArchivedChangesSearchSerializer
+from . import archive
+
+
+class ChangesListAPIView(generics.ListAPIView):
+    """Feed of changes, newest first, filtered by object_uuid, author, type and
+    created_at range and paginated by cursor"""
+
+    queryset = Change.objects.all()
+    serializer_class = ChangeSerializer
+    filterset_class = ChangeFeedFilter
+    pagination_class = ChangesCursorPagination
+    permission_classes = [IsCompetitiveUser]
+
+    def get_queryset(self):
+        return self.get_serializer_class().setup_queryset(super().get_queryset())
+
+
+class ArchivedChangesListAPIView(generics.GenericAPIView):
+    """Archived changes of <object_uuid>, newest first"""
+
+    serializer_class = ChangeSerializer
+    permission_classes = [IsCompetitiveUser]
+
+    def get(self, request):
+        search = ArchivedChangesSearchSerializer(data=request.query_params)
+        search.is_valid(raise_exception=True)
+
+        changes = archive.get_archived_changes(search.validated_data["object_uuid"])
+        prefetch_related_objects(changes, "author", "content_type", "content_object")
+
+        return Response(self.get_serializer(changes[::-1], many=True).data)
@@ -7,3 +7,4 @@ class EventsConfig(AppConfig):
 
     def ready(self):
         import events.signal_handlers
+        import events.messages
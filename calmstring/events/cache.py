@@ -0,0 +1,106 @@
+"""Cache of computed room availability.
+
+Availability of room is constant between two consecutive starts or ends of its events,
+so computed availability is stored together with the instant it was computed at and
+the next start or end after it. Entries live in a redis hash per room (or in huey
+sqlite storage when REDIS_URL is not set, see utils.cache.get_hash_store), with a field
+per time bucket, so dropping the hash invalidates all of them at once. The store is
+shared by web processes which invalidate entries and consumer which reads them.
+"""
+
+import json
+import logging
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, Min, Q
+
+from utils.cache import STORE_ERRORS, get_hash_store
+from . import conf
+from .models import EventOccurrence
+
+logger = logging.getLogger(__name__)
+
+
+def room_key(room_id) -> str:
+    return f"events:availability:{room_id}"
+
+
+def get_bucket(datetime_at: datetime) -> int:
+    return int(datetime_at.timestamp()) // conf.AVAILABILITY_CACHE_BUCKET
+
+
+def get_validity(room_id, datetime_at: datetime):
+    """Returns first start or end of room events after datetime_at (None if there isn't any)
+    and if some event starts or ends exactly at datetime_at."""
+    result = (
+        EventOccurrence.objects.existing()
+        .filter(room_id=room_id)
+        .aggregate(
+            next_start=Min("start_date", filter=Q(start_date__gt=datetime_at)),
+            next_end=Min("end_date", filter=Q(end_date__gt=datetime_at)),
+            boundaries=Count(
+                "id", filter=Q(start_date=datetime_at) | Q(end_date=datetime_at)
+            ),
+        )
+    )
+    changes = [dt for dt in (result["next_start"], result["next_end"]) if dt]
+
+    return (min(changes) if changes else None), bool(result["boundaries"])
+
+
+def get_room_availability(room_id, datetime_at: datetime, compute):
+    """Returns cached availability of room at datetime_at or computes it with compute()
+    and caches it until the next change. Cache errors fall back to compute().
+    """
+    store = get_hash_store()
+    key = room_key(room_id)
+    bucket = get_bucket(datetime_at)
+    timestamp = datetime_at.timestamp()
+
+    try:
+        cached = store.hget(key, bucket)
+    except STORE_ERRORS:
+        logger.exception("Can't read room availability cache")
+        return compute()
+
+    if cached:
+        entry = json.loads(cached)
+        if entry["at"] <= timestamp and (
+            entry["until"] is None or timestamp < entry["until"]
+        ):
+            return entry["availability"]
+
+    availability = compute()
+    until, is_boundary = get_validity(room_id, datetime_at)
+
+    # at the very start or end of event availability may differ from the following one
+    if is_boundary:
+        return availability
+
+    entry = {
+        "availability": availability,
+        "at": timestamp,
+        "until": until.timestamp() if until else None,
+    }
+    try:
+        store.hset(key, bucket, json.dumps(entry))
+        store.expire(key, conf.AVAILABILITY_CACHE_TIMEOUT)
+    except STORE_ERRORS:
+        logger.exception("Can't write room availability cache")
+
+    return availability
+
+
+def delete_room(room_id):
+    try:
+        get_hash_store().delete(room_key(room_id))
+    except STORE_ERRORS:
+        logger.exception("Can't invalidate room availability cache")
+
+
+def invalidate_room(room_id):
+    """Drops cached availability of room now and again after commit, entry cached
+    meanwhile by concurrent reader of rows before commit would be stale"""
+    delete_room(room_id)
+    transaction.on_commit(lambda: delete_room(room_id))
@@ -22,6 +22,36 @@ class Conf:
         assert value >= (60 * 60 * 24 * 2)  # two days
         return value
 
+    @property
+    def OCCUPANCY_CACHE(self):
+        return self._setting("OCCUPANCY_CACHE", "default")
+
+    @property
+    def OCCUPANCY_CACHE_SHARED(self):
+        """Whether OCCUPANCY_CACHE is shared by all processes, None detects it by
+        cache backend"""
+        return self._setting("OCCUPANCY_CACHE_SHARED", None)
+
+    @property
+    def OCCUPANCY_TIMEOUT(self):
+        return self._setting("OCCUPANCY_TIMEOUT", 60 * 60 * 24)
+
+    @property
+    def AVAILABILITY_CACHE_BUCKET(self):
+        return self._setting("AVAILABILITY_CACHE_BUCKET", 60 * 60)
+
+    @property
+    def AVAILABILITY_CACHE_TIMEOUT(self):
+        return self._setting("AVAILABILITY_CACHE_TIMEOUT", 60 * 60 * 24)
+
+    @property
+    def TASKS_DEBOUNCE(self):
+        return self._setting("TASKS_DEBOUNCE", 2)
+
+    @property
+    def ROOM_TASK_SLOTS(self):
+        return self._setting("ROOM_TASK_SLOTS", 8)
+
     @classmethod
     def get_room(cls, event_room):
         return event_room.room
@@ -38,65 +68,30 @@ class Conf:
         REPORT_ROOM_FREE_CREATED = "REPORT_ROOM_FREE_CREATED"
         REPORT_ROOM_BUSY_CREATED = "REPORT_ROOM_BUSY_CREATED"
 
-    class MESSAGES:
-        OCCUPY_ROOM = lambda room, user: _('{user} created busy room "{room}"').format(
-            user=user.username, room=Conf.get_room(room).name
-        )
-
-        FREE_ROOM = lambda event, user: _(
-            '{user} released room "{room_name}" at {released_at}'
-        ).format(
-            user=user.username,
-            room_name=Conf.get_room(event.room).name,
-            released_at=event.end_date,
-        )
+        EVENT_REVERTED = "EVENT_REVERTED"
 
-        REPORT_UNAVAILABLE_EVENT = lambda event, user: _(
-            '{user} reported unavailable room "{room_name}"'
-        ).format(user=user.username, room_name=Conf.get_room(event.room).name)
+    class MESSAGES:
+        """Templates of change names, rendered on read by events.messages"""
 
-        REPORT_UNAVAILABLE = lambda report, user: _(
+        OCCUPY_ROOM = _('{user} created busy room "{room_name}"')
+        FREE_ROOM = _('{user} released room "{room_name}" at {released_at}')
+        REPORT_UNAVAILABLE_EVENT = _('{user} reported unavailable room "{room_name}"')
+        REPORT_UNAVAILABLE = _(
             '{user} reported unavailable room "{room_name}" at {reported_at}'
-        ).format(
-            user=user.username,
-            room_name=Conf.get_room(report.room).name,
-            reported_at=report.date,
-        )
-
-        REPORT_FREE = lambda report, user: _(
-            '{user} reported free room "{room_name}" at {reported_at}'
-        ).format(
-            user=user.username,
-            room_name=Conf.get_room(report.room).name,
-            reported_at=report.date,
         )
-
-        REPORT_BUSY = lambda report, user: _(
-            '{user} reported busy room "{room_name}" at {reported_at}'
-        ).format(
-            user=user.username,
-            room_name=Conf.get_room(report.room).name,
-            reported_at=report.date,
-        )
-        OCCUPY_EDITED = lambda event, user: _(
-            '{user} edited busy room "{room_name}" at {edited_at}'
-        ).format(
-            user=user.username,
-            room_name=Conf.get_room(event.room).name,
-            edited_at=event.end_date,
+        REPORT_FREE = _('{user} reported free room "{room_name}" at {reported_at}')
+        REPORT_BUSY = _('{user} reported busy room "{room_name}" at {reported_at}')
+        OCCUPY_EDITED = _('{user} edited busy room "{room_name}" at {edited_at}')
+        OCCUPY_DELETE = _('{user} deleted busy room "{room_name}"')
+        EVENT_REVERTED = _(
+            '{user} reverted event of room "{room_name}" to {reverted_to}'
         )
-
-        OCCUPY_DELETE = lambda event, user: _(
-            '{user} deleted busy room "{room_name}"'
-        ).format(user=user.username, room_name=Conf.get_room(event.room).name)
-
-        REPORT_UNAVAILABLE_EVENT_EDITED = lambda event, user: _(
+        REPORT_UNAVAILABLE_EVENT_EDITED = _(
             '{user} edited unavailable room "{room_name}"'
-        ).format(user=user.username, room_name=Conf.get_room(event.room).name)
-
-        REPORT_UNAVAILABLE_EVENT_DELETED = lambda event, user: _(
+        )
+        REPORT_UNAVAILABLE_EVENT_DELETED = _(
             '{user} deleted unavailable room event "{room_name}"'
-        ).format(user=user.username, room_name=Conf.get_room(event.room).name)
+        )
 
 
 conf = Conf()
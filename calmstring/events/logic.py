@@ -1,12 +1,19 @@
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core import serializers
 
-from .models import Event, Report, EventRoom
+from .models import Event, Report, EventRoom, EventOccurrence, RoomTransition
 
 
-from . import exceptions, conf
+from . import exceptions, conf, occupancy, cache, messages
 import changes.signals
+import changes.archive
+import changes.logic
+from changes.models import Change
 from . import signals as events_signals
 
 
@@ -21,6 +28,29 @@ import logging
 logger = logging.getLogger(__name__)
 
 
+def has_overlaped_event(user_events, user, start_date: datetime, end_date=None):
+    """Checks if user has blocking event overlaped to period.
+    With shared occupancy cache bitmap of user answers most of checks, database is
+    asked only when bitmap reports possible overlap. Process local bitmap may miss rows
+    written by other processes, so database is always asked then.
+
+    Args:
+        user_events (EventQuerySet): Blocking events of user that are taken into account
+        user (User): Author of events
+        start_date (datetime): Start of period
+        end_date (datetime, optional): End of period. Defaults to None.
+
+    Returns:
+        bool: True if overlaped event exists
+    """
+    if occupancy.is_cache_shared() and not occupancy.may_overlap(
+        occupancy.AUTHOR, user.id, start_date, end_date
+    ):
+        return False
+
+    return user_events.overlaped_to(start_date, end_date, author=user).exists()
+
+
 def occupy_room(
     room: EventRoom,
     user,
@@ -67,7 +97,7 @@ def occupy_room(
         raise exceptions.NotEndedEventExists()
 
     # Can't occupy room if user has event overlaped with new event
-    if user_events.overlaped_to(start_date, end_date).exists():
+    if has_overlaped_event(user_events, user, start_date, end_date):
         raise exceptions.OverlapedEventExists()
 
     event = Event.objects.create(
@@ -92,7 +122,7 @@ def occupy_room(
             author=user,
             content_object=event,
             type=conf.CHANGE_TYPES.OCCUPY_ROOM_CREATED,
-            name=conf.MESSAGES.OCCUPY_ROOM(room, user),
+            **messages.message("OCCUPY_ROOM", user, room),
             uuid=room.uuid,
         )
 
@@ -153,7 +183,9 @@ def free_room(room: EventRoom, user, end_date: datetime, **kwargs):
             author=user,
             content_object=user_event,
             type=conf.CHANGE_TYPES.OCCUPY_ROOM_EDITED,
-            name=conf.MESSAGES.FREE_ROOM(user_event, user),
+            **messages.message(
+                "FREE_ROOM", user, user_event.room_id, released_at=user_event.end_date
+            ),
             uuid=user_event.room.uuid,
         )
 
@@ -218,7 +250,9 @@ def report_unavailable(
                 author=user,
                 content_object=event,
                 type=conf.CHANGE_TYPES.REPORT_ROOM_UNAVAILABLE_CREATED,
-                name=conf.MESSAGES.REPORT_UNAVAILABLE(report, user),
+                **messages.message(
+                    "REPORT_UNAVAILABLE", user, report.room_id, reported_at=report.date
+                ),
                 uuid=room.uuid,
             )
 
@@ -254,7 +288,7 @@ def report_unavailable(
             author=user,
             content_object=event,
             type=conf.CHANGE_TYPES.REPORT_ROOM_UNAVAILABLE_EVENT_CREATED,
-            name=conf.MESSAGES.REPORT_UNAVAILABLE_EVENT(event, user),
+            **messages.message("REPORT_UNAVAILABLE_EVENT", user, event.room_id),
             uuid=room.uuid,
         )
 
@@ -310,7 +344,9 @@ def report_free(
             author=user,
             content_object=report,
             type=conf.CHANGE_TYPES.REPORT_ROOM_FREE_CREATED,
-            name=conf.MESSAGES.REPORT_FREE(report, user),
+            **messages.message(
+                "REPORT_FREE", user, report.room_id, reported_at=report.date
+            ),
             uuid=room.uuid,
         )
 
@@ -369,7 +405,9 @@ def report_busy(
             author=user,
             content_object=report,
             type=conf.CHANGE_TYPES.REPORT_ROOM_BUSY_CREATED,
-            name=conf.MESSAGES.REPORT_BUSY(report, user),
+            **messages.message(
+                "REPORT_BUSY", user, report.room_id, reported_at=report.date
+            ),
             uuid=room.uuid,
         )
 
@@ -455,7 +493,7 @@ def edit_occupy_room(
     start_date = event.start_date
     end_date = event.end_date
     # Can't occupy room if user has event overlaped with new event
-    if user_events.overlaped_to(start_date, end_date).exists():
+    if has_overlaped_event(user_events, user, start_date, end_date):
         raise exceptions.OverlapedEventExists()
 
     event.save()
@@ -472,7 +510,9 @@ def edit_occupy_room(
             author=user,
             content_object=event,
             type=conf.CHANGE_TYPES.OCCUPY_ROOM_EDITED,
-            name=conf.MESSAGES.OCCUPY_EDITED(event, user),
+            **messages.message(
+                "OCCUPY_EDITED", user, event.room_id, edited_at=event.end_date
+            ),
             uuid=event.room.uuid,
         )
 
@@ -516,7 +556,7 @@ def delete_occupy_room(event: Event, user, **kwargs):
             author=user,
             content_object=event,
             type=conf.CHANGE_TYPES.OCCUPY_ROOM_DELETED,
-            name=conf.MESSAGES.OCCUPY_DELETE(event, user),
+            **messages.message("OCCUPY_DELETE", user, event.room_id),
             uuid=event.room.uuid,
         )
 
@@ -582,7 +622,7 @@ def edit_report_unavailable_event(
             author=user,
             content_object=event,
             type=conf.CHANGE_TYPES.REPORT_ROOM_UNAVAILABLE_EVENT_EDITED,
-            name=conf.MESSAGES.REPORT_UNAVAILABLE_EVENT_EDITED(event, user),
+            **messages.message("REPORT_UNAVAILABLE_EVENT_EDITED", user, event.room_id),
             uuid=event.room.uuid,
         )
 
@@ -630,7 +670,7 @@ def delete_report_unavailable_event(event: Event, user, **kwargs):
             author=user,
             content_object=event,
             type=conf.CHANGE_TYPES.REPORT_ROOM_UNAVAILABLE_EVENT_DELETED,
-            name=conf.MESSAGES.REPORT_UNAVAILABLE_EVENT_DELETED(event, user),
+            **messages.message("REPORT_UNAVAILABLE_EVENT_DELETED", user, event.room_id),
             uuid=event.room.uuid,
         )
 
@@ -640,7 +680,11 @@ def delete_report_unavailable_event(event: Event, user, **kwargs):
 
 
 def set_event_occurrences(
-    event: Event, dtstart: datetime = None, period=None, **kwargs
+    event: Event,
+    dtstart: datetime = None,
+    period=None,
+    incremental: bool = False,
+    **kwargs,
 ):
     """Set occurrences for event for period from dtstart
 
@@ -648,6 +692,8 @@ def set_event_occurrences(
         event (Event): _description_
         dtstart (datetime, optional): Date start of the period. Defaults to None.
         period (_type_, optional): The period for which the events will be set (from dtstart) - in seconds. Defaults to conf.OCCURRENCES_PERIOD.
+        incremental (bool, optional): Expand only part of the period not covered by already set occurrences,
+            and remove occurrences that are in the past. Falls back to full expansion when nothing is set yet. Defaults to False.
 
     Returns:
         (datetime (timezone)|None): datetime of the end of the period if next occurrences are found
@@ -666,19 +712,40 @@ def set_event_occurrences(
         period_start_date = timezone.make_naive(period_start_date)
 
     period_end_date = period_start_date + period_timedelta
-    occurrences = event.get_occurrences(
-        period_start_date,
-        period_end_date,
-        dtstart=timezone.make_naive(event.start_date),
-    )
 
-    # Check if occurrences exist and get next_schedule date
-    # to call from external worker set_event_occurrences again later
-    if not len(occurrences):
-        return None
+    occurrences_until = event.occurrences_until
+    if occurrences_until:
+        occurrences_until = timezone.make_naive(occurrences_until)
+
+    # ticks run later than their eta, the gap is covered by the day before
+    # occurrences_until which get_occurrences() expands too
+    if (
+        incremental
+        and occurrences_until
+        and occurrences_until >= period_start_date - timedelta(days=1)
+    ):
+        # expand only newly uncovered slice of the period
+        occurrences = event.get_occurrences(occurrences_until, period_end_date)
+
+        # same as in full expansion, occurrences from the day before period are kept
+        trim_to = period_start_date - timedelta(days=1)
+        if not len(occurrences) and not event.occurrences_after(trim_to):
+            return None
+
+        occurrences = event.extend_occurrences(
+            occurrences, timezone.make_aware(period_end_date), trim_to
+        )
+    else:
+        occurrences = event.get_occurrences(period_start_date, period_end_date)
 
-    event.occurrences = Event.prepare_occurrences_for_db(occurrences)
-    event.save()
+        # Check if occurrences exist and get next_schedule date
+        # to call from external worker set_event_occurrences again later
+        if not len(occurrences):
+            return None
+
+        event.occurrences = Event.prepare_occurrences_for_db(occurrences)
+        event.occurrences_until = timezone.make_aware(period_end_date)
+        event.save()
 
     def internal_signals():
         events_signals.event_set_occurrences.send_robust(
@@ -699,26 +766,87 @@ def set_event_occurrences(
     return next_schedule
 
 
-def get_event_room_availability(room: EventRoom, datetime_at: datetime = None):
-    """Get room availability status at given datetime_at"""
+def bulk_set_events_occurrences(
+    events, occurrences_by_event: dict, until: datetime, **kwargs
+):
+    """Writes already expanded occurrences of many events in one transaction,
+    with bulk update of events and bulk rebuild of their EventOccurrence rows.
+    Caches of their rooms are invalidated and single events_occurrences_rebuilt
+    signal is emitted for all of them.
 
-    # use just existing events
-    pending_events = (
-        Event.objects.filter(room=room)
-        .existing()
-        .overlaped_to(datetime_at, intersection=True)
-    )
+    Args:
+        events (list): Recurring events (with start_date, end_date, room, author loaded)
+        occurrences_by_event (dict): {event_id: (occurrences in db format, occurrences_cursor)}
+        until (datetime): End of the period for which occurrences are set
 
-    if not len(pending_events):
+    Returns:
+        int: number of updated events
+    """
+    events = [event for event in events if event.id in occurrences_by_event]
+
+    rows = []
+    for event in events:
+        event.occurrences, event.occurrences_cursor = occurrences_by_event[event.id]
+        event.occurrences_until = until
+
+        periods = event.get_occurrence_periods()
+        rows += [
+            EventOccurrence(
+                event_id=event.id,
+                room_id=event.room_id,
+                author_id=event.author_id,
+                start_date=start,
+                end_date=end,
+            )
+            for start, end in periods
+        ]
+        occupancy.invalidate_periods(event.room_id, event.author_id, periods)
+
+    previous_rows = EventOccurrence.objects.filter(event__in=events)
+    occupancy.invalidate_rows(previous_rows)
+
+    with transaction.atomic():
+        Event.objects.bulk_update(
+            events, ["occurrences", "occurrences_until", "occurrences_cursor"]
+        )
+        previous_rows.delete()
+        EventOccurrence.objects.bulk_create(rows)
+
+    room_ids = sorted({event.room_id for event in events})
+    for room_id in room_ids:
+        cache.invalidate_room(room_id)
+
+    def internal_signals():
+        events_signals.events_occurrences_rebuilt.send_robust(
+            sender="bulk_set_events_occurrences", room_ids=room_ids
+        )
+
+    signals_emiter(internal_signals, None, **kwargs)
+
+    return len(events)
+
+
+def compute_room_availability(pending, datetime_at: datetime):
+    """Computes room availability from occurrences pending at datetime_at
+
+    Args:
+        pending (list): (event availability, end_date) of occurrences that
+            intersect datetime_at
+        datetime_at (datetime): Instant of availability
+
+    Returns:
+        str: EventRoom availability
+    """
+    if not pending:
         return EventRoom.Availabilities.FREE
 
     # To make sure if event ends e.g. on 12:00,
     # then room availability in makred as free from 12:00
-    latests_ended = pending_events.order_by("-end_date__time").first()
-    if latests_ended.end_date.time() == datetime_at.time():
+    latest_end = max(end_date for _, end_date in pending)
+    if latest_end == datetime_at:
         return EventRoom.Availabilities.FREE
 
-    statuses_set = set(map(lambda event: event.availability, pending_events))
+    statuses_set = set(availability for availability, _ in pending)
     if len(statuses_set) > 1:
         return EventRoom.Availabilities.UNKNOWN
 
@@ -731,35 +859,465 @@ def get_event_room_availability(room: EventRoom, datetime_at: datetime = None):
     return EventRoom.Availabilities.UNKNOWN
 
 
+def get_pending_occurrences(datetime_at: datetime):
+    # use just existing events
+    return EventOccurrence.objects.existing().overlaped_to(
+        datetime_at, intersection=True
+    )
+
+
+def get_event_room_availability(room: EventRoom, datetime_at: datetime = None):
+    """Get room availability status at given datetime_at"""
+    pending = list(
+        get_pending_occurrences(datetime_at)
+        .filter(room=room)
+        .values_list("event__availability", "end_date")
+    )
+
+    return compute_room_availability(pending, datetime_at)
+
+
+def get_event_rooms_availability(rooms, datetime_at: datetime) -> dict:
+    """Get availability statuses of many rooms at given datetime_at with single query
+
+    Returns:
+        dict: {room id: availability}
+    """
+    room_ids = [room.id for room in rooms]
+    pending = get_pending_occurrences(datetime_at).filter(room_id__in=room_ids)
+
+    pending_by_room = {room_id: [] for room_id in room_ids}
+    for room_id, availability, end_date in pending.values_list(
+        "room_id", "event__availability", "end_date"
+    ):
+        pending_by_room[room_id].append((availability, end_date))
+
+    return {
+        room_id: compute_room_availability(room_pending, datetime_at)
+        for room_id, room_pending in pending_by_room.items()
+    }
+
+
+def get_cached_event_room_availability(room: EventRoom, datetime_at: datetime = None):
+    """get_event_room_availability() cached until the next start or end of room event"""
+    datetime_at = datetime_at or timezone.now()
+
+    return cache.get_room_availability(
+        room.id, datetime_at, lambda: get_event_room_availability(room, datetime_at)
+    )
+
+
+def send_room_availability_signals(room):
+    events_signals.room_availability_changed.send_robust(
+        sender="set_event_room_availability",
+        room=room,
+    )
+
+    if room.availability == room.Availabilities.BUSY:
+        events_signals.room_availability_busy.send_robust(
+            sender="set_event_room_availability", room=room
+        )
+    elif room.availability == room.Availabilities.FREE:
+        events_signals.room_availability_free.send_robust(
+            sender="set_event_room_availability", room=room
+        )
+    elif room.availability == room.Availabilities.UNAVAILABLE:
+        events_signals.room_availability_unavailable.send_robust(
+            sender="set_event_room_availability", room=room
+        )
+    else:
+        events_signals.room_availability_unknown.send_robust(
+            sender="set_event_room_availability", room=room
+        )
+
+
 def set_event_room_availability(room, **kwargs):
-    availability = get_event_room_availability(room, timezone.now())
+    availability = get_cached_event_room_availability(room, timezone.now())
     room.availability = availability
-    room.save()
+    room.save(update_fields=["availability"])
 
     def internal_signals():
-        events_signals.room_availability_changed.send_robust(
-            sender="set_event_room_availability",
-            room=room,
+        send_room_availability_signals(room)
+
+    def external_signals():
+        pass
+
+    signals_emiter(internal_signals, external_signals, **kwargs)
+
+
+def set_event_rooms_availability(rooms, **kwargs):
+    """Sets current availability of many rooms, computed with single query and
+    saved with single update
+
+    Args:
+        rooms (list): EventRoom instances
+        emit_signals (bool, optional): _description_. Defaults to True.
+        emit_internal_signals (bool, optional): _description_. Defaults to True.
+        emit_external_signals (bool, optional): _description_. Defaults to True.
+    """
+    availabilities = get_event_rooms_availability(rooms, timezone.now())
+    for room in rooms:
+        room.availability = availabilities[room.id]
+
+    EventRoom.objects.bulk_update(rooms, ["availability"])
+
+    def internal_signals():
+        for room in rooms:
+            send_room_availability_signals(room)
+
+    def external_signals():
+        pass
+
+    signals_emiter(internal_signals, external_signals, **kwargs)
+
+
+def set_room_transitions(room_ids, date_from: datetime = None):
+    """Replaces upcoming transitions of rooms with starts and ends of their existing
+    occurrences after date_from, so transitions of edited or deleted events are dropped
+    and identical instants are stored once.
+
+    Args:
+        room_ids (list): EventRoom ids
+        date_from (datetime, optional): Defaults to now.
+
+    Returns:
+        datetime: Earliest of set transitions or None
+    """
+    date_from = date_from or timezone.now()
+
+    periods = (
+        EventOccurrence.objects.existing()
+        .filter(room_id__in=room_ids, end_date__gt=date_from)
+        .values_list("room_id", "start_date", "end_date")
+    )
+    transitions = set()
+    for room_id, start_date, end_date in periods:
+        if start_date > date_from:
+            transitions.add((room_id, start_date))
+        transitions.add((room_id, end_date))
+
+    with transaction.atomic():
+        RoomTransition.objects.filter(room_id__in=room_ids, date__gt=date_from).delete()
+        RoomTransition.objects.bulk_create(
+            RoomTransition(room_id=room_id, date=date) for room_id, date in transitions
         )
 
-        if room.availability == room.Availabilities.BUSY:
-            events_signals.room_availability_busy.send_robust(
-                sender="set_event_room_availability", room=room
-            )
-        elif room.availability == room.Availabilities.FREE:
-            events_signals.room_availability_free.send_robust(
-                sender="set_event_room_availability", room=room
+    return min((date for _, date in transitions), default=None)
+
+
+def pop_due_room_transitions(date_at: datetime):
+    """Removes transitions that are due at date_at
+
+    Returns:
+        list: ids of rooms that had due transitions
+    """
+    due = list(
+        RoomTransition.objects.filter(date__lte=date_at).values_list("id", "room_id")
+    )
+    RoomTransition.objects.filter(id__in=[id for id, _ in due]).delete()
+
+    return sorted(set(room_id for _, room_id in due))
+
+
+def get_next_room_transition():
+    return (
+        RoomTransition.objects.order_by("date").values_list("date", flat=True).first()
+    )
+
+
+def get_free_periods(busy_periods, start: datetime, end: datetime, duration: timedelta):
+    """Sweeps busy periods sorted by start and collects gaps in [start, end)
+    that are at least <duration> long.
+
+    Args:
+        busy_periods (iterable): (start, end) busy periods sorted by start
+        start (datetime): Beginning of searched period
+        end (datetime): End of searched period
+        duration (timedelta): Minimal length of free period
+
+    Returns:
+        list: free (start, end) periods
+    """
+    free_periods = []
+    free_from = start
+
+    for busy_start, busy_end in busy_periods:
+        if busy_start - free_from >= duration:
+            free_periods.append((free_from, min(busy_start, end)))
+        free_from = max(free_from, busy_end)
+
+        if free_from >= end:
+            break
+
+    if end - free_from >= duration:
+        free_periods.append((free_from, end))
+
+    return free_periods
+
+
+def find_free_rooms(
+    start_date: datetime, end_date: datetime, duration: int, rooms=None
+):
+    """Finds rooms that are free for <duration> seconds between start_date and end_date.
+    Busy and unavailable events of all rooms (including set occurrences of recurring ones)
+    are read in one query.
+
+    Args:
+        start_date (datetime): Beginning of searched period
+        end_date (datetime): End of searched period
+        duration (int): Minimal free period length in seconds
+        rooms (QuerySet, optional): EventRoom queryset to search in. Defaults to all rooms.
+
+    Returns:
+        list: [{"room": EventRoom, "periods": [(start, end), ...]}, ...] ranked by earliest
+        free period start and then by its longest free period
+    """
+    duration = timedelta(seconds=duration)
+    rooms = (rooms if rooms is not None else EventRoom.objects.all()).select_related(
+        "room"
+    )
+
+    busy_periods = (
+        EventOccurrence.objects.existing()
+        .filter(
+            event__availability__in=occupancy.BLOCKING_AVAILABILITIES,
+            room__in=rooms,
+        )
+        .overlaped_to(start_date, end_date)
+        .order_by("room_id", "start_date")
+        .values_list("room_id", "start_date", "end_date")
+    )
+
+    busy_periods_by_room = {}
+    for room_id, start, end in busy_periods:
+        busy_periods_by_room.setdefault(room_id, []).append((start, end))
+
+    found = []
+    for room in rooms:
+        periods = get_free_periods(
+            busy_periods_by_room.get(room.id, []), start_date, end_date, duration
+        )
+        if periods:
+            found.append({"room": room, "periods": periods})
+
+    return sorted(
+        found,
+        key=lambda item: (
+            item["periods"][0][0],
+            -max(end - start for start, end in item["periods"]),
+            item["room"].room.name,
+        ),
+    )
+
+
+def get_rooms_events_at(at: datetime, rooms=None) -> dict:
+    """Reconstructs events of rooms as they were at <at> from change log, soft deleted
+    events are left out.
+
+    Args:
+        at (datetime): Point in time
+        rooms (list, optional): EventRoom instances. Defaults to all rooms.
+
+    Returns:
+        dict: {EventRoom: [Event]} unsaved Event instances ordered by start_date
+    """
+    rooms = list(rooms if rooms is not None else EventRoom.objects.all())
+    event_type_id = ContentType.objects.get_for_model(Event).id
+
+    # events changes are stored under uuid of their room
+    states = changes.logic.get_states_at([room.uuid for room in rooms], at)
+
+    rooms_events = {}
+    for room in rooms:
+        rows = [
+            {"model": "events.event", "pk": content_id, "fields": state}
+            for (content_type_id, content_id), state in states[room.uuid].items()
+            if content_type_id == event_type_id and not state.get("is_deleted")
+        ]
+        events = [
+            deserialized.object
+            for deserialized in serializers.deserialize(
+                "python", rows, ignorenonexistent=True
             )
-        elif room.availability == room.Availabilities.UNAVAILABLE:
-            events_signals.room_availability_unavailable.send_robust(
-                sender="set_event_room_availability", room=room
+        ]
+        for event in events:
+            event.room = room
+
+        rooms_events[room] = sorted(events, key=lambda event: event.start_date)
+
+    author_ids = {
+        event.author_id for events in rooms_events.values() for event in events
+    }
+    authors = get_user_model().objects.in_bulk(author_ids - {None})
+    for events in rooms_events.values():
+        for event in events:
+            event.author = authors.get(event.author_id)
+
+    return rooms_events
+
+
+def revert_events_to(at: datetime, user, rooms=None, changed_by=None, **kwargs):
+    """Reverts all events changed after <at> to their state at <at>, events created
+    after it are soft deleted. Target states are reconstructed from change log in
+    single pass and written with bulk updates in single transaction.
+
+    Args:
+        at (datetime): Point in time events are reverted to
+        user (User): User who reverts
+        rooms (list, optional): Reverts just events of these EventRoom instances.
+            Defaults to None (all rooms).
+        changed_by (User, optional): Reverts just events changed by this user
+            after <at>. Defaults to None (changed by anyone).
+        emit_signals (bool, optional): Defaults to True.
+        emit_internal_signals (bool, optional): Defaults to True.
+        emit_external_signals (bool, optional): Defaults to True.
+
+    Raises:
+        exceptions.ValidationError: Events changed by <changed_by> were changed also
+            by other users after <at>, reverting them would roll back their changes
+        exceptions.OverlapedEventExists: Reverted event overlaps to blocking event of
+            its author that is not reverted
+
+    Returns:
+        list: Reverted events
+    """
+    event_type = ContentType.objects.get_for_model(Event)
+
+    changed = Change.objects.filter(content_type=event_type, created_at__gt=at)
+    if rooms is not None:
+        changed = changed.filter(object_uuid__in=[room.uuid for room in rooms])
+    if changed_by is not None:
+        changed = changed.filter(author=changed_by)
+
+    event_rooms = dict(changed.values_list("content_id", "object_uuid").distinct())
+
+    # changes older than CHANGES_ARCHIVE_AGE are moved from the table to archive
+    archived = [
+        row
+        for row in changes.archive.get_archived_rows(
+            None if rooms is None else [room.uuid for room in rooms], after=at
+        )
+        if row["content_type_id"] == event_type.id
+    ]
+    for row in archived:
+        if changed_by is None or row["author_id"] == changed_by.id:
+            event_rooms.setdefault(row["content_id"], row["object_uuid"])
+
+    if not event_rooms:
+        return []
+
+    # events are reverted as whole, so changes of other authors would be lost
+    if changed_by is not None and (
+        Change.objects.filter(
+            content_type=event_type, created_at__gt=at, content_id__in=event_rooms
+        )
+        .exclude(author=changed_by)
+        .exists()
+        or any(
+            row["content_id"] in event_rooms and row["author_id"] != changed_by.id
+            for row in archived
+        )
+    ):
+        raise exceptions.ValidationError(
+            _("Events were changed by other users since the time reverted to")
+        )
+
+    # events changes are stored under uuid of their room
+    states = changes.logic.get_states_at(set(event_rooms.values()), at)
+
+    events = list(
+        Event.objects.filter(id__in=event_rooms.keys()).select_related(
+            "room__room", "author"
+        )
+    )
+    room_ids = {event.room_id for event in events}
+
+    # timestamps are not reverted, the revert is the latest update
+    now = timezone.now()
+    fields = {"is_deleted", "updated_at"}
+    for event in events:
+        event.updated_at = now
+        state = states[event_rooms[event.id]].get((event_type.id, event.id))
+        if state is None:
+            event.is_deleted = True
+            continue
+
+        reverted = next(
+            serializers.deserialize(
+                "python",
+                [{"model": "events.event", "pk": event.id, "fields": state}],
+                ignorenonexistent=True,
             )
-        else:
-            events_signals.room_availability_unknown.send_robust(
-                sender="set_event_room_availability", room=room
+        ).object
+        for field in Event._meta.concrete_fields:
+            if (
+                field.primary_key
+                or field.name in ("created_at", "updated_at")
+                or field.name not in state
+            ):
+                continue
+            setattr(event, field.attname, getattr(reverted, field.attname))
+            fields.add(field.name)
+    room_ids |= {event.room_id for event in events}
+
+    # restored events must not overlap to blocking events of their authors
+    periods_by_event = {event.id: event.get_occurrence_periods() for event in events}
+    user_events = (
+        Event.objects.existing()
+        .filter(availability__in=occupancy.BLOCKING_AVAILABILITIES)
+        .exclude(id__in=periods_by_event)
+    )
+    for event in events:
+        blocking = event.availability in occupancy.BLOCKING_AVAILABILITIES
+        if event.is_deleted or not blocking or event.author is None:
+            continue
+        for start, end in periods_by_event[event.id]:
+            if has_overlaped_event(user_events, event.author, start, end):
+                raise exceptions.OverlapedEventExists()
+
+    rows = []
+    for event in events:
+        periods = periods_by_event[event.id]
+        rows += [
+            EventOccurrence(
+                event_id=event.id,
+                room_id=event.room_id,
+                author_id=event.author_id,
+                start_date=start,
+                end_date=end,
             )
+            for start, end in periods
+        ]
+        occupancy.invalidate_periods(event.room_id, event.author_id, periods)
+
+    with transaction.atomic():
+        Event.objects.bulk_update(events, fields)
+        previous_rows = EventOccurrence.objects.filter(event__in=events)
+        occupancy.invalidate_rows(previous_rows)
+        previous_rows.delete()
+        EventOccurrence.objects.bulk_create(rows)
+
+    for room_id in room_ids:
+        cache.invalidate_room(room_id)
+
+    def internal_signals():
+        events_signals.events_reverted.send_robust(
+            sender="revert_events_to", events=events, room_ids=room_ids
+        )
 
     def external_signals():
-        pass
+        for event in events:
+            changes.signals.change_done.send_robust(
+                sender="revert_events_to",
+                author=user,
+                content_object=event,
+                type=conf.CHANGE_TYPES.EVENT_REVERTED,
+                **messages.message(
+                    "EVENT_REVERTED", user, event.room_id, reverted_to=at
+                ),
+                uuid=event.room.uuid,
+            )
 
     signals_emiter(internal_signals, external_signals, **kwargs)
+
+    return events
@@ -0,0 +1,182 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import os
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from events import conf, logic
+from events.models import Event
+
+
+EVENT_FIELDS = [
+    "id",
+    "start_date",
+    "end_date",
+    "is_recurring",
+    "recurrences",
+    "occurrences",
+    "occurrences_cursor",
+    "room",
+    "author",
+]
+
+
+def expand_event_occurrences(payload):
+    """Runs in worker process, expands occurrences of single serialized event
+
+    Returns:
+        tuple: (event_id, occurrences in db format, occurrences_cursor)
+    """
+    recurrences_field = Event._meta.get_field("recurrences")
+
+    event = Event(
+        id=payload["id"],
+        start_date=payload["start_date"],
+        end_date=payload["end_date"],
+        is_recurring=True,
+        recurrences=recurrences_field.to_python(payload["recurrences"]),
+        occurrences_cursor=payload["occurrences_cursor"],
+    )
+    occurrences = event.get_occurrences(payload["period_start"], payload["period_end"])
+
+    return (
+        event.id,
+        Event.prepare_occurrences_for_db(occurrences),
+        event.occurrences_cursor,
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuilds occurrences of all recurring events. "
+        "Use after imports, timezone changes or changing OCCURRENCES_PERIOD."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of events read, expanded and written at once.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of expanding processes, 1 expands in current process.",
+        )
+        parser.add_argument(
+            "--period",
+            type=int,
+            default=None,
+            help="Period in seconds for which occurrences are set. Defaults to OCCURRENCES_PERIOD.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Don't write anything, only report events with outdated occurrences.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        dry_run = options["dry_run"]
+        period = options["period"] or conf.OCCURRENCES_PERIOD
+
+        period_start = timezone.make_naive(timezone.now())
+        period_end = period_start + timedelta(seconds=period)
+
+        events = Event.objects.existing().filter(is_recurring=True).order_by("id")
+        total = events.count()
+
+        executor = None
+        if options["workers"] > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=options["workers"], initializer=django.setup
+            )
+
+        processed = 0
+        outdated = []
+        last_id = 0
+        try:
+            while True:
+                chunk = list(
+                    events.filter(id__gt=last_id).only(*EVENT_FIELDS)[:chunk_size]
+                )
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+
+                results = self.expand(chunk, period_start, period_end, executor)
+
+                if dry_run:
+                    outdated += [
+                        event.id
+                        for event in chunk
+                        if self.is_outdated(
+                            event.occurrences,
+                            results[event.id][0],
+                            period_start,
+                            period_end,
+                        )
+                    ]
+                else:
+                    logic.bulk_set_events_occurrences(
+                        chunk, results, timezone.make_aware(period_end)
+                    )
+
+                processed += len(chunk)
+                self.stdout.write(f"Processed {processed}/{total} events")
+        finally:
+            if executor:
+                executor.shutdown()
+
+        if dry_run:
+            if outdated:
+                raise CommandError(
+                    f"{len(outdated)} events have outdated occurrences: "
+                    + ", ".join(map(str, outdated))
+                )
+            self.stdout.write(self.style.SUCCESS("All occurrences are up to date"))
+            return
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt occurrences of {processed} events")
+        )
+
+    def is_outdated(self, stored, expanded, period_start, period_end):
+        """Compares occurrences dates inside the period, days on its edges depend on
+        the moment occurrences were set, so they are skipped"""
+        first_day = period_start.date().isoformat()
+        last_day = period_end.date().isoformat()
+
+        in_period = lambda occurrences: {
+            day for day in occurrences if first_day < day < last_day
+        }
+        return in_period(stored) != in_period(expanded)
+
+    def expand(self, events, period_start: datetime, period_end: datetime, executor):
+        recurrences_field = Event._meta.get_field("recurrences")
+
+        payloads = [
+            {
+                "id": event.id,
+                "start_date": event.start_date,
+                "end_date": event.end_date,
+                "recurrences": recurrences_field.get_prep_value(event.recurrences),
+                "occurrences_cursor": event.occurrences_cursor,
+                "period_start": period_start,
+                "period_end": period_end,
+            }
+            for event in events
+        ]
+
+        if executor:
+            results = executor.map(expand_event_occurrences, payloads)
+        else:
+            results = map(expand_event_occurrences, payloads)
+
+        return {
+            event_id: (occurrences, cursor) for event_id, occurrences, cursor in results
+        }
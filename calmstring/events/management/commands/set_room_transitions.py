@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from events import logic, tasks
+from events.models import EventRoom
+
+
+class Command(BaseCommand):
+    help = (
+        "Sets current availability and upcoming transitions of all rooms from their "
+        "occurrences and schedules transitions ticker. Run once after migrating to "
+        "room transitions, rooms get transitions otherwise only when their events "
+        "change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=100,
+            help="Number of rooms computed and written at once.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        now = timezone.now()
+
+        room_ids = list(EventRoom.objects.order_by("id").values_list("id", flat=True))
+        total = len(room_ids)
+
+        for start in range(0, total, chunk_size):
+            chunk = room_ids[start : start + chunk_size]
+            logic.set_event_rooms_availability(
+                list(EventRoom.objects.filter(id__in=chunk))
+            )
+            logic.set_room_transitions(chunk, now)
+            self.stdout.write(
+                f"Processed {min(start + chunk_size, total)}/{total} rooms"
+            )
+
+        tasks.schedule_room_transitions_tick(logic.get_next_room_transition())
+        self.stdout.write(self.style.SUCCESS(f"Set transitions of {total} rooms"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+
+from utils.task_queue import get_task_metrics, reset_task_metrics
+
+
+class Command(BaseCommand):
+    help = (
+        "Shows number of executions, average duration and average queue latency "
+        "of tasks executed by huey consumer."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reset",
+            action="store_true",
+            help="Clear collected metrics after showing them.",
+        )
+
+    def handle(self, *args, **options):
+        metrics = get_task_metrics()
+
+        if not metrics:
+            self.stdout.write("No tasks executed by consumer yet")
+        else:
+            self.stdout.write(
+                f"{'task':<60} {'count':>8} {'avg duration':>14} {'avg latency':>14}"
+            )
+        for name, metric in sorted(metrics.items()):
+            latency = metric["avg_latency"]
+            self.stdout.write(
+                f"{name:<60} {metric['count']:>8} {metric['avg_duration']:>13.3f}s "
+                + (f"{latency:>13.3f}s" if latency is not None else f"{'-':>14}")
+            )
+
+        if options["reset"]:
+            reset_task_metrics()
+            self.stdout.write(self.style.SUCCESS("Metrics cleared"))
@@ -0,0 +1,57 @@
+"""Change names of events app, see changes.messages"""
+
+from changes import messages
+
+from .models import EventRoom
+from . import conf
+
+PREFIX = "events."
+
+
+def message(name, user, event_room, **params) -> dict:
+    """Message kwargs of change_done signal, nothing is queried here.
+
+    Args:
+        name (str): name of template in conf.MESSAGES
+        user (User): user who made the change
+        event_room (EventRoom|int): room (or its id) which name is rendered
+        params: other params of template, stored as strings
+
+    Returns:
+        dict: message and message_params kwargs
+    """
+    if not hasattr(conf.MESSAGES, name):
+        raise ValueError(f"Unknown message {name}")
+
+    return {
+        "message": PREFIX + name,
+        "message_params": {
+            "user": user.username,
+            "room": getattr(event_room, "pk", event_room),
+            **{key: str(value) for key, value in params.items()},
+        },
+    }
+
+
+def render(changes) -> list:
+    """Renders names of changes, names of their rooms are fetched with single query"""
+    room_ids = {change.message_params.get("room") for change in changes}
+    room_names = {
+        event_room.pk: conf.get_room(event_room).name
+        for event_room in EventRoom.objects.filter(pk__in=room_ids).select_related(
+            "room"
+        )
+    }
+
+    names = []
+    for change in changes:
+        params = dict(change.message_params)
+        params["room_name"] = room_names.get(params.pop("room", None), "")
+        template = getattr(conf.MESSAGES, change.message[len(PREFIX) :])
+        names.append(template.format(**params))
+    return names
+
+
+messages.register(
+    [PREFIX + name for name in vars(conf.MESSAGES) if name.isupper()], render
+)
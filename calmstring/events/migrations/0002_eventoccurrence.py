@@ -0,0 +1,60 @@
+# Generated by Django 3.2 on 2026-10-17 23:54
+
+from datetime import date, datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def fill_event_occurrences(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    EventOccurrence = apps.get_model('events', 'EventOccurrence')
+
+    rows = []
+    events = Event.objects.filter(is_recurring=True, end_date__isnull=False)
+    for event in events.iterator():
+        start_time = timezone.make_naive(event.start_date).time()
+        duration = event.end_date - event.start_date
+        for occurrence in event.occurrences.keys():
+            start = timezone.make_aware(
+                datetime.combine(date.fromisoformat(occurrence), start_time)
+            )
+            rows.append(
+                EventOccurrence(
+                    event_id=event.id,
+                    room_id=event.room_id,
+                    start_date=start,
+                    end_date=start + duration,
+                )
+            )
+    EventOccurrence.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventOccurrence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_date', models.DateTimeField()),
+                ('end_date', models.DateTimeField()),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_occurrences', to='events.event')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='event_occurrences', to='events.eventroom')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=models.Index(fields=['event', 'start_date', 'end_date'], name='event_occurrence_event_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=models.Index(fields=['room', 'start_date', 'end_date'], name='event_occurrence_room_idx'),
+        ),
+        migrations.RunPython(fill_event_occurrences, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 3.2 on 2026-10-17 23:57
+
+from django.conf import settings
+from datetime import date, datetime, timedelta
+
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+from events import conf
+
+
+def fill_event_occurrences(apps, schema_editor):
+    Event = apps.get_model('events', 'Event')
+    EventOccurrence = apps.get_model('events', 'EventOccurrence')
+
+    EventOccurrence.objects.all().delete()
+
+    max_busy_duration = timedelta(seconds=conf.MAX_BUSY_DURATION)
+
+    rows = []
+    for event in Event.objects.iterator():
+        if not event.is_recurring:
+            periods = [(event.start_date, event.end_date or event.start_date + max_busy_duration)]
+        elif event.end_date:
+            start_time = timezone.make_naive(event.start_date).time()
+            duration = event.end_date - event.start_date
+            periods = []
+            for occurrence in event.occurrences.keys():
+                start = timezone.make_aware(
+                    datetime.combine(date.fromisoformat(occurrence), start_time)
+                )
+                periods.append((start, start + duration))
+        else:
+            periods = []
+
+        for start, end in periods:
+            rows.append(
+                EventOccurrence(
+                    event_id=event.id,
+                    room_id=event.room_id,
+                    author_id=event.author_id,
+                    start_date=start,
+                    end_date=end,
+                )
+            )
+    EventOccurrence.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('events', '0002_eventoccurrence'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='eventoccurrence',
+            name='author',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='event_occurrences', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='eventoccurrence',
+            name='event',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='event_occurrences', to='events.event'),
+        ),
+        migrations.AlterField(
+            model_name='eventoccurrence',
+            name='room',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='event_occurrences', to='events.eventroom'),
+        ),
+        migrations.AddIndex(
+            model_name='eventoccurrence',
+            index=models.Index(fields=['author', 'start_date', 'end_date'], name='event_occurrence_author_idx'),
+        ),
+        migrations.RunPython(fill_event_occurrences, migrations.RunPython.noop),
+    ]
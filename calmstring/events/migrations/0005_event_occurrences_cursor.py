@@ -0,0 +1,18 @@
+# Generated by Django 3.2 on 2026-10-18 00:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0004_event_occurrences_until'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='occurrences_cursor',
+            field=models.JSONField(default=None, null=True),
+        ),
+    ]
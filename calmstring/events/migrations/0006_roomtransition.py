@@ -0,0 +1,30 @@
+# Generated by Django 3.2 on 2026-10-18 00:38
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('events', '0005_event_occurrences_cursor'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RoomTransition',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateTimeField()),
+                ('room', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transitions', to='events.eventroom')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='roomtransition',
+            index=models.Index(fields=['date'], name='room_transition_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='roomtransition',
+            constraint=models.UniqueConstraint(fields=('room', 'date'), name='room_transition_unique'),
+        ),
+    ]
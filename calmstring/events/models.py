@@ -11,6 +11,7 @@ from utils.models import UUIDModel, TimestampsModel, SoftDeleteModel, SoftDelete
 
 from datetime import datetime, timedelta, time, date
 from . import signals as events_signals
+from . import conf
 from utils.dates import tz_datetime
 from utils.constant import AvailabilitiesBase
 
@@ -45,6 +46,38 @@ class EventRoom(UUIDModel):  # change to room calendar
         return f"{self.room.name} - {self.availability}"
 
 
+class EventOccurrenceQuerySet(models.QuerySet):
+    def existing(self):
+        return self.filter(event__is_deleted=False)
+
+    def overlaped_to(self, start: datetime, end: datetime = None, intersection=False):
+        """Filters occurrences that are overlaped to half-open period [start, end).
+
+        Args:
+            start (datetime): Start of period.
+            end (datetime, optional): End of period. Defaults to None and then filtered will be only start.
+            intersection (bool, optional): If true occurrences that have equal start_date to <end> or end_date to <start> will be also counted. Defaults to False.
+
+        Returns:
+            EventOccurrenceQuerySet: overlaped occurrences
+        """
+        _end = end or start
+
+        """Scenearios:
+        SD - start_date, ED - end_date, S - start, E - end
+        S------E
+                S----------E
+               S---E
+            S------------------E
+                  SD---------ED
+        all of them are covered by: SD < E and ED > S
+        """
+        if intersection:
+            return self.filter(start_date__lte=_end, end_date__gte=start)
+
+        return self.filter(start_date__lt=_end, end_date__gt=start)
+
+
 class EventQuerySet(SoftDeleteQuerySet):
     def overlaped_to(
         self,
@@ -52,117 +85,36 @@ class EventQuerySet(SoftDeleteQuerySet):
         end: datetime = None,
         intersection=False,
         all_day=False,
+        room=None,
+        author=None,
     ):
         """Filters events that are overlaped to given period.
 
         WARNING!
-        This method in case of recurrent events relies on weekly_occurences,
-        so to get correct result for recurrent events, you need to call set_occurrences(),
-        for your events.
+        This method relies on EventOccurrence rows, so to get correct result for recurrent events,
+        you need to call set_event_occurrences(), for your events.
 
 
         Args:
             start (datetime): Start of period.
             end (datetime, optional): End of period. Defaults to None and then filtered will be only start.
             intersection (bool, optional): If true events that have equal start_date to <end> or end_date to <start> will be also counted. Defaults to False.
-            recurring (bool, optional): _description_. Defaults to False.
             all_day (bool, optional): _description_. Defaults to False.
-
-        Raises:
-            NotImplementedError: _description_
+            room (EventRoom, optional): Narrows occurrences to room, so (room, start_date, end_date) index is used. Defaults to None.
+            author (User, optional): Narrows occurrences to author, so (author, start_date, end_date) index is used. Defaults to None.
 
         Returns:
-            _type_: _description_
+            EventQuerySet: overlaped events
         """
-        not_recurring = self.none()
-        recurring = self.none()
-
-        start_time = start.time()
-        start_date = start.date()
-
-        # run for single parameter
-        if not end:
-            if intersection:
-                not_recurrring = self.filter(
-                    Q(is_recurring=False),
-                    Q(start_date__lte=start) & Q(end_date__gte=start),
-                )
-
-                recurring = self.filter(
-                    Q(is_recurring=True),
-                    Q(occurrences__has_key=str(start_date)),
-                    Q(start_date__time__lte=start_time)
-                    & Q(end_date__time__gte=start_time),
-                )
-            else:
-                not_recurrring = self.filter(
-                    Q(start_date__lt=start) & Q(end_date__gt=start)
-                )
-                recurring = self.filter(
-                    Q(is_recurring=True),
-                    Q(occurrences__has_key=str(start_date)),
-                    Q(start_date__time__lt=start_time)
-                    & Q(end_date__time__gt=start_time),
-                )
-            return not_recurrring | recurring
-
-        end_time = end.time()
+        occurrences = EventOccurrence.objects.overlaped_to(start, end, intersection)
 
-        if intersection:
-            not_recurring = self.filter(
-                Q(is_recurring=False),
-                Q(start_date__lte=start) & Q(end_date__gte=start)  # 1
-                | Q(start_date__lte=end) & Q(end_date__gte=end)  # 2
-                | Q(start_date=start)  # 3
-                | Q(start_date__gte=start) & Q(end_date__lte=end),  # 4
-            )
+        if room is not None:
+            occurrences = occurrences.filter(room=room)
 
-            # it's same as above, but for recurrent events
-            recurring = self.filter(
-                Q(is_recurring=True),
-                Q(occurrences__has_key=str(start_date)),
-                Q(start_date__time__lte=start_time)
-                & Q(end_date__time__gte=start_time)  # 1
-                | Q(start_date__time__lte=end_time)
-                & Q(end_date__time__gte=end_time)  # 2
-                | Q(start_date__time=start_time)  # 3
-                | Q(start_date__time__gte=start_time)
-                & Q(end_date__time__lte=end_time),  # 4
-            )
+        if author is not None:
+            occurrences = occurrences.filter(author=author)
 
-        else:
-            not_recurring = self.filter(
-                Q(is_recurring=False),
-                Q(start_date__lt=start) & Q(end_date__gt=start)  # 1
-                | Q(start_date__lt=end) & Q(end_date__gt=end)  # 2
-                | Q(start_date=start)  # 3
-                | Q(start_date__gt=start) & Q(end_date__lte=end),  # 4
-            )
-
-            recurring = self.filter(
-                Q(is_recurring=True),
-                Q(occurrences__has_key=str(start_date)),
-                Q(start_date__time__lt=start_time)
-                & Q(end_date__time__gt=start_time)  # 1
-                | Q(start_date__time__lt=end_time) & Q(end_date__time__gt=end_time)  # 2
-                | Q(start_date__time=start_time)  # 3
-                | Q(start_date__time__gt=start_time)
-                & Q(end_date__time__lte=end_time),  # 4
-            )
-
-        """Scenearios:
-        SD - start_date, ED - end_date, S - start, E - end
-        #(1|2) S------E
-        #(1|2)         S----------E
-        #(1|2)        S---E
-        #3         S-----------E
-        #3         S-----E | ------E
-        #4     S------------------E
-        #4    S----------------E
-                   SD---------ED
-        """
-
-        return not_recurring | recurring
+        return self.filter(id__in=occurrences.values("event_id"))
 
 
 class Event(UUIDModel, TimestampsModel, SoftDeleteModel):
@@ -192,6 +144,10 @@ class Event(UUIDModel, TimestampsModel, SoftDeleteModel):
         settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True
     )
     occurrences = models.JSONField(default=dict)
+    # end of the period for which occurrences are already set
+    occurrences_until = models.DateTimeField(null=True, default=None)
+    # latest known occurrence from which recurrences can be expanded
+    occurrences_cursor = models.JSONField(null=True, default=None)
 
     availability = models.CharField(
         _("Availability"),
@@ -202,6 +158,44 @@ class Event(UUIDModel, TimestampsModel, SoftDeleteModel):
 
     objects = EventQuerySet.as_manager()
 
+    # fields from which EventOccurrence rows are built
+    OCCURRENCES_STATE_FIELDS = [
+        "is_recurring",
+        "room_id",
+        "author_id",
+        "start_date",
+        "end_date",
+    ]
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._occurrences_state = self._get_occurrences_state()
+
+    def _get_occurrences_state(self):
+        # read from __dict__ so deferred fields are not loaded
+        state = [self.__dict__.get(field) for field in self.OCCURRENCES_STATE_FIELDS]
+        state.append(dict(self.__dict__.get("occurrences") or {}))
+        return state
+
+    def save(self, *args, **kwargs):
+        from . import cache
+
+        adding = self._state.adding
+        changed = self._occurrences_state != self._get_occurrences_state()
+        previous_room_id = self._occurrences_state[1]
+
+        super().save(*args, **kwargs)
+
+        if adding or changed:
+            self.set_occurrence_rows(delete=not adding)
+
+        # any saved change (also soft delete) may change room availability
+        cache.invalidate_room(self.room_id)
+        if previous_room_id not in [None, self.room_id]:
+            cache.invalidate_room(previous_room_id)
+
+        self._occurrences_state = self._get_occurrences_state()
+
     def get_next_occurrence(self, date_from=None):
         if not self.is_recurring:
             return None
@@ -213,7 +207,7 @@ class Event(UUIDModel, TimestampsModel, SoftDeleteModel):
         _next_occurrence = self.recurrences.after(
             today_datetime,
             inc=True,
-            dtstart=timezone.make_naive(self.start_date),
+            dtstart=self.get_recurrences_dtstart(today_datetime),
         )
         if _next_occurrence:
             _next_occurrence = _next_occurrence.date()
@@ -226,17 +220,72 @@ class Event(UUIDModel, TimestampsModel, SoftDeleteModel):
         if not self.is_recurring:
             return []
 
-        date_start = dtstart or self.start_date
+        period_start = date_from - timedelta(days=1)
+
+        date_start = dtstart or self.get_recurrences_dtstart(period_start)
 
         if not timezone.is_naive(date_start):
             date_start = timezone.make_naive(date_start)
 
-        return self.recurrences.between(
-            date_from - timedelta(days=1),
+        occurrences = self.recurrences.between(
+            period_start,
             date_to + timedelta(days=1),
             dtstart=date_start,
         )
 
+        if not dtstart and len(occurrences):
+            self.move_occurrences_cursor(occurrences[0])
+
+        return occurrences
+
+    @property
+    def is_cursor_supported(self):
+        """Recurrences expanded from any of its occurrences give the same following occurrences
+        only for single rule without count, other recurrences are always expanded from start_date"""
+        if not self.recurrences or len(self.recurrences.rrules) != 1:
+            return False
+        if self.recurrences.exrules:
+            return False
+        return not self.recurrences.rrules[0].count
+
+    def get_occurrences_cursor_key(self):
+        """Cursor is valid only for start_date and recurrences for which it was found"""
+        return f"{self.start_date.isoformat()};{recurrence.serialize(self.recurrences)}"
+
+    def get_recurrences_dtstart(self, dt: datetime):
+        """Returns naive dtstart from which recurrences should be expanded to reach dt.
+        Latest known occurrence is used when it's not after dt, so old events don't replay their whole history.
+        """
+        dtstart = timezone.make_naive(self.start_date)
+
+        if not self.occurrences_cursor or not self.is_cursor_supported:
+            return dtstart
+
+        if self.occurrences_cursor["key"] != self.get_occurrences_cursor_key():
+            return dtstart
+
+        occurrence = datetime.fromisoformat(self.occurrences_cursor["occurrence"])
+        if occurrence > dt or occurrence < dtstart:
+            return dtstart
+
+        return occurrence
+
+    def move_occurrences_cursor(self, occurrence: datetime):
+        """Moves cursor forward to given naive occurrence (saved with next save())"""
+        if not self.is_cursor_supported:
+            return
+
+        key = self.get_occurrences_cursor_key()
+        cursor = self.occurrences_cursor
+        if (
+            cursor
+            and cursor["key"] == key
+            and datetime.fromisoformat(cursor["occurrence"]) >= occurrence
+        ):
+            return
+
+        self.occurrences_cursor = {"key": key, "occurrence": occurrence.isoformat()}
+
     def set_next_occurrence(self, date_from=None):
 
         _next_occurrence = self.get_next_occurrence(date_from)
@@ -274,6 +323,195 @@ class Event(UUIDModel, TimestampsModel, SoftDeleteModel):
 
         return occurrences
 
+    def get_occurrence_periods(self, occurrences_dates=None):
+        """Converts event to list of half-open (start, end) aware datetimes.
+        Not recurring event has single period, not ended event lasts at most MAX_BUSY_DURATION.
+        Recurring event occurrence starts at event start_date time and lasts as long as event.
+
+        Args:
+            occurrences_dates (list, optional): Dates of recurring event occurrences. Defaults to all set occurrences.
+        """
+        if not self.is_recurring:
+            end_date = self.end_date or self.start_date + timedelta(
+                seconds=conf.MAX_BUSY_DURATION
+            )
+            return [(self.start_date, end_date)]
+
+        if not self.end_date:
+            return []
+
+        if occurrences_dates is None:
+            occurrences_dates = self.prepare_occurrences_from_db()
+
+        start_time = timezone.make_naive(self.start_date).time()
+        duration = self.end_date - self.start_date
+
+        periods = []
+        for occurrence_date in occurrences_dates:
+            start = timezone.make_aware(datetime.combine(occurrence_date, start_time))
+            periods.append((start, start + duration))
+        return periods
+
+    def create_occurrence_rows(self, occurrences_dates=None):
+        from . import occupancy
+
+        periods = self.get_occurrence_periods(occurrences_dates)
+        EventOccurrence.objects.bulk_create(
+            EventOccurrence(
+                event=self,
+                room_id=self.room_id,
+                author_id=self.author_id,
+                start_date=start,
+                end_date=end,
+            )
+            for start, end in periods
+        )
+        occupancy.invalidate_periods(self.room_id, self.author_id, periods)
+
+    def set_occurrence_rows(self, delete=True):
+        """Replaces EventOccurrence rows of event with rows built from occurrences"""
+        from . import occupancy
+
+        if delete:
+            rows = EventOccurrence.objects.filter(event=self)
+            occupancy.invalidate_rows(rows)
+            rows.delete()
+
+        self.create_occurrence_rows()
+
+    def occurrences_after(self, dt: datetime):
+        """Returns set occurrences (in db format) that start after given naive datetime"""
+        start_time = timezone.make_naive(self.start_date).time()
+
+        return {
+            key: value
+            for key, value in self.occurrences.items()
+            if datetime.combine(date.fromisoformat(key), start_time) > dt
+        }
+
+    def extend_occurrences(self, occurrences_list, until: datetime, trim_to: datetime):
+        """Adds new occurrences to already set ones and removes those starting not after trim_to.
+        Only EventOccurrence rows of added and removed dates are written.
+
+        Args:
+            occurrences_list (list): datetime occurrences to add
+            until (datetime): End of the period for which occurrences are set now
+            trim_to (datetime): Occurrences that start at or before this (naive) datetime are removed
+
+        Returns:
+            list: datetime occurrences that were not set before
+        """
+        occurrences = self.occurrences_after(trim_to)
+        trimmed = len(occurrences) != len(self.occurrences)
+
+        added = [dt for dt in occurrences_list if str(dt.date()) not in occurrences]
+        occurrences.update(self.prepare_occurrences_for_db(added))
+
+        if trimmed:
+            from . import occupancy
+
+            rows = EventOccurrence.objects.filter(
+                event=self, start_date__lte=timezone.make_aware(trim_to)
+            )
+            occupancy.invalidate_rows(rows)
+            rows.delete()
+
+        self.occurrences = occurrences
+        self.occurrences_until = until
+        self.create_occurrence_rows(sorted(set(dt.date() for dt in added)))
+
+        # rows are already in sync, so save() has nothing to rebuild
+        self._occurrences_state = self._get_occurrences_state()
+        self.save(
+            update_fields=[
+                "occurrences",
+                "occurrences_until",
+                "occurrences_cursor",
+                "updated_at",
+            ]
+        )
+
+        return added
+
+
+class EventOccurrence(models.Model):
+    """Occurrence of event stored as normalized half-open interval [start_date, end_date).
+    Not recurring event has one occurrence, recurring one per each concrete occurrence.
+    Used by overlaped_to() to find overlaps with a single indexed range predicate.
+    """
+
+    event = models.ForeignKey(
+        Event,
+        on_delete=models.CASCADE,
+        related_name="event_occurrences",
+        db_index=False,
+    )
+    room = models.ForeignKey(
+        EventRoom,
+        on_delete=models.CASCADE,
+        related_name="event_occurrences",
+        db_index=False,
+    )
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="event_occurrences",
+        db_index=False,
+    )
+    start_date = models.DateTimeField()
+    end_date = models.DateTimeField()
+
+    objects = EventOccurrenceQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["event", "start_date", "end_date"],
+                name="event_occurrence_event_idx",
+            ),
+            models.Index(
+                fields=["room", "start_date", "end_date"],
+                name="event_occurrence_room_idx",
+            ),
+            models.Index(
+                fields=["author", "start_date", "end_date"],
+                name="event_occurrence_author_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.event_id}: {self.start_date} - {self.end_date}"
+
+
+class RoomTransition(models.Model):
+    """Upcoming instant at which availability of room may change - start or end of
+    one of its events occurrences. Instants are unique per room, the earliest one is
+    awaited by single ticker task which then recomputes availability of due rooms.
+    """
+
+    room = models.ForeignKey(
+        EventRoom,
+        on_delete=models.CASCADE,
+        related_name="transitions",
+        db_index=False,
+    )
+    date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["room", "date"], name="room_transition_unique"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["date"], name="room_transition_date_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.room_id}: {self.date}"
+
 
 class Report(UUIDModel, TimestampsModel):
     class Availabilities(models.TextChoices):
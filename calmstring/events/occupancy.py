@@ -0,0 +1,181 @@
+"""Per-day occupancy bitmaps of rooms and authors.
+
+Day is split into slots of GAP_BETWEEN_EVENTS seconds, each bit of bitmap tells if
+any busy or unavailable event occupies the slot. Bitmaps are built from EventOccurrence
+rows and stored in OCCUPANCY_CACHE. Bitmaps of days touched by written or removed
+EventOccurrence rows and by events signals are dropped and rebuilt lazily on next check.
+
+Rows written by other processes (web workers, huey consumer) drop bitmaps only from
+shared cache, so negative answer of bitmap kept in process memory (the default
+"default" cache without CACHES setting) may be stale. Such bitmaps are not trusted,
+see is_cache_shared().
+
+Slots are rounded outwards, so bitmap may report conflict that doesn't exist in the
+database (e.g. 10:00-10:02 and 10:03-10:05) but never misses the existing one.
+"""
+
+from collections import defaultdict
+from datetime import datetime, timedelta, date, time
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+from . import conf
+from .models import Event, EventOccurrence
+
+BLOCKING_AVAILABILITIES = [
+    Event.Availabilities.BUSY,
+    Event.Availabilities.UNAVAILABLE,
+]
+
+ROOM = "room"
+AUTHOR = "author"
+
+
+# backends not shared by processes
+LOCAL_CACHE_BACKENDS = (LocMemCache, DummyCache)
+
+
+def get_cache():
+    return caches[conf.OCCUPANCY_CACHE]
+
+
+def is_cache_shared() -> bool:
+    """Tells if bitmaps are invalidated by all processes writing EventOccurrence rows,
+    so their negative answers can skip the database. OCCUPANCY_CACHE_SHARED setting
+    overrides detection by cache backend."""
+    shared = conf.OCCUPANCY_CACHE_SHARED
+    if shared is not None:
+        return shared
+    return not isinstance(get_cache(), LOCAL_CACHE_BACKENDS)
+
+
+def get_slot_seconds():
+    return max(int(conf.GAP_BETWEEN_EVENTS), 60)
+
+
+def day_start(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def split_to_days(start: datetime, end: datetime):
+    """Yields (day, start, end) parts of period, each within single local day"""
+    start = timezone.localtime(start)
+    end = timezone.localtime(end)
+
+    day = start.date()
+    while True:
+        next_day_start = day_start(day + timedelta(days=1))
+        yield day, max(start, day_start(day)), min(end, next_day_start)
+
+        if end <= next_day_start:
+            break
+        day += timedelta(days=1)
+
+
+def period_mask(day: date, start: datetime, end: datetime) -> int:
+    """Bitmap of slots covered by part of period [start, end) within given day.
+    Empty period covers slot of its start.
+    """
+    slot = get_slot_seconds()
+    beginning = day_start(day)
+
+    first = int((start - beginning).total_seconds()) // slot
+    last = max(-(-int((end - beginning).total_seconds()) // slot), first + 1)
+
+    return ((1 << (last - first)) - 1) << first
+
+
+def cache_key(kind: str, owner_id, day: date) -> str:
+    return f"events:occupancy:{kind}:{owner_id}:{day.isoformat()}"
+
+
+def build_day_bitmap(kind: str, owner_id, day: date) -> int:
+    beginning = day_start(day)
+    periods = (
+        EventOccurrence.objects.existing()
+        .filter(
+            **{f"{kind}_id": owner_id},
+            event__availability__in=BLOCKING_AVAILABILITIES,
+        )
+        .overlaped_to(beginning, day_start(day + timedelta(days=1)))
+        .values_list("start_date", "end_date")
+    )
+
+    bitmap = 0
+    for start, end in periods:
+        bitmap |= period_mask(
+            day, max(start, beginning), min(end, day_start(day + timedelta(days=1)))
+        )
+    return bitmap
+
+
+def get_day_bitmaps(kind: str, owner_id, days) -> dict:
+    """Returns {day: bitmap}, missing bitmaps are built and cached"""
+    cache = get_cache()
+    keys = {cache_key(kind, owner_id, day): day for day in days}
+
+    cached = cache.get_many(keys.keys())
+    bitmaps = {keys[key]: bitmap for key, bitmap in cached.items()}
+
+    missing = {
+        key: build_day_bitmap(kind, owner_id, day)
+        for key, day in keys.items()
+        if day not in bitmaps
+    }
+    if missing:
+        cache.set_many(missing, timeout=conf.OCCUPANCY_TIMEOUT)
+        bitmaps.update({keys[key]: bitmap for key, bitmap in missing.items()})
+
+    return bitmaps
+
+
+def may_overlap(kind: str, owner_id, start: datetime, end: datetime = None) -> bool:
+    """Tests period against owner bitmaps.
+
+    Returns:
+        bool: False when period surely doesn't overlap any blocking event of owner,
+        True when it may overlap and database has to be asked.
+    """
+    end = end or start
+    masks = {day: period_mask(day, s, e) for day, s, e in split_to_days(start, end)}
+    bitmaps = get_day_bitmaps(kind, owner_id, masks.keys())
+
+    return any(bitmaps[day] & mask for day, mask in masks.items())
+
+
+def invalidate_periods(room_id, author_id, periods):
+    """Drops room and author bitmaps of all days touched by periods"""
+    days = set()
+    for start, end in periods:
+        days.update(day for day, _, _ in split_to_days(start, end))
+
+    keys = [
+        cache_key(kind, owner_id, day)
+        for kind, owner_id in ((ROOM, room_id), (AUTHOR, author_id))
+        if owner_id is not None
+        for day in days
+    ]
+    get_cache().delete_many(keys)
+    # bitmap rebuilt by another process before commit would miss new rows
+    transaction.on_commit(lambda: get_cache().delete_many(keys))
+
+
+def invalidate_rows(rows):
+    """Drops bitmaps of days of EventOccurrence rows which are going to be removed, so
+    days occurrences moved away from don't keep their bits"""
+    periods = defaultdict(list)
+    for room_id, author_id, start, end in rows.values_list(
+        "room_id", "author_id", "start_date", "end_date"
+    ):
+        periods[(room_id, author_id)].append((start, end))
+
+    for (room_id, author_id), owner_periods in periods.items():
+        invalidate_periods(room_id, author_id, owner_periods)
+
+
+def invalidate_event(event: Event):
+    invalidate_periods(event.room_id, event.author_id, event.get_occurrence_periods())
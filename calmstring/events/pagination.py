@@ -0,0 +1,11 @@
+from rest_framework.pagination import CursorPagination
+
+
+class EventsCursorPagination(CursorPagination):
+    """Cursor pagination over (start_date, id), pages are found by index range
+    instead of offsets, so deep pages cost the same as the first one"""
+
+    ordering = ("start_date", "id")
+    page_size = 100
+    page_size_query_param = "page_size"
+    max_page_size = 1000
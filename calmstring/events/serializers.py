@@ -1,6 +1,8 @@
 from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
+from django.db.models import F, TextField
+from django.db.models.functions import Cast
 from .validators import validate_dates, validate_recurrence
 from . import conf, exceptions
 
@@ -33,7 +35,60 @@ class EventSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Event
-        exclude = ["id"]
+        # occurrences_until and occurrences_cursor are internal state of expansion
+        exclude = ["id", "occurrences_until", "occurrences_cursor"]
+
+
+class EventReadSerializer(serializers.Serializer):
+    """Read only counterpart of EventSerializer with the same output, serializes rows of
+    queryset prepared by setup_queryset() - plain dicts with related uuids
+    already joined, so no model instances are built and no extra queries are made.
+    """
+
+    VALUES = [
+        "uuid",
+        "created_at",
+        "updated_at",
+        "is_deleted",
+        "name",
+        "description",
+        "start_date",
+        "end_date",
+        "is_all_day",
+        "duration",
+        "is_recurring",
+        "next_occurrence",
+        "occurrences",
+        "availability",
+    ]
+
+    room = serializers.UUIDField(source="room_uuid")
+    author = serializers.UUIDField(source="author_uuid", allow_null=True)
+    uuid = serializers.UUIDField()
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+    is_deleted = serializers.BooleanField()
+    name = serializers.CharField(allow_null=True)
+    description = serializers.CharField(allow_null=True)
+    start_date = serializers.DateTimeField()
+    end_date = serializers.DateTimeField(allow_null=True)
+    is_all_day = serializers.BooleanField()
+    duration = serializers.IntegerField()
+    is_recurring = serializers.BooleanField()
+    # raw db value, the same as recurrences serialized by EventSerializer
+    recurrences = serializers.CharField(source="recurrences_text", allow_null=True)
+    next_occurrence = serializers.DateField(allow_null=True)
+    occurrences = serializers.JSONField()
+    availability = serializers.CharField()
+
+    @classmethod
+    def setup_queryset(cls, queryset):
+        return queryset.values(
+            *cls.VALUES,
+            room_uuid=F("room__uuid"),
+            author_uuid=F("author__uuid"),
+            recurrences_text=Cast("recurrences", output_field=TextField()),
+        )
 
 
 class OccupyRoomSerializer(serializers.ModelSerializer):
@@ -135,3 +190,47 @@ class ReportSerializer(serializers.ModelSerializer):
     class Meta:
         model = Report
         exclude = ["id"]
+
+
+class FreeRoomsSearchSerializer(serializers.Serializer):
+    start_date = serializers.DateTimeField()
+    end_date = serializers.DateTimeField()
+    duration = serializers.IntegerField(min_value=60)
+
+    def validate(self, data):
+        try:
+            validate_dates(data["start_date"], data["end_date"])
+        except exceptions.ValidationError as e:
+            raise serializers.ValidationError(e)
+
+        if (data["end_date"] - data["start_date"]).total_seconds() < data["duration"]:
+            raise serializers.ValidationError(_("Duration is longer than period"))
+
+        return data
+
+
+class FreePeriodSerializer(serializers.Serializer):
+    start_date = serializers.DateTimeField()
+    end_date = serializers.DateTimeField()
+
+    def to_representation(self, instance):
+        start_date, end_date = instance
+        return super().to_representation(
+            {"start_date": start_date, "end_date": end_date}
+        )
+
+
+class FreeRoomSerializer(serializers.Serializer):
+    room = serializers.UUIDField(source="room.uuid")
+    name = serializers.CharField(source="room.room.name")
+    periods = FreePeriodSerializer(many=True)
+
+
+class EventsHistorySearchSerializer(serializers.Serializer):
+    at = serializers.DateTimeField()
+    room = RoomField(required=False)
+
+
+class RoomEventsHistorySerializer(serializers.Serializer):
+    room = serializers.UUIDField(source="room.uuid")
+    events = EventSerializer(many=True)
@@ -1,9 +1,8 @@
 from django.dispatch import receiver
-from django.utils import timezone
 import changes.signals
 import rooms.signals
 from . import signals as events_signals
-from . import tasks, conf, logic
+from . import tasks, conf, logic, occupancy, cache
 
 
 @receiver(
@@ -18,23 +17,7 @@ def event_occurrences_handler(sender, **kwargs):
 
     event = kwargs["event"]
 
-    tasks.call_set_event_occurrences(
-        event.id,
-    )
-
-
-def basic_room_availability_handler(event):
-    if event.start_date > timezone.now():
-        tasks.call_set_event_room_availability.schedule(
-            (event.room.id), eta=event.start_date
-        )
-    else:
-        tasks.call_set_event_room_availability(event.room.id)
-
-    if event.end_date:
-        tasks.call_set_event_room_availability.schedule(
-            (event.room.id,), eta=event.end_date
-        )
+    tasks.enqueue_coalesced(tasks.call_set_event_occurrences, event.id)
 
 
 @receiver(
@@ -42,45 +25,57 @@ def basic_room_availability_handler(event):
         events_signals.occupy_created,
         events_signals.occupy_edited,
         events_signals.occupy_ended,
-    ]
-)
-def room_availability_handler_for_busy(sender, **kwargs):
-    event = kwargs["event"]
-
-    basic_room_availability_handler(event)
-
-
-@receiver(
-    [
+        events_signals.occupy_deleted,
         events_signals.report_unavailable_created,
         events_signals.report_unavailable_edited,
+        events_signals.report_unavailable_deleted,
+        events_signals.event_set_occurrences,
     ]
 )
-def room_availability_handler_for_unavailable_not_recurring(sender, **kwargs):
-    if "report" in kwargs:
+def room_transitions_handler(sender, **kwargs):
+    event = kwargs.get("event")
+    if event is None:
         return
 
-    event = kwargs["event"]
+    tasks.enqueue_coalesced(tasks.call_set_room_transitions, event.room_id)
 
-    if event.is_recurring:
-        return
 
-    basic_room_availability_handler(event)
+@receiver(events_signals.events_reverted)
+def events_reverted_handler(sender, events, room_ids, **kwargs):
+    # restored occurrences may be expanded for older period
+    for event in events:
+        if event.is_recurring and not event.is_deleted:
+            tasks.enqueue_coalesced(tasks.call_set_event_occurrences, event.id)
 
+    # one recomputation per room, however many of its events were reverted
+    for room_id in room_ids:
+        tasks.enqueue_coalesced(tasks.call_set_room_transitions, room_id)
 
-@receiver([events_signals.event_set_occurrences])
-def room_availability_handler_for_recurring_events(sender, **kwargs):
-    event = kwargs["event"]
-    occurrences = kwargs["occurrences"]
 
-    if not len(occurrences):
-        return
+@receiver(events_signals.events_occurrences_rebuilt)
+def events_occurrences_rebuilt_handler(sender, room_ids, **kwargs):
+    for room_id in room_ids:
+        tasks.enqueue_coalesced(tasks.call_set_room_transitions, room_id)
+
 
-    first_occurence_date_iso = occurrences[0].date().isoformat()
+@receiver(
+    [
+        events_signals.occupy_created,
+        events_signals.occupy_edited,
+        events_signals.occupy_ended,
+        events_signals.occupy_deleted,
+        events_signals.report_unavailable_created,
+        events_signals.report_unavailable_edited,
+        events_signals.report_unavailable_deleted,
+    ]
+)
+def event_changed_cache_handler(sender, **kwargs):
+    event = kwargs.get("event")
+    if event is None:
+        return
 
-    tasks.schedule_for_recurrent_event_call_set_event_room_availability(
-        event.id, first_occurence_date_iso
-    )
+    occupancy.invalidate_event(event)
+    cache.invalidate_room(event.room_id)
 
 
 """External events"""
@@ -1,6 +1,5 @@
 import django.dispatch
 
-
 """
     kwargs:
         - event: Event instance
@@ -40,10 +39,23 @@ event_set_next_occurrence = django.dispatch.Signal()  # maybe not used
 """
     kwargs:
         - event: Event instance
-        - occurrences: List of datetime occurrences
+        - occurrences: List of datetime occurrences (only newly added ones when set incrementally)
 """
 event_set_occurrences = django.dispatch.Signal()
 
+"""
+    kwargs:
+        - events: List of reverted Event instances
+        - room_ids: Ids of rooms whose events were reverted
+"""
+events_reverted = django.dispatch.Signal()
+
+"""
+    kwargs:
+        - room_ids: Ids of rooms whose events got rebuilt occurrences
+"""
+events_occurrences_rebuilt = django.dispatch.Signal()
+
 """
     kwargs:
         - room: Event room instance
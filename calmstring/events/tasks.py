@@ -1,57 +1,222 @@
+from contextlib import ExitStack, contextmanager
 from datetime import datetime, timedelta, date
 from multiprocessing.sharedctypes import Value
+import json
+import logging
+import time
+import uuid
+
 from django.utils import timezone
-from huey.contrib.djhuey import db_task
+from huey.contrib.djhuey import HUEY, db_task
+from huey.exceptions import TaskLockedException
+
+from utils import outbox
+from utils.cache import get_hash_store, set_if_earlier
+from utils.task_queue import Priorities
 
 from .models import Event, EventRoom
-from . import logic
+from . import logic, conf
+
+logger = logging.getLogger(__name__)
+
+STALE_COALESCING_AFTER = 60 * 10
+
+
+def get_coalescing_key(task, *args):
+    return f"coalescing:{task.func.__name__}:" + ",".join(map(str, sorted(args)))
+
+
+def enqueue_coalesced(task, *args):
+    """Enqueues task TASKS_DEBOUNCE seconds later, unless the same task with the same
+    arguments is already pending - then the call collapses into the pending one.
+    Pending marker is kept in huey storage, task removes it with release_coalesced()
+    when it starts, so changes made during its run enqueue it again.
+    With immediate huey task is called right away. Inside outbox() block the task is
+    enqueued after the transaction commits.
+    """
+    return outbox.emit(lambda: _enqueue_coalesced(task, *args))
+
+
+def _enqueue_coalesced(task, *args):
+    if HUEY.immediate:
+        return task(*args)
+
+    key = get_coalescing_key(task, *args)
+    eta = timezone.now().timestamp() + conf.TASKS_DEBOUNCE
+
+    if not HUEY.put_if_empty(key, eta):
+        pending_eta = HUEY.get(key, peek=True)
+        # marker of task that never started (e.g. lost with consumer) is stale
+        if pending_eta is None or pending_eta + STALE_COALESCING_AFTER > eta:
+            return None
+        HUEY.put(key, eta)
+
+    return task.schedule(args, delay=conf.TASKS_DEBOUNCE)
+
+
+def release_coalesced(task, *args):
+    HUEY.delete(get_coalescing_key(task, *args))
+
+
+ROOM_SLOT_RETRIES = 30
+
+
+def get_room_slot(room_event_id) -> int:
+    return int(room_event_id) % conf.ROOM_TASK_SLOTS
+
 
+def group_by_room_slot(room_event_ids) -> dict:
+    """Returns {slot: [room ids]} of given rooms"""
+    slots = {}
+    for room_event_id in room_event_ids:
+        slots.setdefault(get_room_slot(room_event_id), []).append(room_event_id)
+    return slots
 
-@db_task()
+
+ROOM_SLOT_POLL_INTERVAL = 0.05
+
+
+@contextmanager
+def blocking_lock(name):
+    """Waits for huey lock up to the time retries of locked room task would take,
+    then runs without it rather than dropping the work"""
+    lock = HUEY.lock_task(name)
+    deadline = time.monotonic() + ROOM_SLOT_RETRIES
+    acquired = False
+    while not acquired and time.monotonic() < deadline:
+        try:
+            lock.__enter__()
+            acquired = True
+        except TaskLockedException:
+            time.sleep(ROOM_SLOT_POLL_INTERVAL)
+    if not acquired:
+        logger.warning(f"Running without lock {name}, it's held too long")
+
+    try:
+        yield
+    finally:
+        if acquired:
+            lock.__exit__(None, None, None)
+
+
+@contextmanager
+def room_slots_lock(room_event_ids):
+    """Holds huey locks of slots of given rooms, so tasks of the same room never run
+    concurrently on different workers. Locks are acquired in slot order, if any is
+    held by other task TaskLockedException is raised and room tasks are retried later.
+    Tasks run in place by immediate huey are never retried, so they wait for the lock.
+    """
+    with ExitStack() as stack:
+        for slot in sorted(group_by_room_slot(room_event_ids)):
+            name = f"events:room-slot:{slot}"
+            if HUEY.immediate:
+                stack.enter_context(blocking_lock(name))
+            else:
+                stack.enter_context(HUEY.lock_task(name))
+        yield
+
+
+def enqueue_by_room_slot(task, room_event_ids):
+    """Enqueues task once per room slot with rooms of that slot"""
+    return [
+        task(*slot_room_event_ids)
+        for _, slot_room_event_ids in sorted(group_by_room_slot(room_event_ids).items())
+    ]
+
+
+@db_task(priority=Priorities.OCCURRENCES)
 def set_event_next_occurrence(event_id):
     event = Event.objects.get(id=event_id)
     event.set_next_occurrence()
 
 
-@db_task()
-def call_set_event_occurrences(event_id):
+@db_task(priority=Priorities.OCCURRENCES)
+def call_set_event_occurrences(event_id, incremental=False):
+    release_coalesced(call_set_event_occurrences, event_id)
+
     event = Event.objects.get(id=event_id)
-    next_schedule = logic.set_event_occurrences(event)
+    next_schedule = logic.set_event_occurrences(event, incremental=incremental)
 
+    # following calls only expand the part of period that is not covered yet
     if next_schedule:
-        call_set_event_occurrences.schedule((event_id,), eta=next_schedule)
+        call_set_event_occurrences.schedule((event_id, True), eta=next_schedule)
 
 
-@db_task()
-def call_set_event_room_availability(room_event_id):
-    event_room = EventRoom.objects.get(id=room_event_id)
+def set_rooms_availability(room_event_ids):
+    if len(room_event_ids) == 1:
+        event_room = EventRoom.objects.get(id=room_event_ids[0])
+        logic.set_event_room_availability(event_room)
+        return
 
-    logic.set_event_room_availability(event_room)
+    # rooms changing together are computed and saved at once
+    event_rooms = list(EventRoom.objects.filter(id__in=room_event_ids))
+    logic.set_event_rooms_availability(event_rooms)
 
 
-@db_task()
-def schedule_for_recurrent_event_call_set_event_room_availability(event_id, occurrence_date):
-    event = Event.objects.get(id=event_id)
+@db_task(priority=Priorities.AVAILABILITY, retries=ROOM_SLOT_RETRIES, retry_delay=1)
+def call_set_event_room_availability(*room_event_ids):
+    with room_slots_lock(room_event_ids):
+        set_rooms_availability(room_event_ids)
 
-    occurrences = event.prepare_occurrences_from_db()
 
-    current_occurrence = date.fromisoformat(occurrence_date)
+@db_task(priority=Priorities.AVAILABILITY, retries=ROOM_SLOT_RETRIES, retry_delay=1)
+def call_set_room_transitions(*room_event_ids):
+    """Sets current availability of rooms and replaces their upcoming transitions"""
+    with room_slots_lock(room_event_ids):
+        # task waiting for the lock still collapses new calls
+        release_coalesced(call_set_room_transitions, *room_event_ids)
+        now = timezone.now()
 
-    next_schedule_start = timezone.make_aware(
-        datetime.combine(current_occurrence, event.start_date.time())
-    )
+        set_rooms_availability(room_event_ids)
+        logic.set_room_transitions(room_event_ids, now)
 
-    next_schedule_end = next_schedule_start + timedelta(seconds=event.duration)
+    schedule_room_transitions_tick(logic.get_next_room_transition())
 
-    call_set_event_room_availability.schedule((event.room.id,), eta=next_schedule_start)
-    call_set_event_room_availability.schedule((event.room.id,), eta=next_schedule_end)
 
-    current_date_index = occurrences.index(current_occurrence)
-    try:
-        next_date = occurrences[current_date_index + 1]
-    except IndexError:
+@db_task(priority=Priorities.AVAILABILITY)
+def tick_room_transitions():
+    room_event_ids = logic.pop_due_room_transitions(timezone.now())
+    if room_event_ids:
+        enqueue_by_room_slot(call_set_event_room_availability, room_event_ids)
+
+    schedule_room_transitions_tick(logic.get_next_room_transition())
+
+
+TICK_KEY = "events:transitions"
+
+
+def schedule_room_transitions_tick(eta: datetime):
+    """Schedules single ticker at the earliest transition eta. Pending ticker is
+    replaced (and revoked) only by earlier one, marker of pending ticker is compared
+    and set in single step of hash store, so concurrent room workers never cancel
+    earlier ticker scheduled meanwhile."""
+    if eta is None:
         return
 
-    schedule_for_recurrent_event_call_set_event_room_availability.schedule(
-        (event.room.id, next_date.isoformat()), eta=next_schedule_end
+    task_id = str(uuid.uuid4())
+    is_set, previous = set_if_earlier(
+        get_hash_store(),
+        TICK_KEY,
+        "tick",
+        {"eta": eta.timestamp(), "id": task_id},
+        timezone.now().timestamp(),
+    )
+    if not is_set:
+        return
+
+    tick_room_transitions.schedule(eta=eta, id=task_id)
+    # ticker in the past has already run
+    if previous and previous["eta"] > timezone.now().timestamp():
+        HUEY.revoke_by_id(previous["id"])
+
+
+@db_task(priority=Priorities.AVAILABILITY)
+def schedule_for_recurrent_event_call_set_event_room_availability(
+    event_id, occurrence_date
+):
+    """Replaced with room transitions, kept for tasks scheduled before"""
+    room_event_id = (
+        Event.objects.filter(id=event_id).values_list("room_id", flat=True).first()
     )
+    if room_event_id:
+        call_set_room_transitions(room_event_id)
@@ -0,0 +1,137 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command, CommandError
+from django.test import override_settings
+from freezegun import freeze_time
+
+from utils.dates import tz_datetime
+from ..models import Event, EventOccurrence, EventRoom, RoomTransition
+from .. import cache, tasks
+from .utils import TestCaseWithRooms
+
+
+@freeze_time("2020-01-01 07:00:00")
+@override_settings(CALMSTRING={"OCCURRENCES_PERIOD": 60 * 60 * 24 * 7})
+class TestRebuildOccurrencesCommand(TestCaseWithRooms):
+    def setUp(self):
+        super().setUp()
+        self.daily = self.create_event(
+            availability=Event.Availabilities.UNAVAILABLE,
+            start_date=tz_datetime(2019, 1, 1, 8, 0, 0),
+            end_date=tz_datetime(2019, 1, 1, 12, 0, 0),
+            is_recurring=True,
+            recurrences=self.clean_recurrence("RRULE:FREQ=DAILY"),
+        )
+        self.weekly = self.create_event(
+            room=self.room2,
+            availability=Event.Availabilities.UNAVAILABLE,
+            start_date=tz_datetime(2019, 1, 1, 8, 0, 0),
+            end_date=tz_datetime(2019, 1, 1, 12, 0, 0),
+            is_recurring=True,
+            recurrences=self.clean_recurrence("RRULE:FREQ=WEEKLY"),
+        )
+
+    def call_command(self, *args, **kwargs):
+        out = StringIO()
+        call_command("rebuild_occurrences", *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def test_rebuild(self):
+        output = self.call_command(workers=1, chunk_size=1)
+
+        self.assertIn("Processed 2/2 events", output)
+
+        self.daily.refresh_from_db()
+        self.weekly.refresh_from_db()
+        self.assertEqual(len(self.daily.occurrences), 9)
+        self.assertEqual(len(self.weekly.occurrences), 2)
+        self.assertEqual(self.daily.occurrences_until, tz_datetime(2020, 1, 8, 7, 0, 0))
+
+        self.assertEqual(EventOccurrence.objects.filter(event=self.daily).count(), 9)
+        self.assertEqual(EventOccurrence.objects.filter(event=self.weekly).count(), 2)
+
+    def test_rooms_updated(self):
+        RoomTransition.objects.all().delete()
+
+        with mock.patch.object(cache, "invalidate_room") as invalidate_room:
+            self.call_command(workers=1, chunk_size=1)
+
+        self.assertEqual(
+            sorted(call.args[0] for call in invalidate_room.call_args_list),
+            [self.room1.id, self.room2.id],
+        )
+        # transitions of rebuilt occurrences are recomputed
+        self.assertEqual(
+            set(RoomTransition.objects.values_list("room_id", flat=True)),
+            {self.room1.id, self.room2.id},
+        )
+
+    def test_dry_run(self):
+        with self.assertRaises(CommandError):
+            self.call_command("--dry-run", workers=1)
+
+        self.daily.refresh_from_db()
+        self.assertEqual(self.daily.occurrences, {})
+
+        self.call_command(workers=1)
+        output = self.call_command("--dry-run", workers=1)
+        self.assertIn("All occurrences are up to date", output)
+
+
+# freezegun can't be used with process pool, it stops clock used to wait for workers
+class TestRebuildOccurrencesCommandInProcessPool(TestCaseWithRooms):
+    def test_same_as_in_current_process(self):
+        event = self.create_event(
+            availability=Event.Availabilities.UNAVAILABLE,
+            start_date=tz_datetime(2019, 1, 1, 8, 0, 0),
+            end_date=tz_datetime(2019, 1, 1, 12, 0, 0),
+            is_recurring=True,
+            recurrences=self.clean_recurrence("RRULE:FREQ=DAILY"),
+        )
+
+        call_command("rebuild_occurrences", workers=1, stdout=StringIO())
+        event.refresh_from_db()
+        in_process = event.occurrences
+
+        Event.objects.filter(id=event.id).update(occurrences={})
+
+        call_command("rebuild_occurrences", workers=2, stdout=StringIO())
+        event.refresh_from_db()
+        self.assertEqual(event.occurrences, in_process)
+
+
+@freeze_time("2020-01-01 07:00:00")
+class TestSetRoomTransitionsCommand(TestCaseWithRooms):
+    def test_existing_events(self):
+        for room, hour in [(self.room1, 9), (self.room2, 6)]:
+            self.create_event(
+                room=room,
+                availability=Event.Availabilities.UNAVAILABLE,
+                start_date=tz_datetime(2020, 1, 1, hour, 0, 0),
+                end_date=tz_datetime(2020, 1, 1, hour + 2, 0, 0),
+            )
+        # as left by migration, which creates empty table
+        RoomTransition.objects.all().delete()
+        EventRoom.objects.update(availability=EventRoom.Availabilities.FREE)
+
+        out = StringIO()
+        with mock.patch.object(tasks, "schedule_room_transitions_tick") as tick:
+            call_command("set_room_transitions", chunk_size=1, stdout=out)
+
+        self.assertIn(
+            f"Set transitions of {EventRoom.objects.count()} rooms", out.getvalue()
+        )
+        self.assertEqual(
+            sorted(RoomTransition.objects.values_list("room_id", "date")),
+            sorted(
+                [
+                    (self.room1.id, tz_datetime(2020, 1, 1, 9, 0, 0)),
+                    (self.room1.id, tz_datetime(2020, 1, 1, 11, 0, 0)),
+                    (self.room2.id, tz_datetime(2020, 1, 1, 8, 0, 0)),
+                ]
+            ),
+        )
+        self.room2.refresh_from_db()
+        self.assertEqual(self.room2.availability, EventRoom.Availabilities.UNAVAILABLE)
+        tick.assert_called_once_with(tz_datetime(2020, 1, 1, 8, 0, 0))
@@ -6,7 +6,7 @@ from .utils import TestCaseWithRooms, TestCaseForHuey
 from huey.contrib.djhuey import HUEY
 from datetime import timedelta
 from .. import logic, tasks
-from ..models import EventRoom
+from ..models import EventRoom, RoomTransition
 
 from freezegun import freeze_time
 
@@ -98,34 +98,31 @@ class TestEventOccurrencesHandler(TestCaseWithRooms, TestCaseForHuey):
 
 
 class TestCaseForNoRecurringAvailabilityHandler(TestCaseWithRooms, TestCaseForHuey):
-    def assertTaskFuncOk(self, task):
-        return self.assertScheduleTaskFuncEqual(
-            task, tasks.call_set_event_room_availability
-        )
-
-    def assertWhenStartInPastAndEndInFuture(self, event, availability):
-        scheduled = self.filterScheduledByFunc(tasks.call_set_event_room_availability)
-        scheduled_on_end = scheduled[0]
+    def assertTransitions(self, room, dates):
+        transitions = RoomTransition.objects.filter(room=room).order_by("date")
+        self.assertEqual([transition.date for transition in transitions], dates)
 
-        self.assertTaskFuncOk(scheduled_on_end)
+    def assertTickScheduledAt(self, date):
+        scheduled = [
+            task
+            for task in self.filterScheduledByFunc(tasks.tick_room_transitions)
+            if not HUEY.is_revoked(task)
+        ]
 
-        self.assertScheduleEtaEqual(scheduled_on_end, event.end_date)
         self.assertEqual(len(scheduled), 1)
+        self.assertScheduleEtaEqual(scheduled[0], date)
 
-        # check if call_set_event_was_called imidiately
-        event.refresh_from_db()
-        room_availability = event.room.availability
-        self.assertEqual(room_availability, availability)
-
-    def assertWhenStartInFuture(self, event):
-        scheduled = self.filterScheduledByFunc(tasks.call_set_event_room_availability)
-        scheduled_on_start = scheduled[0]
-        scheduled_on_end = scheduled[1]
+    def assertWhenStartInPastAndEndInFuture(self, event, availability):
+        self.assertTransitions(event.room, [event.end_date])
+        self.assertTickScheduledAt(event.end_date)
 
-        self.assertEqual(len(scheduled), 2)
+        # check if availability was set imidiately
+        event.room.refresh_from_db()
+        self.assertEqual(event.room.availability, availability)
 
-        self.assertScheduleEtaEqual(scheduled_on_start, event.start_date)
-        self.assertScheduleEtaEqual(scheduled_on_end, event.end_date)
+    def assertWhenStartInFuture(self, event):
+        self.assertTransitions(event.room, [event.start_date, event.end_date])
+        self.assertTickScheduledAt(event.start_date)
 
 
 @freeze_time("2020-01-01 07:00:00")
@@ -158,6 +155,50 @@ class TestRoomAvailabilityHandlerForBusy(TestCaseForNoRecurringAvailabilityHandl
 
         self.assertWhenStartInPastAndEndInFuture(event, EventRoom.Availabilities.BUSY)
 
+    def test_stale_transitions_are_dropped(self):
+        event = logic.occupy_room(
+            self.room1,
+            self.user,
+            tz_datetime(2020, 1, 1, 9, 0, 0),
+            tz_datetime(2020, 1, 1, 12, 0, 0),
+            external_signals=False,
+        )
+        logic.edit_occupy_room(
+            event,
+            self.user,
+            start_date=tz_datetime(2020, 1, 1, 10, 0, 0),
+            emit_external_signals=False,
+        )
+        self.assertTransitions(
+            self.room1,
+            [tz_datetime(2020, 1, 1, 10, 0, 0), tz_datetime(2020, 1, 1, 12, 0, 0)],
+        )
+        # earlier ticker on 9:00 is kept, it finds nothing due and schedules the next
+        self.assertTickScheduledAt(tz_datetime(2020, 1, 1, 9, 0, 0))
+
+        logic.delete_occupy_room(event, self.user, emit_external_signals=False)
+        self.assertTransitions(self.room1, [])
+
+    def test_identical_instants_are_deduplicated(self):
+        for room, users in [
+            (self.room1, [self.user, self.superuser]),
+            (self.room2, [self.normal_user, self.trusted_user]),
+        ]:
+            for user in users:
+                logic.occupy_room(
+                    room,
+                    user,
+                    tz_datetime(2020, 1, 1, 9, 0, 0),
+                    tz_datetime(2020, 1, 1, 12, 0, 0),
+                    external_signals=False,
+                )
+
+        self.assertTransitions(
+            self.room1,
+            [tz_datetime(2020, 1, 1, 9, 0, 0), tz_datetime(2020, 1, 1, 12, 0, 0)],
+        )
+        self.assertTickScheduledAt(tz_datetime(2020, 1, 1, 9, 0, 0))
+
 
 @freeze_time("2020-01-01 07:00:00")
 class TestRoomAvailabilityHandlerForUnavailableNotRecurring(
@@ -194,11 +235,14 @@ class TestRoomAvailabilityHandlerForUnavailableNotRecurring(
 
 
 @freeze_time("2020-01-01 08:00:00")
-class TestRoomAvailabilityHandlerForRecurringEvents(TestCaseWithRooms, TestCaseForHuey):
+class TestRoomAvailabilityHandlerForRecurringEvents(
+    TestCaseForNoRecurringAvailabilityHandler
+):
+    @override_settings(CALMSTRING={"OCCURRENCES_PERIOD": 60 * 60 * 24 * 2})
     def test_when_started_in_the_past(self):
         start_date = tz_datetime(2019, 1, 1, 7, 0, 0)
         end_date = tz_datetime(2019, 1, 1, 10, 0, 0)
-        event = logic.report_unavailable(
+        logic.report_unavailable(
             self.room1,
             self.user,
             start_date,
@@ -208,22 +252,42 @@ class TestRoomAvailabilityHandlerForRecurringEvents(TestCaseWithRooms, TestCaseF
             external_signals=False,
         )
 
-        scheduled_availability = self.filterScheduledByFunc(
-            tasks.call_set_event_room_availability
+        self.assertTransitions(
+            self.room1,
+            [
+                tz_datetime(2020, 1, 1, 10, 0, 0),
+                tz_datetime(2020, 1, 2, 7, 0, 0),
+                tz_datetime(2020, 1, 2, 10, 0, 0),
+                tz_datetime(2020, 1, 3, 7, 0, 0),
+                tz_datetime(2020, 1, 3, 10, 0, 0),
+                tz_datetime(2020, 1, 4, 7, 0, 0),
+                tz_datetime(2020, 1, 4, 10, 0, 0),
+            ],
         )
+        self.assertTickScheduledAt(tz_datetime(2020, 1, 1, 10, 0, 0))
 
-        self.assertEqual(len(scheduled_availability), 1)
+        self.room1.refresh_from_db()
+        self.assertEqual(self.room1.availability, EventRoom.Availabilities.UNAVAILABLE)
 
-        self.assertScheduleEtaEqual(
-            scheduled_availability[0], tz_datetime(2020, 1, 1, 10, 0, 0)
-        )
 
-        scheduled_call_to_set_availability = self.filterScheduledByFunc(
-            tasks.schedule_for_recurrent_event_call_set_event_room_availability
-        )
+class TestTickRoomTransitions(TestCaseForNoRecurringAvailabilityHandler):
+    def test_tick(self):
+        with freeze_time("2020-01-01 07:00:00"):
+            logic.occupy_room(
+                self.room1,
+                self.user,
+                tz_datetime(2020, 1, 1, 9, 0, 0),
+                tz_datetime(2020, 1, 1, 12, 0, 0),
+                external_signals=False,
+            )
+            self.room1.refresh_from_db()
+            self.assertEqual(self.room1.availability, EventRoom.Availabilities.FREE)
+            HUEY.flush()
 
-        self.assertEqual(len(scheduled_call_to_set_availability), 1)
+        with freeze_time("2020-01-01 09:00:00"):
+            tasks.tick_room_transitions()
 
-        self.assertScheduleEtaEqual(
-            scheduled_call_to_set_availability[0], tz_datetime(2020, 1, 1, 10, 0, 0)
-        )
+        self.room1.refresh_from_db()
+        self.assertEqual(self.room1.availability, EventRoom.Availabilities.BUSY)
+        self.assertTransitions(self.room1, [tz_datetime(2020, 1, 1, 12, 0, 0)])
+        self.assertTickScheduledAt(tz_datetime(2020, 1, 1, 12, 0, 0))
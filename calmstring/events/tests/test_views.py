@@ -1,4 +1,7 @@
+import json
+
 from django.test import TestCase
+from freezegun import freeze_time
 from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
@@ -157,3 +160,159 @@ class TestEventUnavailableRoomViewset(BaseTestCase):
 
         existing_events = Event.objects.existing().count()
         self.assertEqual(existing_events, 0)
+
+
+class TestFreeRoomsAPIView(BaseTestCase):
+    def test_get(self):
+        logic.occupy_room(
+            self.room1,
+            self.user,
+            tz_datetime(2022, 1, 1, 10, 0, 0),
+            tz_datetime(2022, 1, 1, 11, 0, 0),
+            emit_signals=False,
+        )
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("FreeRoomsAPIView"),
+            {
+                "start_date": tz_datetime(2022, 1, 1, 10, 0, 0),
+                "end_date": tz_datetime(2022, 1, 1, 12, 0, 0),
+                "duration": 60 * 90,
+            },
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [item["room"] for item in response.data],
+            [str(self.room2.uuid), str(self.room3.uuid)],
+        )
+        self.assertEqual(
+            response.data[0]["periods"],
+            [
+                {
+                    "start_date": "2022-01-01T10:00:00Z",
+                    "end_date": "2022-01-01T12:00:00Z",
+                }
+            ],
+        )
+
+    def test_duration_longer_than_period(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get(
+            reverse("FreeRoomsAPIView"),
+            {
+                "start_date": tz_datetime(2022, 1, 1, 10, 0, 0),
+                "end_date": tz_datetime(2022, 1, 1, 11, 0, 0),
+                "duration": 60 * 90,
+            },
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class TestEventsListAPIView(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        for day in range(1, 6):
+            self.create_event(
+                room=self.room1 if day % 2 else self.room2,
+                start_date=tz_datetime(2022, 1, day, 10, 0, 0),
+                end_date=tz_datetime(2022, 1, day, 11, 0, 0),
+                availability=Event.Availabilities.BUSY,
+            )
+        self.client.force_authenticate(user=self.user)
+
+    def test_filtered(self):
+        response = self.client.get(
+            reverse("EventsListAPIView"), {"room": self.room2.id}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [event["start_date"] for event in response.data["results"]],
+            ["2022-01-02T10:00:00Z", "2022-01-04T10:00:00Z"],
+        )
+
+    def test_paginated_by_cursor(self):
+        response = self.client.get(reverse("EventsListAPIView"), {"page_size": 2})
+        dates = [event["start_date"] for event in response.data["results"]]
+
+        while response.data["next"]:
+            response = self.client.get(response.data["next"])
+            dates += [event["start_date"] for event in response.data["results"]]
+
+        self.assertEqual(dates, [f"2022-01-0{day}T10:00:00Z" for day in range(1, 6)])
+
+    def test_stream(self):
+        response = self.client.get(
+            reverse("EventsListAPIView"),
+            {"stream": 1, "min_start_date": tz_datetime(2022, 1, 4, 0, 0, 0)},
+        )
+
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(
+            [json.loads(line)["start_date"] for line in lines],
+            ["2022-01-04T10:00:00Z", "2022-01-05T10:00:00Z"],
+        )
+
+    def test_queries(self):
+        for day in range(6, 26):
+            self.create_event(
+                user=self.superuser,
+                start_date=tz_datetime(2022, 1, day, 10, 0, 0),
+                end_date=tz_datetime(2022, 1, day, 11, 0, 0),
+                availability=Event.Availabilities.UNAVAILABLE,
+                is_recurring=True,
+                recurrences=self.clean_recurrence("RRULE:FREQ=WEEKLY"),
+            )
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("EventsListAPIView"))
+
+        self.assertEqual(len(response.data["results"]), 25)
+
+
+class TestEventsHistoryAPIView(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        with freeze_time("2020-01-01 07:00:00"):
+            self.event = logic.occupy_room(
+                self.room1,
+                self.user,
+                tz_datetime(2020, 1, 2, 12, 0),
+                tz_datetime(2020, 1, 2, 13, 0),
+                name="first",
+            )
+        with freeze_time("2020-01-01 08:00:00"):
+            logic.edit_occupy_room(self.event, self.user, name="edited")
+
+    def get(self, params):
+        return self.client.get(reverse("EventsHistoryAPIView"), params)
+
+    def test_get(self):
+        self.client.force_authenticate(user=self.competitive_user)
+        response = self.get(
+            {"at": tz_datetime(2020, 1, 1, 7, 30), "room": self.room1.uuid}
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]["room"], str(self.room1.uuid))
+        self.assertEqual(
+            [event["name"] for event in response.data[0]["events"]], ["first"]
+        )
+
+    def test_all_rooms(self):
+        self.client.force_authenticate(user=self.competitive_user)
+        response = self.get({"at": tz_datetime(2020, 1, 1, 8, 30)})
+
+        self.assertEqual(
+            {item["room"]: len(item["events"]) for item in response.data},
+            {str(self.room1.uuid): 1, str(self.room2.uuid): 0, str(self.room3.uuid): 0},
+        )
+
+    def test_permissions(self):
+        self.client.force_authenticate(user=self.user)
+        response = self.get({"at": tz_datetime(2020, 1, 1, 7, 30)})
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,104 @@
+from unittest import mock
+
+from redis.exceptions import RedisError
+
+from utils.dates import tz_datetime
+from utils.cache import StoreError, local_store
+
+from .utils import TestCaseWithRooms
+from ..models import Event, EventRoom
+from .. import logic, cache
+
+
+class TestCachedEventRoomAvailability(TestCaseWithRooms):
+    def setUp(self):
+        super().setUp()
+        # 12-13 busy
+        self.event = self.create_event(
+            start_date=tz_datetime(2020, 1, 1, 12, 0, 0),
+            end_date=tz_datetime(2020, 1, 1, 13, 0, 0),
+            availability=Event.Availabilities.BUSY,
+        )
+
+    def get(self, *args):
+        return logic.get_cached_event_room_availability(
+            self.room1, tz_datetime(2020, 1, 1, *args)
+        )
+
+    def test_repeated_reads_are_cached(self):
+        self.assertEqual(self.get(12, 10), EventRoom.Availabilities.BUSY)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(12, 10), EventRoom.Availabilities.BUSY)
+            self.assertEqual(self.get(12, 50), EventRoom.Availabilities.BUSY)
+
+    def test_cached_until_next_change(self):
+        self.assertEqual(self.get(11, 0), EventRoom.Availabilities.FREE)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(11, 59), EventRoom.Availabilities.FREE)
+
+        self.assertEqual(self.get(12, 30), EventRoom.Availabilities.BUSY)
+
+    def test_boundary_is_not_cached(self):
+        self.get(12, 0)
+
+        bucket = cache.get_bucket(tz_datetime(2020, 1, 1, 12, 0, 0))
+        self.assertIsNone(local_store.hget(cache.room_key(self.room1.id), bucket))
+
+    def test_invalidated_when_event_saved(self):
+        self.assertEqual(self.get(14, 0), EventRoom.Availabilities.FREE)
+
+        self.create_event(
+            start_date=tz_datetime(2020, 1, 1, 13, 30, 0),
+            end_date=tz_datetime(2020, 1, 1, 15, 0, 0),
+            availability=Event.Availabilities.UNAVAILABLE,
+        )
+
+        self.assertEqual(self.get(14, 0), EventRoom.Availabilities.UNAVAILABLE)
+
+    def test_invalidated_when_occupy_deleted(self):
+        self.assertEqual(self.get(12, 30), EventRoom.Availabilities.BUSY)
+
+        logic.delete_occupy_room(self.event, self.user, emit_signals=False)
+
+        self.assertEqual(self.get(12, 30), EventRoom.Availabilities.FREE)
+
+    def test_cache_errors_fall_back_to_database(self):
+        with mock.patch.object(
+            local_store, "hget", side_effect=RedisError
+        ), self.assertLogs("events.cache", "ERROR"):
+            self.assertEqual(self.get(12, 30), EventRoom.Availabilities.BUSY)
+
+    def test_store_errors_fall_back_to_database(self):
+        with mock.patch.object(
+            local_store, "hget", side_effect=StoreError("database is locked")
+        ), self.assertLogs("events.cache", "ERROR"):
+            self.assertEqual(self.get(12, 30), EventRoom.Availabilities.BUSY)
+
+    def test_store_errors_dont_fail_save(self):
+        self.event.name = "renamed"
+        with mock.patch.object(
+            local_store, "delete", side_effect=StoreError("database is locked")
+        ), self.assertLogs("events.cache", "ERROR"):
+            self.event.save()
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.name, "renamed")
+
+    def test_invalidated_again_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_event(
+                start_date=tz_datetime(2020, 1, 1, 13, 30, 0),
+                end_date=tz_datetime(2020, 1, 1, 15, 0, 0),
+                availability=Event.Availabilities.UNAVAILABLE,
+            )
+            # concurrent reader caches availability computed before the commit
+            local_store.hset(
+                cache.room_key(self.room1.id),
+                cache.get_bucket(tz_datetime(2020, 1, 1, 14, 0, 0)),
+                '{"availability": "FREE", "at": 0, "until": null}',
+            )
+
+        self.assertEqual(local_store.hgetall(cache.room_key(self.room1.id)), {})
+        self.assertEqual(self.get(14, 0), EventRoom.Availabilities.UNAVAILABLE)
@@ -1,12 +1,17 @@
-from django.test import TestCase
+import tempfile
+
+from django.test import TestCase, override_settings
+from freezegun import freeze_time
 
 from utils.dates import tz_datetime
 
-from datetime import datetime
+from datetime import datetime, date, timedelta
 
 # Create your tests here.
-from ..models import EventRoom, Report, Event
-from .. import exceptions, logic
+from ..models import EventRoom, Report, Event, EventOccurrence
+from .. import exceptions, logic, tasks, conf
+from changes.models import Change
+from changes import archive, messages
 from .utils import TestCaseWithRooms
 
 import recurrence
@@ -441,6 +446,81 @@ class TestSetEventOccurrences(TestCaseWithRooms):
         self.assertIsNone(next_schedule)
 
 
+class TestSetEventOccurrencesIncremental(TestCaseWithRooms):
+    def setUp(self):
+        super().setUp()
+        self.event1 = self.create_event(
+            availability=Event.Availabilities.UNAVAILABLE,
+            start_date=tz_datetime(2020, 1, 1, 8, 0, 0),
+            end_date=tz_datetime(2020, 1, 1, 12, 0, 0),
+            is_recurring=True,
+            recurrences=self.clean_recurrence("RRULE:FREQ=DAILY"),
+        )
+        logic.set_event_occurrences(
+            self.event1,
+            dtstart=tz_datetime(2020, 1, 1, 8, 0, 0),
+            period=60 * 60 * 24 * 6,
+            emit_signals=False,
+        )
+
+    def test_extends_and_trims(self):
+        logic.set_event_occurrences(
+            self.event1,
+            dtstart=tz_datetime(2020, 1, 4, 8, 0, 0),
+            period=60 * 60 * 24 * 6,
+            incremental=True,
+            emit_signals=False,
+        )
+        self.event1.refresh_from_db()
+
+        occurrences = self.event1.prepare_occurrences_from_db()
+        self.assertEqual(occurrences[0], date(2020, 1, 4))
+        self.assertEqual(occurrences[-1], date(2020, 1, 10))
+        self.assertEqual(
+            self.event1.occurrences_until, tz_datetime(2020, 1, 10, 8, 0, 0)
+        )
+
+        rows = EventOccurrence.objects.filter(event=self.event1).order_by("start_date")
+        self.assertEqual(
+            [row.start_date.date() for row in rows],
+            occurrences,
+        )
+
+    def test_same_as_full_expansion(self):
+        logic.set_event_occurrences(
+            self.event1,
+            dtstart=tz_datetime(2020, 1, 4, 8, 0, 0),
+            period=60 * 60 * 24 * 6,
+            incremental=True,
+            emit_signals=False,
+        )
+        self.event1.refresh_from_db()
+        incremental = self.event1.occurrences
+
+        logic.set_event_occurrences(
+            self.event1,
+            dtstart=tz_datetime(2020, 1, 4, 8, 0, 0),
+            period=60 * 60 * 24 * 6,
+            emit_signals=False,
+        )
+        self.event1.refresh_from_db()
+        self.assertEqual(incremental, self.event1.occurrences)
+
+    def test_full_expansion_when_period_not_covered(self):
+        logic.set_event_occurrences(
+            self.event1,
+            dtstart=tz_datetime(2020, 2, 1, 8, 0, 0),
+            period=60 * 60 * 24 * 6,
+            incremental=True,
+            emit_signals=False,
+        )
+        self.event1.refresh_from_db()
+
+        occurrences = self.event1.prepare_occurrences_from_db()
+        self.assertEqual(occurrences[0], date(2020, 2, 1))
+        self.assertEqual(occurrences[-1], date(2020, 2, 7))
+
+
 class TestGetEventRoomAvailability(TestCaseWithRooms):
     def setUp(self):
         super().setUp()
@@ -512,3 +592,507 @@ class TestGetEventRoomAvailability(TestCaseWithRooms):
             self.room1, tz_datetime(2020, 1, 1, 20, 0, 0)
         )
         self.assertEqual(status, EventRoom.Availabilities.FREE)
+
+    def test_single_query(self):
+        with self.assertNumQueries(1):
+            logic.get_event_room_availability(
+                self.room1, tz_datetime(2020, 1, 1, 10, 0, 0)
+            )
+
+    def test_many_rooms(self):
+        self.create_event(
+            room=self.room2,
+            start_date=tz_datetime(2020, 1, 1, 9, 0, 0),
+            end_date=tz_datetime(2020, 1, 1, 16, 0, 0),
+            availability=Event.Availabilities.BUSY,
+        )
+        rooms = [self.room1, self.room2, self.room3]
+
+        for hour in [10, 13, 15, 18, 20]:
+            datetime_at = tz_datetime(2020, 1, 1, hour, 0, 0)
+            with self.assertNumQueries(1):
+                availabilities = logic.get_event_rooms_availability(rooms, datetime_at)
+
+            self.assertEqual(
+                availabilities,
+                {
+                    room.id: logic.get_event_room_availability(room, datetime_at)
+                    for room in rooms
+                },
+            )
+
+
+class TestComputeRoomAvailability(TestCase):
+    at = tz_datetime(2020, 1, 1, 12, 0, 0)
+    later = tz_datetime(2020, 1, 1, 13, 0, 0)
+
+    def test_compute(self):
+        BUSY = Event.Availabilities.BUSY
+        UNAVAILABLE = Event.Availabilities.UNAVAILABLE
+
+        cases = [
+            ([], EventRoom.Availabilities.FREE),
+            ([(BUSY, self.at)], EventRoom.Availabilities.FREE),
+            ([(BUSY, self.at), (BUSY, self.later)], EventRoom.Availabilities.BUSY),
+            ([(UNAVAILABLE, self.later)], EventRoom.Availabilities.UNAVAILABLE),
+            (
+                [(UNAVAILABLE, self.later), (BUSY, self.later)],
+                EventRoom.Availabilities.UNKNOWN,
+            ),
+        ]
+        for pending, availability in cases:
+            self.assertEqual(
+                logic.compute_room_availability(pending, self.at), availability
+            )
+
+
+class TestSetEventRoomsAvailability(TestCaseWithRooms):
+    @freeze_time("2020-01-01 10:00:00")
+    def test_set(self):
+        self.create_event(
+            room=self.room2,
+            start_date=tz_datetime(2020, 1, 1, 9, 0, 0),
+            end_date=tz_datetime(2020, 1, 1, 11, 0, 0),
+            availability=Event.Availabilities.BUSY,
+        )
+
+        logic.set_event_rooms_availability([self.room1, self.room2], emit_signals=False)
+
+        self.room1.refresh_from_db()
+        self.room2.refresh_from_db()
+        self.assertEqual(self.room1.availability, EventRoom.Availabilities.FREE)
+        self.assertEqual(self.room2.availability, EventRoom.Availabilities.BUSY)
+
+    @freeze_time("2020-01-01 10:00:00")
+    def test_task_with_many_rooms(self):
+        self.create_event(
+            room=self.room3,
+            start_date=tz_datetime(2020, 1, 1, 9, 0, 0),
+            end_date=tz_datetime(2020, 1, 1, 11, 0, 0),
+            availability=Event.Availabilities.UNAVAILABLE,
+        )
+
+        tasks.call_set_event_room_availability(self.room1.id, self.room3.id)
+
+        self.room3.refresh_from_db()
+        self.assertEqual(self.room3.availability, EventRoom.Availabilities.UNAVAILABLE)
+
+
+class TestGetFreePeriods(TestCase):
+    def test_gaps_between_merged_busy_periods(self):
+        periods = logic.get_free_periods(
+            [
+                (tz_datetime(2020, 1, 1, 9, 0), tz_datetime(2020, 1, 1, 11, 0)),
+                (tz_datetime(2020, 1, 1, 10, 0), tz_datetime(2020, 1, 1, 12, 0)),
+                (tz_datetime(2020, 1, 1, 12, 30), tz_datetime(2020, 1, 1, 13, 0)),
+                (tz_datetime(2020, 1, 1, 15, 0), tz_datetime(2020, 1, 1, 21, 0)),
+            ],
+            tz_datetime(2020, 1, 1, 8, 0),
+            tz_datetime(2020, 1, 1, 20, 0),
+            timedelta(hours=1),
+        )
+        self.assertEqual(
+            periods,
+            [
+                (tz_datetime(2020, 1, 1, 8, 0), tz_datetime(2020, 1, 1, 9, 0)),
+                (tz_datetime(2020, 1, 1, 13, 0), tz_datetime(2020, 1, 1, 15, 0)),
+            ],
+        )
+
+    def test_without_busy_periods(self):
+        periods = logic.get_free_periods(
+            [],
+            tz_datetime(2020, 1, 1, 8, 0),
+            tz_datetime(2020, 1, 1, 9, 0),
+            timedelta(hours=1),
+        )
+        self.assertEqual(
+            periods, [(tz_datetime(2020, 1, 1, 8, 0), tz_datetime(2020, 1, 1, 9, 0))]
+        )
+
+
+class TestFindFreeRooms(TestCaseWithRooms):
+    def setUp(self):
+        super().setUp()
+
+        # room1 busy 14-18
+        self.create_event(
+            start_date=tz_datetime(2020, 1, 1, 14, 0, 0),
+            end_date=tz_datetime(2020, 1, 1, 18, 0, 0),
+            availability=Event.Availabilities.BUSY,
+        )
+        # room2 unavailable daily 13-15
+        recc_event = self.create_event(
+            room=self.room2,
+            start_date=tz_datetime(2019, 12, 30, 13, 0, 0),
+            end_date=tz_datetime(2019, 12, 30, 15, 0, 0),
+            availability=Event.Availabilities.UNAVAILABLE,
+            is_recurring=True,
+            recurrences=self.clean_recurrence("RRULE:FREQ=DAILY"),
+        )
+        recc_event.occurrences = Event.prepare_occurrences_for_db(
+            recc_event.get_occurrences(
+                datetime(2020, 1, 1, 0, 0, 0), datetime(2020, 1, 3, 0, 0, 0)
+            )
+        )
+        recc_event.save()
+        # room3 is never busy
+
+    def test_find_free_rooms(self):
+        found = logic.find_free_rooms(
+            tz_datetime(2020, 1, 1, 14, 0, 0),
+            tz_datetime(2020, 1, 1, 20, 0, 0),
+            60 * 90,
+        )
+
+        self.assertEqual(
+            [(item["room"], item["periods"]) for item in found],
+            [
+                (
+                    self.room3,
+                    [(tz_datetime(2020, 1, 1, 14, 0), tz_datetime(2020, 1, 1, 20, 0))],
+                ),
+                (
+                    self.room2,
+                    [(tz_datetime(2020, 1, 1, 15, 0), tz_datetime(2020, 1, 1, 20, 0))],
+                ),
+                (
+                    self.room1,
+                    [(tz_datetime(2020, 1, 1, 18, 0), tz_datetime(2020, 1, 1, 20, 0))],
+                ),
+            ],
+        )
+
+    def test_queries(self):
+        with self.assertNumQueries(2):
+            logic.find_free_rooms(
+                tz_datetime(2020, 1, 1, 14, 0, 0),
+                tz_datetime(2020, 1, 1, 20, 0, 0),
+                60 * 90,
+            )
+
+
+class TestGetRoomsEventsAt(TestCaseWithRooms):
+    def setUp(self):
+        super().setUp()
+        with freeze_time("2020-01-01 07:00:00"):
+            self.event = logic.occupy_room(
+                self.room1,
+                self.user,
+                tz_datetime(2020, 1, 2, 12, 0),
+                tz_datetime(2020, 1, 2, 13, 0),
+                name="first",
+            )
+        with freeze_time("2020-01-01 08:00:00"):
+            logic.edit_occupy_room(self.event, self.user, name="edited")
+            logic.occupy_room(
+                self.room2,
+                self.user,
+                tz_datetime(2020, 1, 3, 12, 0),
+                tz_datetime(2020, 1, 3, 13, 0),
+                name="other room",
+            )
+        with freeze_time("2020-01-01 09:00:00"):
+            logic.delete_occupy_room(self.event, self.user)
+
+    def names_at(self, at, rooms=None):
+        return {
+            room: [event.name for event in events]
+            for room, events in logic.get_rooms_events_at(at, rooms).items()
+        }
+
+    def test_room_at(self):
+        at = lambda hour: tz_datetime(2020, 1, 1, hour, 30)
+
+        self.assertEqual(self.names_at(at(6), [self.room1]), {self.room1: []})
+        self.assertEqual(self.names_at(at(7), [self.room1]), {self.room1: ["first"]})
+        self.assertEqual(self.names_at(at(8), [self.room1]), {self.room1: ["edited"]})
+        self.assertEqual(self.names_at(at(9), [self.room1]), {self.room1: []})
+
+    def test_all_rooms(self):
+        self.assertEqual(
+            self.names_at(tz_datetime(2020, 1, 1, 8, 30)),
+            {self.room1: ["edited"], self.room2: ["other room"], self.room3: []},
+        )
+
+    def test_events_are_built(self):
+        rooms_events = logic.get_rooms_events_at(tz_datetime(2020, 1, 1, 8, 30))
+        event = rooms_events[self.room1][0]
+
+        self.assertEqual(event.id, self.event.id)
+        self.assertEqual(event.uuid, self.event.uuid)
+        self.assertEqual(event.room, self.room1)
+        self.assertEqual(event.author, self.user)
+        self.assertEqual(event.start_date, tz_datetime(2020, 1, 2, 12, 0))
+
+
+class TestRevertEventsTo(TestCaseWithRooms):
+    def setUp(self):
+        super().setUp()
+        with freeze_time("2020-01-01 07:00:00"):
+            self.event = logic.occupy_room(
+                self.room1,
+                self.user,
+                tz_datetime(2020, 1, 2, 12, 0),
+                tz_datetime(2020, 1, 2, 13, 0),
+                name="first",
+            )
+            self.other_event = logic.occupy_room(
+                self.room2,
+                self.competitive_user,
+                tz_datetime(2020, 1, 2, 12, 0),
+                tz_datetime(2020, 1, 2, 13, 0),
+                name="other",
+            )
+        with freeze_time("2020-01-01 08:00:00"):
+            logic.edit_occupy_room(
+                self.event,
+                self.user,
+                name="edited",
+                end_date=tz_datetime(2020, 1, 2, 14, 0),
+            )
+            logic.edit_occupy_room(
+                self.other_event, self.competitive_user, name="other edited"
+            )
+            self.created_later = logic.occupy_room(
+                self.room1,
+                self.user,
+                tz_datetime(2020, 1, 3, 12, 0),
+                tz_datetime(2020, 1, 3, 13, 0),
+                name="later",
+            )
+
+    def test_revert_room(self):
+        with freeze_time("2020-01-01 09:00:00"):
+            reverted = logic.revert_events_to(
+                tz_datetime(2020, 1, 1, 7, 30),
+                self.competitive_user,
+                rooms=[self.room1],
+            )
+
+        self.assertEqual(
+            {event.id for event in reverted}, {self.event.id, self.created_later.id}
+        )
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.name, "first")
+        self.assertEqual(self.event.end_date, tz_datetime(2020, 1, 2, 13, 0))
+        self.assertEqual(
+            list(
+                EventOccurrence.objects.filter(event=self.event).values_list(
+                    "start_date", "end_date"
+                )
+            ),
+            [(tz_datetime(2020, 1, 2, 12, 0), tz_datetime(2020, 1, 2, 13, 0))],
+        )
+
+        self.created_later.refresh_from_db()
+        self.assertTrue(self.created_later.is_deleted)
+
+        self.other_event.refresh_from_db()
+        self.assertEqual(self.other_event.name, "other edited")
+
+    def test_revert_changed_by(self):
+        logic.revert_events_to(
+            tz_datetime(2020, 1, 1, 7, 30),
+            self.competitive_user,
+            changed_by=self.competitive_user,
+        )
+
+        self.other_event.refresh_from_db()
+        self.assertEqual(self.other_event.name, "other")
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.name, "edited")
+
+    def test_revert_changed_by_rejected_when_changed_by_others(self):
+        with freeze_time("2020-01-01 08:30:00"):
+            self.other_event.description = "described"
+            self.other_event.save()
+            Change.on_change(
+                author=self.user,
+                content_object=self.other_event,
+                type=conf.CHANGE_TYPES.OCCUPY_ROOM_EDITED,
+                uuid=self.room2.uuid,
+            )
+
+        with self.assertRaises(exceptions.ValidationError):
+            logic.revert_events_to(
+                tz_datetime(2020, 1, 1, 7, 30),
+                self.competitive_user,
+                changed_by=self.competitive_user,
+            )
+
+        self.other_event.refresh_from_db()
+        self.assertEqual(self.other_event.name, "other edited")
+        self.assertEqual(self.other_event.description, "described")
+
+    def test_revert_rejected_when_restored_event_overlaps(self):
+        with freeze_time("2020-01-01 08:30:00"):
+            logic.edit_occupy_room(
+                self.event,
+                self.user,
+                start_date=tz_datetime(2020, 1, 4, 12, 0),
+                end_date=tz_datetime(2020, 1, 4, 13, 0),
+            )
+            overlaping = logic.occupy_room(
+                self.room2,
+                self.user,
+                tz_datetime(2020, 1, 2, 13, 0),
+                tz_datetime(2020, 1, 2, 14, 0),
+            )
+
+        with self.assertRaises(exceptions.OverlapedEventExists):
+            logic.revert_events_to(
+                tz_datetime(2020, 1, 1, 8, 15), self.user, rooms=[self.room1]
+            )
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.start_date, tz_datetime(2020, 1, 4, 12, 0))
+        self.assertEqual(
+            list(
+                EventOccurrence.objects.filter(event=self.event).values_list(
+                    "start_date", flat=True
+                )
+            ),
+            [tz_datetime(2020, 1, 4, 12, 0)],
+        )
+
+        # once the overlaping event is gone the revert passes
+        overlaping.is_deleted = True
+        overlaping.save()
+        logic.revert_events_to(
+            tz_datetime(2020, 1, 1, 8, 15), self.user, rooms=[self.room1]
+        )
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.start_date, tz_datetime(2020, 1, 2, 12, 0))
+
+    def test_change_logged(self):
+        logic.revert_events_to(
+            tz_datetime(2020, 1, 1, 7, 30), self.competitive_user, rooms=[self.room1]
+        )
+
+        reverted = Change.objects.filter(type=conf.CHANGE_TYPES.EVENT_REVERTED)
+        self.assertEqual(reverted.count(), 2)
+        self.assertEqual(
+            reverted.get(content_id=self.event.id).get_state()["name"], "first"
+        )
+
+    def test_availability_is_recomputed(self):
+        with freeze_time("2020-01-02 12:30:00"):
+            logic.set_event_room_availability(self.room1)
+            self.room1.refresh_from_db()
+            self.assertEqual(self.room1.availability, EventRoom.Availabilities.BUSY)
+
+            logic.revert_events_to(
+                tz_datetime(2020, 1, 1, 6, 30),
+                self.competitive_user,
+                rooms=[self.room1],
+            )
+
+            self.room1.refresh_from_db()
+            self.assertEqual(self.room1.availability, EventRoom.Availabilities.FREE)
+
+    def test_nothing_changed(self):
+        self.assertEqual(
+            logic.revert_events_to(tz_datetime(2020, 1, 1, 9, 0), self.user), []
+        )
+
+    def test_timestamps_not_reverted(self):
+        with freeze_time("2020-01-01 09:00:00"):
+            logic.revert_events_to(
+                tz_datetime(2020, 1, 1, 7, 30), self.user, rooms=[self.room1]
+            )
+
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.name, "first")
+        self.assertEqual(self.event.created_at, tz_datetime(2020, 1, 1, 7, 0))
+        self.assertEqual(self.event.updated_at, tz_datetime(2020, 1, 1, 9, 0))
+
+    def test_archived_changes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        with override_settings(
+            CALMSTRING={
+                "CHANGES_CHECKPOINT_INTERVAL": 1,
+                "CHANGES_ARCHIVE_DIR": directory.name,
+            }
+        ):
+            # checkpoint after which older changes of room are archived
+            with freeze_time("2020-01-01 08:15:00"):
+                logic.edit_occupy_room(
+                    self.created_later, self.user, name="later edited"
+                )
+            archive.archive_changes(before=tz_datetime(2020, 1, 1, 8, 30))
+            self.assertFalse(Change.objects.filter(content_id=self.event.id).exists())
+
+            reverted = logic.revert_events_to(
+                tz_datetime(2020, 1, 1, 7, 30), self.user, rooms=[self.room1]
+            )
+
+        self.assertEqual(
+            {event.id for event in reverted}, {self.event.id, self.created_later.id}
+        )
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.name, "first")
+        self.created_later.refresh_from_db()
+        self.assertTrue(self.created_later.is_deleted)
+
+
+class TestChangeMessages(TestCaseWithRooms):
+    def occupy(self, room, day):
+        return logic.occupy_room(
+            room,
+            self.user,
+            tz_datetime(2020, 1, day, 12, 0),
+            tz_datetime(2020, 1, day, 13, 0),
+        )
+
+    def test_message_stored_instead_of_name(self):
+        event = self.occupy(self.room1, 1)
+
+        change = Change.objects.get(content_id=event.id)
+        self.assertEqual(change.name, "")
+        self.assertEqual(change.message, "events.OCCUPY_ROOM")
+        self.assertEqual(
+            change.message_params, {"user": self.user.username, "room": self.room1.pk}
+        )
+        self.assertEqual(
+            change.get_name(), f'{self.user.username} created busy room "Test room 1"'
+        )
+
+    def test_params_rendered(self):
+        event = self.occupy(self.room1, 1)
+        logic.edit_occupy_room(
+            event, self.user, end_date=tz_datetime(2020, 1, 1, 12, 30)
+        )
+
+        change = Change.objects.filter(content_id=event.id).latest("id")
+        self.assertEqual(
+            change.get_name(),
+            f'{self.user.username} edited busy room "Test room 1" at '
+            f"{tz_datetime(2020, 1, 1, 12, 30)}",
+        )
+
+    def test_room_names_fetched_once(self):
+        for day, room in enumerate([self.room1, self.room2, self.room3], start=1):
+            self.occupy(room, day)
+        changes = list(Change.objects.all())
+
+        with self.assertNumQueries(1):
+            names = messages.render_names(changes)
+
+        self.assertEqual(
+            names,
+            [
+                f'{self.user.username} created busy room "{name}"'
+                for name in ["Test room 1", "room2", "room3"]
+            ],
+        )
+
+    def test_room_renamed(self):
+        self.occupy(self.room1, 1)
+        self.room1.room.name = "Renamed"
+        self.room1.room.save()
+
+        self.assertIn('"Renamed"', Change.objects.get().get_name())
@@ -1,9 +1,9 @@
-from datetime import datetime, date
-from ..models import Event
+from datetime import datetime, date, timedelta
+from ..models import Event, EventOccurrence
 from utils.for_tests import TestCaseWithUsers
 from utils.dates import tz_datetime
 from recurrence.fields import RecurrenceField
-from .. import exceptions
+from .. import exceptions, conf
 
 from .utils import create_event_room
 
@@ -148,6 +148,151 @@ class TestEvent(TestCaseWithEvents):
         )
 
 
+class TestOccurrencesCursor(TestCaseWithEvents):
+    def setUp(self):
+        super().setUp()
+        self.event1.start_date = tz_datetime(2018, 1, 3, 10, 0, 0)  # wednesday
+        self.event1.end_date = tz_datetime(2018, 1, 3, 12, 0, 0)
+        self.event1.recurrences = self.clean_recurrence(
+            "RRULE:FREQ=WEEKLY;INTERVAL=2;BYDAY=WE,FR"
+        )
+        self.event1.is_recurring = True
+        self.event1.save()
+
+    def get_occurrences_from_start(self, date_from, date_to):
+        return self.event1.get_occurrences(
+            date_from, date_to, dtstart=self.event1.start_date
+        )
+
+    def test_expands_from_cursor(self):
+        first = self.event1.get_occurrences(
+            datetime(2020, 1, 1, 0, 0, 0), datetime(2020, 1, 31, 0, 0, 0)
+        )
+        self.assertEqual(
+            self.event1.get_recurrences_dtstart(datetime(2020, 2, 1, 0, 0, 0)),
+            first[0],
+        )
+
+        later = self.event1.get_occurrences(
+            datetime(2020, 2, 1, 0, 0, 0), datetime(2020, 3, 31, 0, 0, 0)
+        )
+        self.assertEqual(
+            later,
+            self.get_occurrences_from_start(
+                datetime(2020, 2, 1, 0, 0, 0), datetime(2020, 3, 31, 0, 0, 0)
+            ),
+        )
+
+    def test_cursor_not_used_for_earlier_period(self):
+        self.event1.get_occurrences(
+            datetime(2020, 1, 1, 0, 0, 0), datetime(2020, 1, 31, 0, 0, 0)
+        )
+
+        earlier = self.event1.get_occurrences(
+            datetime(2019, 6, 1, 0, 0, 0), datetime(2019, 6, 30, 0, 0, 0)
+        )
+        self.assertEqual(
+            earlier,
+            self.get_occurrences_from_start(
+                datetime(2019, 6, 1, 0, 0, 0), datetime(2019, 6, 30, 0, 0, 0)
+            ),
+        )
+
+    def test_cursor_dropped_when_recurrences_changed(self):
+        self.event1.get_occurrences(
+            datetime(2020, 1, 1, 0, 0, 0), datetime(2020, 1, 31, 0, 0, 0)
+        )
+        self.event1.recurrences = self.clean_recurrence("RRULE:FREQ=WEEKLY;BYDAY=WE")
+
+        self.assertEqual(
+            self.event1.get_recurrences_dtstart(datetime(2020, 2, 1, 0, 0, 0)),
+            datetime(2018, 1, 3, 10, 0, 0),
+        )
+
+    def test_count_rule_not_supported(self):
+        self.event1.recurrences = self.clean_recurrence("RRULE:FREQ=DAILY;COUNT=1000")
+        self.event1.get_occurrences(
+            datetime(2020, 1, 1, 0, 0, 0), datetime(2020, 1, 31, 0, 0, 0)
+        )
+
+        self.assertIsNone(self.event1.occurrences_cursor)
+
+
+class TestEventOccurrenceRows(TestCaseWithEvents):
+    def setUp(self):
+        super().setUp()
+        self.event1.recurrences = self.clean_recurrence("RRULE:FREQ=WEEKLY")
+        self.event1.is_recurring = True
+        self.event1.save()
+
+    def test_rows_created_from_occurrences(self):
+        self.event1.occurrences = {
+            "2020-01-01": True,
+            "2020-01-08": True,
+        }
+        self.event1.save()
+
+        rows = EventOccurrence.objects.filter(event=self.event1).order_by("start_date")
+        self.assertEqual(
+            [(row.start_date, row.end_date) for row in rows],
+            [
+                (tz_datetime(2020, 1, 1, 10, 0, 0), tz_datetime(2020, 1, 1, 12, 0, 0)),
+                (tz_datetime(2020, 1, 8, 10, 0, 0), tz_datetime(2020, 1, 8, 12, 0, 0)),
+            ],
+        )
+        self.assertEqual(rows[0].room, self.room1)
+
+    def test_rows_replaced_on_change(self):
+        self.event1.occurrences = {"2020-01-01": True}
+        self.event1.save()
+
+        self.event1.occurrences = {"2020-01-08": True, "2020-01-15": True}
+        self.event1.save()
+
+        self.assertEqual(EventOccurrence.objects.filter(event=self.event1).count(), 2)
+
+    def test_rows_replaced_when_not_recurring(self):
+        self.event1.occurrences = {"2020-01-01": True, "2020-01-08": True}
+        self.event1.save()
+
+        self.event1.is_recurring = False
+        self.event1.occurrences = {}
+        self.event1.save()
+
+        rows = EventOccurrence.objects.filter(event=self.event1)
+        self.assertEqual(
+            [(row.start_date, row.end_date) for row in rows],
+            [(self.event1.start_date, self.event1.end_date)],
+        )
+
+    def test_not_ended_event_lasts_max_busy_duration(self):
+        event = Event.objects.create(
+            room=self.room1,
+            author=self.user,
+            start_date=tz_datetime(2020, 1, 2, 10, 0, 0),
+        )
+
+        row = EventOccurrence.objects.get(event=event)
+        self.assertEqual(
+            row.end_date, event.start_date + timedelta(seconds=conf.MAX_BUSY_DURATION)
+        )
+        self.assertEqual(row.author, self.user)
+
+    def test_overlap_on_occurrence_date_only(self):
+        self.event1.occurrences = {"2020-01-08": True}
+        self.event1.save()
+
+        overlaped = Event.objects.filter(is_recurring=True).overlaped_to(
+            tz_datetime(2020, 1, 8, 11, 0, 0), tz_datetime(2020, 1, 8, 13, 0, 0)
+        )
+        self.assertEqual(overlaped.count(), 1)
+
+        not_overlaped = Event.objects.filter(is_recurring=True).overlaped_to(
+            tz_datetime(2020, 1, 15, 11, 0, 0), tz_datetime(2020, 1, 15, 13, 0, 0)
+        )
+        self.assertEqual(not_overlaped.count(), 0)
+
+
 class TestEventQuerySetOverlapTo(TestCaseWithEvents):
     def setUp(self):
         super().setUp()
@@ -488,3 +633,37 @@ class TestEventQuerySetOverlapTo(TestCaseWithEvents):
             ).count(),
             1,
         )
+
+
+class TestEventOccurrenceQueryPlan(TestCaseWithEvents):
+    def test_room_index_used(self):
+        plan = (
+            EventOccurrence.objects.filter(room=self.room1)
+            .overlaped_to(
+                tz_datetime(2020, 1, 1, 11, 0, 0), tz_datetime(2020, 1, 1, 14, 0, 0)
+            )
+            .explain()
+        )
+        self.assertIn("event_occurrence_room_idx", plan)
+
+    def test_author_index_used(self):
+        plan = (
+            EventOccurrence.objects.filter(author=self.user)
+            .overlaped_to(
+                tz_datetime(2020, 1, 1, 11, 0, 0), tz_datetime(2020, 1, 1, 14, 0, 0)
+            )
+            .explain()
+        )
+        self.assertIn("event_occurrence_author_idx", plan)
+
+    def test_events_overlaped_to_uses_author_index(self):
+        plan = (
+            Event.objects.existing()
+            .overlaped_to(
+                tz_datetime(2020, 1, 1, 11, 0, 0),
+                tz_datetime(2020, 1, 1, 14, 0, 0),
+                author=self.user,
+            )
+            .explain()
+        )
+        self.assertIn("event_occurrence_author_idx", plan)
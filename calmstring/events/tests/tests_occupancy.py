@@ -0,0 +1,292 @@
+from datetime import date
+
+from django.core.cache import caches
+from django.test import override_settings
+from freezegun import freeze_time
+
+from .utils import TestCaseWithRooms
+from ..models import Event
+from .. import logic, occupancy, exceptions
+from utils.dates import tz_datetime
+
+
+class TestPeriodMask(TestCaseWithRooms):
+    day = date(2020, 1, 1)
+
+    def test_full_slots(self):
+        mask = occupancy.period_mask(
+            self.day, tz_datetime(2020, 1, 1, 0, 0), tz_datetime(2020, 1, 1, 0, 10)
+        )
+        self.assertEqual(mask, 0b11)
+
+    def test_partial_slots_are_rounded_outwards(self):
+        mask = occupancy.period_mask(
+            self.day, tz_datetime(2020, 1, 1, 0, 7), tz_datetime(2020, 1, 1, 0, 11)
+        )
+        self.assertEqual(mask, 0b110)
+
+    def test_empty_period_covers_its_slot(self):
+        mask = occupancy.period_mask(
+            self.day, tz_datetime(2020, 1, 1, 0, 12), tz_datetime(2020, 1, 1, 0, 12)
+        )
+        self.assertEqual(mask, 0b100)
+
+    @override_settings(CALMSTRING={"GAP_BETWEEN_EVENTS": 60 * 15})
+    def test_slot_is_gap_between_events(self):
+        mask = occupancy.period_mask(
+            self.day, tz_datetime(2020, 1, 1, 0, 0), tz_datetime(2020, 1, 1, 1, 0)
+        )
+        self.assertEqual(mask, 0b1111)
+
+    def test_split_to_days(self):
+        parts = list(
+            occupancy.split_to_days(
+                tz_datetime(2020, 1, 1, 22, 0), tz_datetime(2020, 1, 2, 2, 0)
+            )
+        )
+        self.assertEqual(
+            parts,
+            [
+                (
+                    date(2020, 1, 1),
+                    tz_datetime(2020, 1, 1, 22, 0),
+                    tz_datetime(2020, 1, 2, 0, 0),
+                ),
+                (
+                    date(2020, 1, 2),
+                    tz_datetime(2020, 1, 2, 0, 0),
+                    tz_datetime(2020, 1, 2, 2, 0),
+                ),
+            ],
+        )
+
+
+class TestMayOverlap(TestCaseWithRooms):
+    def setUp(self):
+        super().setUp()
+        self.event = self.create_event(
+            availability=Event.Availabilities.BUSY,
+            start_date=tz_datetime(2020, 1, 1, 12, 0),
+            end_date=tz_datetime(2020, 1, 1, 13, 0),
+        )
+
+    def may_overlap(self, kind, owner_id, start, end):
+        return occupancy.may_overlap(kind, owner_id, start, end)
+
+    def test_overlap(self):
+        self.assertTrue(
+            self.may_overlap(
+                occupancy.AUTHOR,
+                self.user.id,
+                tz_datetime(2020, 1, 1, 12, 30),
+                tz_datetime(2020, 1, 1, 14, 0),
+            )
+        )
+        self.assertTrue(
+            self.may_overlap(
+                occupancy.ROOM,
+                self.room1.id,
+                tz_datetime(2020, 1, 1, 11, 0),
+                tz_datetime(2020, 1, 1, 12, 5),
+            )
+        )
+
+    def test_no_overlap(self):
+        self.assertFalse(
+            self.may_overlap(
+                occupancy.AUTHOR,
+                self.user.id,
+                tz_datetime(2020, 1, 1, 13, 0),
+                tz_datetime(2020, 1, 1, 14, 0),
+            )
+        )
+        self.assertFalse(
+            self.may_overlap(
+                occupancy.ROOM,
+                self.room2.id,
+                tz_datetime(2020, 1, 1, 12, 0),
+                tz_datetime(2020, 1, 1, 13, 0),
+            )
+        )
+
+    def test_unknown_event_is_not_blocking(self):
+        self.create_event(
+            room=self.room2,
+            availability=Event.Availabilities.UNKNOWN,
+            start_date=tz_datetime(2020, 1, 1, 12, 0),
+            end_date=tz_datetime(2020, 1, 1, 13, 0),
+        )
+        self.assertFalse(
+            self.may_overlap(
+                occupancy.ROOM,
+                self.room2.id,
+                tz_datetime(2020, 1, 1, 12, 0),
+                tz_datetime(2020, 1, 1, 13, 0),
+            )
+        )
+
+    def test_bitmap_is_cached(self):
+        args = (
+            occupancy.AUTHOR,
+            self.user.id,
+            tz_datetime(2020, 1, 1, 14, 0),
+            tz_datetime(2020, 1, 1, 15, 0),
+        )
+        self.may_overlap(*args)
+
+        with self.assertNumQueries(0):
+            self.assertFalse(self.may_overlap(*args))
+
+
+class TestOccupancyInvalidation(TestCaseWithRooms):
+    def assertMayOverlap(self, kind, owner_id, start, end, expected=True):
+        self.assertEqual(occupancy.may_overlap(kind, owner_id, start, end), expected)
+
+    def test_occupy_created(self):
+        start = tz_datetime(2020, 1, 1, 12, 0)
+        end = tz_datetime(2020, 1, 1, 13, 0)
+        self.assertMayOverlap(occupancy.AUTHOR, self.user.id, start, end, False)
+
+        logic.occupy_room(self.room1, self.user, start, end, emit_external_signals=False)
+
+        self.assertMayOverlap(occupancy.AUTHOR, self.user.id, start, end)
+        with self.assertRaises(exceptions.OverlapedEventExists):
+            logic.occupy_room(
+                self.room2, self.user, start, end, emit_external_signals=False
+            )
+
+    def test_occupy_deleted(self):
+        start = tz_datetime(2020, 1, 1, 12, 0)
+        end = tz_datetime(2020, 1, 1, 13, 0)
+        event = logic.occupy_room(
+            self.room1, self.user, start, end, emit_external_signals=False
+        )
+        self.assertMayOverlap(occupancy.ROOM, self.room1.id, start, end)
+
+        logic.delete_occupy_room(event, self.user, emit_external_signals=False)
+
+        self.assertMayOverlap(occupancy.ROOM, self.room1.id, start, end, False)
+
+    def test_adjacent_slot_is_confirmed_in_database(self):
+        logic.occupy_room(
+            self.room1,
+            self.user,
+            tz_datetime(2020, 1, 1, 12, 0),
+            tz_datetime(2020, 1, 1, 12, 2),
+            emit_external_signals=False,
+        )
+
+        # both events share 12:00 - 12:05 slot, but don't overlap
+        event = logic.occupy_room(
+            self.room2,
+            self.user,
+            tz_datetime(2020, 1, 1, 12, 3),
+            tz_datetime(2020, 1, 1, 12, 10),
+            emit_external_signals=False,
+        )
+        self.assertIsNotNone(event.id)
+
+    @freeze_time("2020-01-01 07:00:00")
+    def test_recurring_occurrences_set(self):
+        self.assertMayOverlap(
+            occupancy.ROOM,
+            self.room1.id,
+            tz_datetime(2020, 1, 3, 9, 0),
+            tz_datetime(2020, 1, 3, 9, 30),
+            False,
+        )
+
+        logic.report_unavailable(
+            self.room1,
+            self.user,
+            tz_datetime(2020, 1, 1, 8, 0),
+            tz_datetime(2020, 1, 1, 10, 0),
+            recurrences=self.clean_recurrence("RRULE:FREQ=DAILY"),
+            emit_external_signals=False,
+        )
+
+        self.assertMayOverlap(
+            occupancy.ROOM,
+            self.room1.id,
+            tz_datetime(2020, 1, 3, 9, 0),
+            tz_datetime(2020, 1, 3, 9, 30),
+        )
+
+    def test_event_moved(self):
+        start = tz_datetime(2020, 1, 1, 12, 0)
+        end = tz_datetime(2020, 1, 1, 13, 0)
+        event = self.create_event(
+            availability=Event.Availabilities.BUSY, start_date=start, end_date=end
+        )
+        self.assertMayOverlap(occupancy.ROOM, self.room1.id, start, end)
+        self.assertMayOverlap(occupancy.AUTHOR, self.user.id, start, end)
+
+        event.room = self.room2
+        event.start_date = tz_datetime(2020, 1, 2, 12, 0)
+        event.end_date = tz_datetime(2020, 1, 2, 13, 0)
+        event.save()
+
+        # days and owners the occurrence moved away from are not stale
+        self.assertMayOverlap(occupancy.ROOM, self.room1.id, start, end, False)
+        self.assertMayOverlap(occupancy.AUTHOR, self.user.id, start, end, False)
+        self.assertMayOverlap(
+            occupancy.ROOM, self.room2.id, event.start_date, event.end_date
+        )
+
+
+class TestSharedCache(TestCaseWithRooms):
+    start = tz_datetime(2020, 1, 1, 12, 0)
+    end = tz_datetime(2020, 1, 1, 13, 0)
+
+    def setUp(self):
+        super().setUp()
+        occupancy.get_cache().clear()
+        # bitmap cached by other process before the event was created there
+        occupancy.may_overlap(occupancy.AUTHOR, self.user.id, self.start, self.end)
+        self.stale = occupancy.get_cache().get_many(
+            [occupancy.cache_key(occupancy.AUTHOR, self.user.id, self.start.date())]
+        )
+        self.create_event(
+            room=self.room2,
+            availability=Event.Availabilities.BUSY,
+            start_date=self.start,
+            end_date=self.end,
+        )
+
+    def restore_stale_bitmap(self):
+        self.assertEqual(list(self.stale.values()), [0])
+        occupancy.get_cache().set_many(self.stale)
+
+    def test_local_cache_is_not_trusted(self):
+        self.assertIsInstance(caches["default"], occupancy.LOCAL_CACHE_BACKENDS)
+        self.assertFalse(occupancy.is_cache_shared())
+
+        self.restore_stale_bitmap()
+        with self.assertRaises(exceptions.OverlapedEventExists):
+            logic.occupy_room(
+                self.room1,
+                self.user,
+                self.start,
+                self.end,
+                emit_external_signals=False,
+            )
+
+    @override_settings(CALMSTRING={"OCCUPANCY_CACHE_SHARED": True})
+    def test_shared_cache_answers_without_database(self):
+        self.assertTrue(occupancy.is_cache_shared())
+        occupancy.may_overlap(
+            occupancy.AUTHOR,
+            self.user.id,
+            tz_datetime(2020, 1, 2, 12, 0),
+            tz_datetime(2020, 1, 2, 13, 0),
+        )
+
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                logic.has_overlaped_event(
+                    Event.objects.all(),
+                    self.user,
+                    tz_datetime(2020, 1, 2, 12, 0),
+                    tz_datetime(2020, 1, 2, 13, 0),
+                )
+            )
@@ -0,0 +1,60 @@
+import json
+
+from rest_framework.renderers import JSONRenderer
+from utils.dates import tz_datetime
+
+from .utils import TestCaseWithRooms
+from ..models import Event
+from ..serializers import EventSerializer, EventReadSerializer
+
+
+class TestEventReadSerializer(TestCaseWithRooms):
+    def setUp(self):
+        super().setUp()
+        self.create_event(
+            start_date=tz_datetime(2022, 1, 1, 10, 0, 0),
+            availability=Event.Availabilities.BUSY,
+            name=None,
+        )
+        self.create_event(
+            room=self.room2,
+            user=self.superuser,
+            start_date=tz_datetime(2022, 1, 2, 10, 0, 0),
+            end_date=tz_datetime(2022, 1, 2, 12, 0, 0),
+            availability=Event.Availabilities.UNAVAILABLE,
+            is_recurring=True,
+            recurrences=self.clean_recurrence("RRULE:FREQ=WEEKLY;BYDAY=SU"),
+        )
+        Event.objects.filter(author=self.superuser).update(author=None)
+
+    def render(self, data):
+        return json.loads(JSONRenderer().render(data))
+
+    def test_same_as_event_serializer(self):
+        events = Event.objects.order_by("id")
+
+        self.assertEqual(
+            self.render(
+                EventReadSerializer(
+                    EventReadSerializer.setup_queryset(events), many=True
+                ).data
+            ),
+            self.render(EventSerializer(events, many=True).data),
+        )
+
+    def test_expansion_state_not_exposed(self):
+        events = Event.objects.order_by("id")
+        rows = EventReadSerializer(
+            EventReadSerializer.setup_queryset(events), many=True
+        ).data
+
+        for data in [*rows, *EventSerializer(events, many=True).data]:
+            self.assertIn("occurrences", data)
+            self.assertNotIn("occurrences_until", data)
+            self.assertNotIn("occurrences_cursor", data)
+
+    def test_queries(self):
+        with self.assertNumQueries(1):
+            EventReadSerializer(
+                EventReadSerializer.setup_queryset(Event.objects.all()), many=True
+            ).data
@@ -0,0 +1,284 @@
+from datetime import date, datetime, timedelta
+import threading
+from unittest import mock
+
+from django.test import override_settings
+from django.utils import timezone
+from freezegun import freeze_time
+from huey.contrib.djhuey import HUEY
+from huey.exceptions import TaskLockedException
+
+from utils import outbox
+from utils.cache import local_store
+from utils.dates import tz_datetime
+
+from .utils import TestCaseWithRooms, TestCaseForHuey
+from ..models import Event, EventOccurrence, EventRoom
+from .. import logic, tasks
+
+
+class TestCoalescedTasks(TestCaseWithRooms, TestCaseForHuey):
+    def setUp(self):
+        super().setUp()
+        HUEY.immediate = False
+
+    def tearDown(self):
+        HUEY.flush()
+        HUEY.immediate = True
+        return super().tearDown()
+
+    def pending(self, task):
+        return [
+            pending
+            for pending in HUEY.pending()
+            if pending.name == task.func.__name__ and not HUEY.is_revoked(pending)
+        ]
+
+    @freeze_time("2020-01-01 07:00:00")
+    def test_duplicates_collapse(self):
+        for _ in range(3):
+            tasks.enqueue_coalesced(tasks.call_set_room_transitions, self.room1.id)
+        tasks.enqueue_coalesced(tasks.call_set_room_transitions, self.room2.id)
+
+        scheduled = self.pending(tasks.call_set_room_transitions)
+        self.assertEqual(
+            sorted(task.args for task in scheduled),
+            [(self.room1.id,), (self.room2.id,)],
+        )
+        self.assertScheduleEtaEqual(scheduled[0], tz_datetime(2020, 1, 1, 7, 0, 2))
+
+    @freeze_time("2020-01-01 07:00:00")
+    def test_enqueued_again_after_start(self):
+        tasks.enqueue_coalesced(tasks.call_set_room_transitions, self.room1.id)
+        tasks.call_set_room_transitions.call_local(self.room1.id)
+
+        tasks.enqueue_coalesced(tasks.call_set_room_transitions, self.room1.id)
+
+        self.assertEqual(len(self.pending(tasks.call_set_room_transitions)), 2)
+
+    def test_stale_marker(self):
+        with freeze_time("2020-01-01 07:00:00"):
+            tasks.enqueue_coalesced(tasks.call_set_room_transitions, self.room1.id)
+
+        with freeze_time("2020-01-01 08:00:00"):
+            tasks.enqueue_coalesced(tasks.call_set_room_transitions, self.room1.id)
+
+        self.assertEqual(len(self.pending(tasks.call_set_room_transitions)), 2)
+
+    @freeze_time("2020-01-01 07:00:00")
+    def test_enqueued_after_commit_in_outbox(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with outbox.outbox():
+                tasks.enqueue_coalesced(tasks.call_set_room_transitions, self.room1.id)
+                self.assertEqual(self.pending(tasks.call_set_room_transitions), [])
+
+        self.assertEqual(len(self.pending(tasks.call_set_room_transitions)), 1)
+
+    @freeze_time("2020-01-01 07:00:00")
+    def test_repeated_edits_enqueue_once(self):
+        event = logic.occupy_room(
+            self.room1,
+            self.user,
+            tz_datetime(2020, 1, 1, 9, 0, 0),
+            tz_datetime(2020, 1, 1, 10, 0, 0),
+            emit_external_signals=False,
+        )
+        for minute in range(1, 4):
+            logic.edit_occupy_room(
+                event,
+                self.user,
+                end_date=tz_datetime(2020, 1, 1, 10, minute, 0),
+                emit_external_signals=False,
+            )
+
+        self.assertEqual(len(self.pending(tasks.call_set_room_transitions)), 1)
+
+    @freeze_time("2020-01-01 07:00:00")
+    def test_revert_enqueues_once_per_room(self):
+        for hour in (9, 11):
+            logic.occupy_room(
+                self.room1,
+                self.user,
+                tz_datetime(2020, 1, 1, hour, 0, 0),
+                tz_datetime(2020, 1, 1, hour + 1, 0, 0),
+                emit_internal_signals=False,
+            )
+        HUEY.flush()
+
+        with freeze_time("2020-01-01 08:00:00"):
+            logic.revert_events_to(tz_datetime(2020, 1, 1, 6, 0, 0), self.user)
+
+        self.assertEqual(
+            [task.args for task in self.pending(tasks.call_set_room_transitions)],
+            [(self.room1.id,)],
+        )
+
+
+@override_settings(CALMSTRING={"ROOM_TASK_SLOTS": 2})
+class TestRoomSlots(TestCaseWithRooms, TestCaseForHuey):
+    def setUp(self):
+        super().setUp()
+        HUEY.immediate = False
+
+    def tearDown(self):
+        HUEY.flush()
+        HUEY.immediate = True
+        return super().tearDown()
+
+    def test_group_by_room_slot(self):
+        self.assertEqual(tasks.group_by_room_slot([1, 2, 3, 4]), {1: [1, 3], 0: [2, 4]})
+
+    def test_enqueued_once_per_slot(self):
+        tasks.enqueue_by_room_slot(tasks.call_set_event_room_availability, [1, 2, 3])
+
+        self.assertEqual(sorted(task.args for task in HUEY.pending()), [(1, 3), (2,)])
+
+    def test_room_tasks_are_serialized(self):
+        with tasks.room_slots_lock([self.room1.id]):
+            with self.assertRaises(TaskLockedException):
+                tasks.call_set_event_room_availability.call_local(self.room1.id)
+
+            # rooms of other slot are not blocked
+            self.assertNotEqual(
+                tasks.get_room_slot(self.room1.id), tasks.get_room_slot(self.room2.id)
+            )
+            tasks.call_set_event_room_availability.call_local(self.room2.id)
+
+    def test_locked_task_is_retried(self):
+        with tasks.room_slots_lock([self.room1.id]):
+            HUEY.execute(tasks.call_set_event_room_availability.s(self.room1.id))
+
+        retried = HUEY.scheduled()
+        self.assertEqual(len(retried), 1)
+        self.assertEqual(retried[0].args, (self.room1.id,))
+
+
+class TestRoomSlotsImmediate(TestCaseWithRooms, TestCaseForHuey):
+    def test_waits_for_lock(self):
+        lock = HUEY.lock_task(f"events:room-slot:{tasks.get_room_slot(self.room1.id)}")
+        lock.__enter__()
+        # slot is held by concurrent request until the timer releases it
+        timer = threading.Timer(0.2, lock.clear)
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+        EventRoom.objects.filter(id=self.room1.id).update(
+            availability=EventRoom.Availabilities.UNKNOWN
+        )
+        tasks.call_set_event_room_availability(self.room1.id)
+
+        self.room1.refresh_from_db()
+        self.assertEqual(self.room1.availability, EventRoom.Availabilities.FREE)
+        self.assertEqual(HUEY.scheduled(), [])
+
+    @mock.patch.object(tasks, "ROOM_SLOT_RETRIES", 0)
+    def test_runs_without_lock_held_too_long(self):
+        with tasks.room_slots_lock([self.room1.id]):
+            with self.assertLogs("events.tasks", "WARNING"):
+                with tasks.room_slots_lock([self.room1.id]):
+                    pass
+
+
+class TestTransitionsTick(TestCaseWithRooms, TestCaseForHuey):
+    def setUp(self):
+        super().setUp()
+        local_store.flushall()
+        HUEY.immediate = False
+
+    def tearDown(self):
+        HUEY.flush()
+        HUEY.immediate = True
+        local_store.flushall()
+        return super().tearDown()
+
+    def pending_etas(self):
+        return [
+            task.eta
+            for task in HUEY.pending()
+            if task.name == tasks.tick_room_transitions.func.__name__
+            and not HUEY.is_revoked(task)
+        ]
+
+    @freeze_time("2020-01-01 07:00:00")
+    def test_replaced_only_by_earlier_tick(self):
+        tasks.schedule_room_transitions_tick(tz_datetime(2020, 1, 1, 10, 0))
+        # worker which computed later transition keeps the earlier tick
+        tasks.schedule_room_transitions_tick(tz_datetime(2020, 1, 1, 11, 0))
+        tasks.schedule_room_transitions_tick(tz_datetime(2020, 1, 1, 10, 0))
+        self.assertEqual(self.pending_etas(), [datetime(2020, 1, 1, 10, 0)])
+
+        tasks.schedule_room_transitions_tick(tz_datetime(2020, 1, 1, 9, 0))
+        self.assertEqual(self.pending_etas(), [datetime(2020, 1, 1, 9, 0)])
+
+    def test_replaced_after_run(self):
+        with freeze_time("2020-01-01 07:00:00"):
+            tasks.schedule_room_transitions_tick(tz_datetime(2020, 1, 1, 9, 0))
+
+        with freeze_time("2020-01-01 09:00:00"):
+            tasks.schedule_room_transitions_tick(tz_datetime(2020, 1, 1, 12, 0))
+
+        self.assertEqual(
+            self.pending_etas(),
+            [datetime(2020, 1, 1, 9, 0), datetime(2020, 1, 1, 12, 0)],
+        )
+
+
+class TestOccurrencesChain(TestCaseWithRooms, TestCaseForHuey):
+    def setUp(self):
+        super().setUp()
+        HUEY.immediate = False
+        # created earlier in the day than its start time
+        with freeze_time("2020-01-01 06:00:00"):
+            self.event = self.create_event(
+                availability=Event.Availabilities.UNAVAILABLE,
+                start_date=tz_datetime(2020, 1, 1, 8, 0, 0),
+                end_date=tz_datetime(2020, 1, 1, 12, 0, 0),
+                is_recurring=True,
+                recurrences=self.clean_recurrence("RRULE:FREQ=DAILY"),
+            )
+
+    def tearDown(self):
+        HUEY.flush()
+        HUEY.immediate = True
+        super().tearDown()
+
+    def test_late_ticks_are_incremental(self):
+        with freeze_time("2020-01-01 06:00:00"):
+            tasks.call_set_event_occurrences.call_local(self.event.id)
+
+        with mock.patch.object(
+            Event,
+            "extend_occurrences",
+            autospec=True,
+            side_effect=Event.extend_occurrences,
+        ) as extend_occurrences:
+            # queue runs every tick a bit later past its eta than the previous one
+            for latency in [3, 8, 13]:
+                (tick,) = [
+                    task
+                    for task in HUEY.pending()
+                    if task.name == tasks.call_set_event_occurrences.func.__name__
+                ]
+                HUEY.flush()
+                with freeze_time(tick.eta + timedelta(seconds=latency)):
+                    tasks.call_set_event_occurrences.call_local(*tick.args)
+
+        self.assertEqual(extend_occurrences.call_count, 3)
+
+        self.event.refresh_from_db()
+        occurrences = self.event.prepare_occurrences_from_db()
+        self.assertEqual(
+            occurrences,
+            [
+                date(2020, 1, 22) + timedelta(days=day)
+                for day in range(len(occurrences))
+            ],
+        )
+        self.assertEqual(occurrences[-1], date(2020, 1, 30))
+        self.assertEqual(
+            sorted(
+                occurrence.start_date.date()
+                for occurrence in EventOccurrence.objects.filter(event=self.event)
+            ),
+            occurrences,
+        )
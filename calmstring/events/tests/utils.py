@@ -2,22 +2,27 @@ from .deps import create_room
 from ..models import EventRoom, Event
 from utils.for_tests import TestCaseWithUsers
 from recurrence.fields import RecurrenceField
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.utils import timezone
 from huey.contrib.djhuey import HUEY
 
 from ..models import Event
-from .. import logic
+from .. import logic, occupancy
 from utils.dates import tz_datetime
+from utils.cache import local_store
 
 
 def create_event_room(name, description=""):
     return EventRoom.objects.create(room=create_room(name, description))
 
 
+@override_settings(REDIS_URL=None)
 class TestCaseWithRooms(TestCaseWithUsers):
     def setUp(self):
         super().setUp()
+        # cached values outlive rolled back test data
+        occupancy.get_cache().clear()
+        local_store.flushall()
         self.room1 = create_event_room(
             name="Test room 1",
             description="Test room 1 description",
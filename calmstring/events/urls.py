@@ -1,7 +1,13 @@
 from django.urls import path, include
 from rest_framework import routers
 
-from .views import EventsListAPIView, OccupyRoomViewset, EventUnavailableRoomViewset
+from .views import (
+    EventsListAPIView,
+    FreeRoomsAPIView,
+    EventsHistoryAPIView,
+    OccupyRoomViewset,
+    EventUnavailableRoomViewset,
+)
 
 router = routers.DefaultRouter()
 router.register(r"occupy", OccupyRoomViewset, basename="OccupyRoomViewset")
@@ -14,5 +20,7 @@ router.register(
 
 urlpatterns = [
     path("", EventsListAPIView.as_view(), name="EventsListAPIView"),
+    path("free-rooms/", FreeRoomsAPIView.as_view(), name="FreeRoomsAPIView"),
+    path("history/", EventsHistoryAPIView.as_view(), name="EventsHistoryAPIView"),
     # "reports/" POST
 ] + router.urls
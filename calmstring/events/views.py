@@ -1,18 +1,26 @@
+from django.http import StreamingHttpResponse
 from django.utils.translation import gettext_lazy as _
 from rest_framework import viewsets, generics, status, mixins
+from rest_framework.utils import encoders
 from rest_framework.response import Response
 from rest_framework.decorators import action
 
 from .serializers import (
     EventSerializer,
+    EventReadSerializer,
     OccupyRoomSerializer,
     OccupyRoomEditSerializer,
     OccupyRoomFreeSerializer,
     ReportSerializer,
     EventUnavailableSerializer,
     EventUnavailableEditSerializer,
+    FreeRoomsSearchSerializer,
+    FreeRoomSerializer,
+    EventsHistorySearchSerializer,
+    RoomEventsHistorySerializer,
 )
 from .filters import EventListFilter
+from .pagination import EventsCursorPagination
 from .permissions import IsEventAuthor
 
 from accounts.permissions import (
@@ -27,22 +35,82 @@ from utils.api.views import LogicAPIView
 from .models import Event
 from . import logic, exceptions
 
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
 class EventsListAPIView(generics.ListAPIView):
+    """Filtered events list, paginated by cursor.
+    With ?stream=1 all filtered events are streamed as NDJSON, one event per line.
+    """
 
     queryset = Event.objects.all().existing()
-    serializer_class = EventSerializer
+    serializer_class = EventReadSerializer
     filterset_class = EventListFilter
+    pagination_class = EventsCursorPagination
     permission_classes = [IsLimitedUser]
 
-    def list(self, request):
-        queryset = self.get_queryset()
-        serializers = self.get_serializer_class()(queryset, many=True)
-        return Response(serializers.data)
+    STREAM_CHUNK_SIZE = 500
+
+    def get_queryset(self):
+        return self.get_serializer_class().setup_queryset(super().get_queryset())
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params.get("stream") in ["1", "true"]:
+            return self.stream()
+
+        return super().list(request, *args, **kwargs)
+
+    def stream(self):
+        queryset = self.filter_queryset(self.get_queryset()).order_by(
+            *self.pagination_class.ordering
+        )
+        serializer_class = self.get_serializer_class()
+
+        def lines():
+            for event in queryset.iterator(chunk_size=self.STREAM_CHUNK_SIZE):
+                data = serializer_class(event).data
+                yield json.dumps(data, cls=encoders.JSONEncoder) + "\n"
+
+        return StreamingHttpResponse(lines(), content_type="application/x-ndjson")
+
+
+class FreeRoomsAPIView(generics.GenericAPIView):
+    """Rooms free for <duration> seconds between <start_date> and <end_date>"""
+
+    serializer_class = FreeRoomSerializer
+    permission_classes = [IsLimitedUser]
+
+    def get(self, request):
+        search = FreeRoomsSearchSerializer(data=request.query_params)
+        search.is_valid(raise_exception=True)
+
+        found = logic.find_free_rooms(**search.validated_data)
+
+        return Response(self.get_serializer(found, many=True).data)
+
+
+class EventsHistoryAPIView(generics.GenericAPIView):
+    """Events of rooms (or of <room>) as they were <at>, reconstructed from change log"""
+
+    serializer_class = RoomEventsHistorySerializer
+    permission_classes = [IsCompetitiveUser]
+
+    def get(self, request):
+        search = EventsHistorySearchSerializer(data=request.query_params)
+        search.is_valid(raise_exception=True)
+
+        room = search.validated_data.get("room")
+        rooms_events = logic.get_rooms_events_at(
+            search.validated_data["at"], rooms=[room] if room else None
+        )
+
+        data = [
+            {"room": room, "events": events} for room, events in rooms_events.items()
+        ]
+        return Response(self.get_serializer(data, many=True).data)
 
 
 class EventLogicViewBase:
@@ -1,6 +1,7 @@
 from .models import Room
 from . import signals as room_signals
 from utils.logic import signals_emiter
+from utils.constant import AvailabilitiesBase
 
 
 def create_room(name, description, **kwargs):
@@ -12,3 +13,24 @@ def create_room(name, description, **kwargs):
     signals_emiter(internal_signals, None, **kwargs)
 
     return room
+
+
+def get_rooms_availability():
+    """Returns all rooms with their availability, joined in single query
+
+    Returns:
+        list: [{"uuid", "name", "availability", "events_room_uuid"}, ...]
+    """
+    rooms = Room.objects.order_by("name").values_list(
+        "uuid", "name", "events_room__availability", "events_room__uuid"
+    )
+
+    return [
+        {
+            "uuid": uuid,
+            "name": name,
+            "availability": availability or AvailabilitiesBase.UNKNOWN,
+            "events_room_uuid": events_room_uuid,
+        }
+        for uuid, name, availability, events_room_uuid in rooms
+    ]
@@ -3,6 +3,7 @@ from rest_framework.reverse import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from utils.for_tests import TestCaseWithUsers
+from .. import logic
 
 
 class TestRoomsViewSet(TestCaseWithUsers):
@@ -19,3 +20,50 @@ class TestRoomsViewSet(TestCaseWithUsers):
             {"name": self.room_name, "description": self.room_description},
         )
         self.assertTrue(status.is_success(response.status_code))
+
+    def test_create_room_response(self):
+        from events.models import EventRoom
+
+        self.client.force_authenticate(user=self.administrative_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("RoomsViewSet-list"),
+                {"name": self.room_name, "description": self.room_description},
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        event_room = EventRoom.objects.get(room__name=self.room_name)
+        self.assertEqual(response.data["events_room_uuid"], event_room.uuid)
+        self.assertEqual(response.data["availability"], event_room.availability)
+
+    def create_rooms(self):
+        from events.models import EventRoom
+
+        for i in range(3):
+            logic.create_room(f"Room {i}", "")
+        EventRoom.objects.filter(room__name="Room 0").update(
+            availability=EventRoom.Availabilities.BUSY
+        )
+
+    def test_list_queries(self):
+        self.create_rooms()
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("RoomsViewSet-list"))
+
+        self.assertEqual(len(response.data), 3)
+
+    def test_availability(self):
+        self.create_rooms()
+        self.client.force_authenticate(user=self.user)
+
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("RoomsViewSet-availability"))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [(room["name"], room["availability"]) for room in response.data],
+            [("Room 0", "BUSY"), ("Room 1", "UNKNOWN"), ("Room 2", "UNKNOWN")],
+        )
+        self.assertIsNotNone(response.data[0]["events_room_uuid"])
@@ -1,4 +1,5 @@
 from rest_framework import mixins, viewsets, status
+from rest_framework.decorators import action
 from rest_framework.response import Response
 from . import logic, serializers, models
 from utils.api.views import LogicAPIView
@@ -14,7 +15,8 @@ class RoomsViewSet(
 ):
     serializer_class = serializers.RoomSerializer
     lookup_field = "uuid"
-    queryset = models.Room.objects.all()
+    # serializer reads availability through events_room
+    queryset = models.Room.objects.select_related("events_room")
 
     def get_permissions(self):
         if self.action == "create":
@@ -35,3 +37,8 @@ class RoomsViewSet(
         data = self.get_serializer_class()(room).data
 
         return Response(data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["get"])
+    def availability(self, request, *args, **kwargs):
+        """Compact list of all rooms with their availability, read in one query"""
+        return Response(logic.get_rooms_availability())
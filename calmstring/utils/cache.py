@@ -0,0 +1,261 @@
+from contextlib import contextmanager
+import json
+import sqlite3
+import threading
+import time
+
+from django.conf import settings
+from huey.storage import SqliteStorage
+import redis
+
+
+class StoreError(Exception):
+    """Error of hash store which isn't redis (e.g. locked sqlite database)"""
+
+
+# errors callers of get_hash_store() catch to fall back when store is unavailable
+STORE_ERRORS = (redis.exceptions.RedisError, StoreError)
+
+
+class LocalHashStore:
+    """In-process replacement of the subset of redis client used for hash caches:
+    hget, hset, hgetall, hincrbyfloat, expire and delete, plus set_if_earlier(). Used when REDIS_URL is not
+    configured and tasks run in place.
+    """
+
+    def __init__(self):
+        self._hashes = {}
+        self._expires = {}
+        self._lock = threading.Lock()
+
+    def _get_hash(self, name):
+        expires = self._expires.get(name)
+        if expires is not None and expires <= time.monotonic():
+            self._hashes.pop(name, None)
+            self._expires.pop(name, None)
+        return self._hashes.get(name)
+
+    def hget(self, name, key):
+        with self._lock:
+            return (self._get_hash(name) or {}).get(str(key))
+
+    def hset(self, name, key, value):
+        with self._lock:
+            if self._get_hash(name) is None:
+                self._hashes[name] = {}
+            self._hashes[name][str(key)] = value
+            return 1
+
+    def hgetall(self, name):
+        with self._lock:
+            return dict(self._get_hash(name) or {})
+
+    def hincrbyfloat(self, name, key, amount=1.0):
+        with self._lock:
+            if self._get_hash(name) is None:
+                self._hashes[name] = {}
+            value = float(self._hashes[name].get(str(key), 0)) + amount
+            self._hashes[name][str(key)] = str(value)
+            return value
+
+    def set_if_earlier(self, name, key, value, now):
+        with self._lock:
+            if self._get_hash(name) is None:
+                self._hashes[name] = {}
+            current = self._hashes[name].get(str(key))
+            if keeps_pending(current, value, now):
+                return False, json.loads(current)
+            self._hashes[name][str(key)] = json.dumps(value)
+            return True, json.loads(current) if current else None
+
+    def expire(self, name, seconds):
+        with self._lock:
+            if self._get_hash(name) is None:
+                return False
+            self._expires[name] = time.monotonic() + seconds
+            return True
+
+    def delete(self, *names):
+        with self._lock:
+            deleted = 0
+            for name in names:
+                deleted += self._hashes.pop(name, None) is not None
+                self._expires.pop(name, None)
+            return deleted
+
+    def flushall(self):
+        with self._lock:
+            self._hashes.clear()
+            self._expires.clear()
+
+
+class SqliteHashStore:
+    """The same subset of redis client kept in kv table of huey sqlite storage, so
+    hashes are shared by web processes and consumer when REDIS_URL is not configured.
+    Every hash is single row, read and written in exclusive transaction. Sqlite
+    errors (e.g. database locked by consumer) are raised as StoreError.
+    """
+
+    PREFIX = "hash:"
+
+    def __init__(self, storage: SqliteStorage):
+        self.storage = storage
+
+    @contextmanager
+    def _db(self, commit=False):
+        try:
+            with self.storage.db(commit=commit) as curs:
+                yield curs
+        except sqlite3.Error as error:
+            raise StoreError(str(error)) from error
+
+    def _read(self, curs, name):
+        curs.execute(
+            "select value from kv where queue = ? and key = ?",
+            (self.storage.name, self.PREFIX + name),
+        )
+        row = curs.fetchone()
+        if row is None:
+            return None
+
+        data = json.loads(bytes(row[0]))
+        if data["expires"] is not None and data["expires"] <= time.time():
+            return None
+        return data
+
+    def _write(self, curs, name, data):
+        curs.execute(
+            "insert or replace into kv (queue, key, value) values (?, ?, ?)",
+            (self.storage.name, self.PREFIX + name, json.dumps(data).encode()),
+        )
+
+    def _update(self, name, update):
+        with self._db(commit=True) as curs:
+            data = self._read(curs, name) or {"expires": None, "fields": {}}
+            result = update(data)
+            self._write(curs, name, data)
+        return result
+
+    def hget(self, name, key):
+        return self.hgetall(name).get(str(key))
+
+    def hset(self, name, key, value):
+        def update(data):
+            data["fields"][str(key)] = value
+            return 1
+
+        return self._update(name, update)
+
+    def hgetall(self, name):
+        with self._db() as curs:
+            data = self._read(curs, name)
+        return data["fields"] if data else {}
+
+    def hincrbyfloat(self, name, key, amount=1.0):
+        def update(data):
+            value = float(data["fields"].get(str(key), 0)) + amount
+            data["fields"][str(key)] = str(value)
+            return value
+
+        return self._update(name, update)
+
+    def set_if_earlier(self, name, key, value, now):
+        def update(data):
+            current = data["fields"].get(str(key))
+            if keeps_pending(current, value, now):
+                return False, json.loads(current)
+            data["fields"][str(key)] = json.dumps(value)
+            return True, json.loads(current) if current else None
+
+        return self._update(name, update)
+
+    def expire(self, name, seconds):
+        with self._db(commit=True) as curs:
+            data = self._read(curs, name)
+            if data is None:
+                return False
+            data["expires"] = time.time() + seconds
+            self._write(curs, name, data)
+            return True
+
+    def delete(self, *names):
+        deleted = 0
+        with self._db(commit=True) as curs:
+            for name in names:
+                curs.execute(
+                    "delete from kv where queue = ? and key = ?",
+                    (self.storage.name, self.PREFIX + name),
+                )
+                deleted += curs.rowcount
+        return deleted
+
+
+def keeps_pending(current, value, now) -> bool:
+    """Tells if stored json <current> with "eta" in the future not later than eta of
+    <value> is kept"""
+    if not current:
+        return False
+    eta = json.loads(current)["eta"]
+    return now < eta <= value["eta"]
+
+
+# the same check as keeps_pending() in single redis step
+SET_IF_EARLIER_SCRIPT = """
+local current = redis.call("hget", KEYS[1], ARGV[1])
+if current then
+    local eta = tonumber(cjson.decode(current)["eta"])
+    if tonumber(ARGV[3]) < eta and eta <= tonumber(ARGV[2]) then
+        return {0, current}
+    end
+end
+redis.call("hset", KEYS[1], ARGV[1], ARGV[4])
+return {1, current or ""}
+"""
+
+
+def set_if_earlier(store, name, key, value: dict, now: float):
+    """Atomically sets json <value> under <key> of hash, unless the stored value has
+    "eta" in the future which is not later than "eta" of <value>.
+
+    Returns:
+        (bool, dict|None): True when value was set and previously stored value
+    """
+    if not isinstance(store, redis.Redis):
+        return store.set_if_earlier(name, key, value, now)
+
+    is_set, current = store.eval(
+        SET_IF_EARLIER_SCRIPT, 1, name, key, value["eta"], now, json.dumps(value)
+    )
+    return bool(is_set), json.loads(current) if current else None
+
+
+local_store = LocalHashStore()
+_redis_clients = {}
+_sqlite_stores = {}
+
+
+def get_shared_fallback_store():
+    """Returns store kept in huey sqlite storage when tasks run in consumer, so it's
+    shared with it, or process local store when tasks run in place."""
+    from huey.contrib.djhuey import HUEY
+
+    if HUEY.immediate or not isinstance(HUEY.storage, SqliteStorage):
+        return local_store
+
+    if HUEY.storage not in _sqlite_stores:
+        _sqlite_stores[HUEY.storage] = SqliteHashStore(HUEY.storage)
+    return _sqlite_stores[HUEY.storage]
+
+
+def get_hash_store(url=None):
+    """Returns redis client of <url> (defaults to REDIS_URL setting). When no url is
+    set, hashes are kept in huey sqlite storage if tasks run in consumer, otherwise
+    in process local store. Clients are created once per url.
+    """
+    url = url or getattr(settings, "REDIS_URL", None)
+    if not url:
+        return get_shared_fallback_store()
+
+    if url not in _redis_clients:
+        _redis_clients[url] = redis.Redis.from_url(url, decode_responses=True)
+    return _redis_clients[url]
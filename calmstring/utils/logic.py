@@ -1,3 +1,6 @@
+from . import outbox
+
+
 def signals_emiter(
     internal=None,
     external=None,
@@ -7,6 +10,8 @@ def signals_emiter(
     **kwargs,
 ):
     """Function that takes internal and external callbacks and calls them.
+    Internal callbacks are called right away, inside outbox() block external ones are
+    called after the transaction commits.
 
     Args:
         internal (_type_, optional): _description_. Defaults to None.
@@ -23,7 +28,7 @@ def signals_emiter(
         return None
 
     if emit_external_signals and emit_signals and external:
-        external()
+        outbox.emit(external)
 
     if emit_internal_signals and emit_signals and internal:
         internal()
@@ -0,0 +1,77 @@
+"""Outbox of outward side effects made inside a transaction.
+
+External signals of signals_emiter (Change rows) and task enqueues emitted inside
+outbox() block are not called right away, they are collected and called with
+transaction.on_commit() once the transaction commits, in the order they were emitted,
+so rolled back writes never produce Change rows or tasks. Internal signals run
+synchronously, so results of their handlers (e.g. EventRoom of created room) are
+available to the view which emitted them. When the block runs inside outer atomic() the callbacks wait for commit
+of the outer transaction and are dropped when it's rolled back. All callbacks of a
+block are flushed in single transaction, so writes done by signal handlers are
+committed together. Outside of outbox() block callbacks are called immediately.
+
+Blocks may be nested, emissions of inner block are dropped when it's rolled back and
+otherwise handed to the outer one.
+"""
+
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+_local = threading.local()
+
+
+def get_stack() -> list:
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+@contextmanager
+def outbox(using=None):
+    stack = get_stack()
+    emissions = []
+    stack.append(emissions)
+    with transaction.atomic(using=using):
+        try:
+            yield
+        finally:
+            stack.pop()
+
+        if stack:
+            stack[-1].extend(emissions)
+        elif emissions:
+            # registered inside the block, so it's dropped with rolled back savepoint
+            transaction.on_commit(lambda: flush(emissions, using=using), using=using)
+
+
+def emit(callback):
+    """Calls callback now or queues it in the innermost outbox() block"""
+    stack = get_stack()
+    if not stack:
+        return callback()
+    stack[-1].append(callback)
+
+
+def flush(emissions, using=None):
+    with transaction.atomic(using=using):
+        for callback in emissions:
+            callback()
+
+
+class OutboxMiddleware:
+    """Wraps requests with unsafe methods in outbox() block. The block is atomic, so
+    such requests run in single transaction as with ATOMIC_REQUESTS."""
+
+    SAFE_METHODS = ("GET", "HEAD", "OPTIONS", "TRACE")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method in self.SAFE_METHODS:
+            return self.get_response(request)
+
+        with outbox():
+            return self.get_response(request)
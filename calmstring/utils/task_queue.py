@@ -0,0 +1,115 @@
+"""Huey classes of task pipeline: priority lanes and execution metrics.
+
+Consumer takes tasks with higher priority first, so room availability is never
+queued behind occurrence expansion or emails. Each task executed by consumer adds
+its duration and queue latency (time between enqueue or eta and start of execution)
+to per task totals in hash store shared by all processes (redis or huey sqlite
+storage, see utils.cache.get_hash_store), so they are read by `task_metrics` command.
+"""
+
+import logging
+import time
+
+from huey import MemoryHuey, SqliteHuey, PriorityRedisHuey
+
+from .cache import STORE_ERRORS, get_hash_store
+
+logger = logging.getLogger(__name__)
+
+
+class Priorities:
+    AVAILABILITY = 30
+    OCCURRENCES = 20
+    EMAIL = 10
+
+
+METRICS_KEY = "tasks:metrics"
+
+
+def enqueued_key(task_id) -> str:
+    return f"tasks:enqueued:{task_id}"
+
+
+def record_task_metrics(name: str, duration: float, latency: float = None):
+    logger.info(
+        "Task %s executed in %0.3fs, %s in queue",
+        name,
+        duration,
+        "unknown" if latency is None else "%0.3fs" % latency,
+    )
+    try:
+        store = get_hash_store()
+        store.hincrbyfloat(METRICS_KEY, f"{name}:count", 1)
+        store.hincrbyfloat(METRICS_KEY, f"{name}:duration", duration)
+        if latency is not None:
+            store.hincrbyfloat(METRICS_KEY, f"{name}:latency_count", 1)
+            store.hincrbyfloat(METRICS_KEY, f"{name}:latency", latency)
+    except STORE_ERRORS:
+        logger.exception("Can't record task metrics")
+
+
+def get_task_metrics() -> dict:
+    """Returns {task name: {"count", "avg_duration", "avg_latency"}} of executed tasks"""
+    totals = {}
+    for field, value in get_hash_store().hgetall(METRICS_KEY).items():
+        name, metric = field.rsplit(":", 1)
+        totals.setdefault(name, {})[metric] = float(value)
+
+    return {
+        name: {
+            "count": int(total["count"]),
+            "avg_duration": total["duration"] / total["count"],
+            "avg_latency": (
+                total["latency"] / total["latency_count"]
+                if total.get("latency_count")
+                else None
+            ),
+        }
+        for name, total in totals.items()
+        if total.get("count")
+    }
+
+
+def reset_task_metrics():
+    get_hash_store().delete(METRICS_KEY)
+
+
+class MetricsMixin:
+    """Records timing metrics of tasks executed by consumer, tasks executed in place
+    by immediate huey are not recorded."""
+
+    def enqueue(self, task):
+        # scheduled tasks are measured from their eta
+        if not self.immediate and task.eta is None:
+            self.put(enqueued_key(task.id), time.time())
+        return super().enqueue(task)
+
+    def get_queue_latency(self, task):
+        if task.eta is not None:
+            return (self._get_timestamp() - task.eta).total_seconds()
+
+        enqueued_at = self.get(enqueued_key(task.id))
+        return None if enqueued_at is None else time.time() - enqueued_at
+
+    def _execute(self, task, timestamp):
+        if self.immediate:
+            return super()._execute(task, timestamp)
+
+        latency = self.get_queue_latency(task)
+        start = time.monotonic()
+        try:
+            return super()._execute(task, timestamp)
+        finally:
+            record_task_metrics(task.name, time.monotonic() - start, latency)
+
+
+class MetricsMemoryHuey(MetricsMixin, MemoryHuey):
+    pass
+
+
+class MetricsSqliteHuey(MetricsMixin, SqliteHuey):
+    pass
+
+
+class MetricsPriorityRedisHuey(MetricsMixin, PriorityRedisHuey):
+    pass
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from huey import SqliteHuey
+from huey.storage import SqliteStorage
+
+from ..cache import (
+    LocalHashStore,
+    SqliteHashStore,
+    StoreError,
+    get_hash_store,
+    local_store,
+    set_if_earlier,
+)
+
+
+class SetIfEarlierMixin:
+    def test_set_if_earlier(self):
+        def set(eta, now=0):
+            return set_if_earlier(self.store, "hash", "key", {"eta": eta}, now)
+
+        self.assertEqual(set(10), (True, None))
+        self.assertEqual(set(20), (False, {"eta": 10}))
+        self.assertEqual(set(10), (False, {"eta": 10}))
+        self.assertEqual(set(5), (True, {"eta": 10}))
+        # stored eta has passed
+        self.assertEqual(set(20, now=5), (True, {"eta": 5}))
+
+
+class TestLocalHashStore(SetIfEarlierMixin, SimpleTestCase):
+    def setUp(self):
+        self.store = LocalHashStore()
+
+    def test_hset_hget(self):
+        self.store.hset("hash", 1, "value")
+
+        self.assertEqual(self.store.hget("hash", 1), "value")
+        self.assertIsNone(self.store.hget("hash", 2))
+        self.assertIsNone(self.store.hget("other", 1))
+
+    def test_delete(self):
+        self.store.hset("hash", "key", "value")
+
+        self.assertEqual(self.store.delete("hash", "other"), 1)
+        self.assertIsNone(self.store.hget("hash", "key"))
+
+    def test_expire(self):
+        self.store.hset("hash", "key", "value")
+        self.store.expire("hash", 0)
+
+        self.assertIsNone(self.store.hget("hash", "key"))
+
+    @override_settings(REDIS_URL=None)
+    def test_local_store_without_redis_url(self):
+        self.assertIs(get_hash_store(), local_store)
+
+    def test_hincrbyfloat_hgetall(self):
+        self.store.hincrbyfloat("hash", "key", 1)
+        self.store.hincrbyfloat("hash", "key", 0.5)
+
+        self.assertEqual(self.store.hgetall("hash"), {"key": "1.5"})
+        self.assertEqual(self.store.hgetall("other"), {})
+
+
+class TestSqliteHashStore(SetIfEarlierMixin, SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "huey.db")
+        self.store = self.create_store()
+
+    def create_store(self):
+        return SqliteHashStore(SqliteStorage("huey", filename=self.filename))
+
+    def test_shared_by_stores_of_same_file(self):
+        other = self.create_store()
+
+        self.store.hset("hash", 1, "value")
+        self.assertEqual(other.hget("hash", 1), "value")
+        self.assertIsNone(other.hget("hash", 2))
+
+        other.delete("hash")
+        self.assertIsNone(self.store.hget("hash", 1))
+
+    def test_expire(self):
+        self.assertFalse(self.store.expire("hash", 10))
+        self.store.hset("hash", "key", "value")
+        self.store.expire("hash", 0)
+
+        self.assertIsNone(self.store.hget("hash", "key"))
+        self.assertEqual(self.store.hgetall("hash"), {})
+
+    def test_sqlite_errors_raised_as_store_error(self):
+        with mock.patch.object(
+            self.store.storage,
+            "db",
+            side_effect=sqlite3.OperationalError("database is locked"),
+        ):
+            with self.assertRaises(StoreError):
+                self.store.hset("hash", "key", "value")
+            with self.assertRaises(StoreError):
+                self.store.hget("hash", "key")
+
+    def test_hincrbyfloat_hgetall(self):
+        self.store.hincrbyfloat("hash", "key", 1)
+        self.create_store().hincrbyfloat("hash", "key", 0.5)
+
+        self.assertEqual(self.store.hgetall("hash"), {"key": "1.5"})
+
+    @override_settings(REDIS_URL=None)
+    def test_used_when_tasks_run_in_consumer(self):
+        huey = SqliteHuey(filename=self.filename, immediate=False)
+
+        with mock.patch("huey.contrib.djhuey.HUEY", huey):
+            store = get_hash_store()
+            self.assertIsInstance(store, SqliteHashStore)
+            self.assertIs(get_hash_store(), store)
+
+            huey.immediate = True
+            self.assertIs(get_hash_store(), local_store)
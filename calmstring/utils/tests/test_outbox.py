@@ -0,0 +1,96 @@
+from django.db import transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase
+
+from ..logic import signals_emiter
+from ..outbox import outbox, OutboxMiddleware
+
+
+class TestOutbox(TestCase):
+    def setUp(self):
+        self.emitted = []
+
+    def emitter(self, value):
+        return lambda: self.emitted.append(value)
+
+    def test_emitted_immediately_outside_block(self):
+        signals_emiter(self.emitter("internal"), self.emitter("external"))
+
+        self.assertEqual(self.emitted, ["external", "internal"])
+
+    def test_emitted_after_block(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with outbox():
+                signals_emiter(None, self.emitter("external"))
+                signals_emiter(None, self.emitter("second"))
+                self.assertEqual(self.emitted, [])
+
+        self.assertEqual(self.emitted, ["external", "second"])
+
+    def test_internal_emitted_immediately_in_block(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with outbox():
+                signals_emiter(self.emitter("internal"), self.emitter("external"))
+                self.assertEqual(self.emitted, ["internal"])
+
+        self.assertEqual(self.emitted, ["internal", "external"])
+
+    def test_dropped_on_rollback(self):
+        with self.assertRaises(ValueError):
+            with outbox():
+                signals_emiter(None, self.emitter("external"))
+                raise ValueError()
+
+        self.assertEqual(self.emitted, [])
+
+    def test_nested_block(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with outbox():
+                signals_emiter(None, self.emitter("outer"))
+
+                with outbox():
+                    signals_emiter(None, self.emitter("inner"))
+                self.assertEqual(self.emitted, [])
+
+                try:
+                    with outbox():
+                        signals_emiter(None, self.emitter("rolled back"))
+                        raise ValueError()
+                except ValueError:
+                    pass
+
+        self.assertEqual(self.emitted, ["outer", "inner"])
+
+    def test_waits_for_outer_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(ValueError):
+                with transaction.atomic():
+                    with outbox():
+                        signals_emiter(None, self.emitter("rolled back"))
+                    # the block has exited but outer transaction is not committed
+                    self.assertEqual(self.emitted, [])
+                    raise ValueError()
+
+            with transaction.atomic():
+                with outbox():
+                    signals_emiter(None, self.emitter("committed"))
+                self.assertEqual(self.emitted, [])
+
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.emitted, ["committed"])
+
+    def test_middleware(self):
+        def view(request):
+            signals_emiter(None, self.emitter(request.method))
+            # POST emission waits for the end of request, GET one is immediate
+            self.assertEqual(
+                self.emitted, [] if request.method == "POST" else ["POST", "GET"]
+            )
+            return HttpResponse()
+
+        middleware = OutboxMiddleware(view)
+        with self.captureOnCommitCallbacks(execute=True):
+            middleware(RequestFactory().post("/"))
+        middleware(RequestFactory().get("/"))
+
+        self.assertEqual(self.emitted, ["POST", "GET"])
@@ -0,0 +1,90 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from huey.contrib.djhuey import HUEY, db_task
+
+from accounts.tasks import send_verification_email
+from ..cache import local_store
+from ..task_queue import Priorities, get_task_metrics
+
+
+@db_task(priority=Priorities.EMAIL)
+def low_priority_task():
+    pass
+
+
+@db_task(priority=Priorities.AVAILABILITY)
+def high_priority_task():
+    pass
+
+
+@override_settings(REDIS_URL=None)
+class TestTaskQueue(TestCase):
+    def setUp(self):
+        local_store.flushall()
+        HUEY.immediate = False
+
+    def tearDown(self):
+        HUEY.flush()
+        HUEY.immediate = True
+        local_store.flushall()
+
+    def test_higher_priority_first(self):
+        low_priority_task()
+        high_priority_task()
+
+        self.assertEqual(HUEY.dequeue().name, high_priority_task.func.__name__)
+        self.assertEqual(HUEY.dequeue().name, low_priority_task.func.__name__)
+
+    def test_metrics_recorded(self):
+        low_priority_task()
+        HUEY.execute(HUEY.dequeue())
+
+        metrics = get_task_metrics()[low_priority_task.func.__name__]
+        self.assertEqual(metrics["count"], 1)
+        self.assertGreaterEqual(metrics["avg_duration"], 0)
+        self.assertGreaterEqual(metrics["avg_latency"], 0)
+
+    def test_scheduled_latency_from_eta(self):
+        task = low_priority_task.s()
+        task.eta = HUEY._get_timestamp() - timedelta(seconds=30)
+        HUEY.execute(task)
+
+        metrics = get_task_metrics()[low_priority_task.func.__name__]
+        self.assertGreaterEqual(metrics["avg_latency"], 30)
+
+    def test_immediate_tasks_not_recorded(self):
+        HUEY.immediate = True
+        low_priority_task()
+
+        self.assertEqual(get_task_metrics(), {})
+
+    def test_task_metrics_command(self):
+        low_priority_task()
+        HUEY.execute(HUEY.dequeue())
+
+        output = StringIO()
+        call_command("task_metrics", "--reset", stdout=output)
+
+        (row,) = [
+            line
+            for line in output.getvalue().splitlines()
+            if line.startswith(low_priority_task.func.__name__)
+        ]
+        self.assertEqual(row.split()[1], "1")
+        self.assertEqual(get_task_metrics(), {})
+
+        output = StringIO()
+        call_command("task_metrics", stdout=output)
+        self.assertIn("No tasks executed", output.getvalue())
+
+    def test_verification_email_is_enqueued(self):
+        send_verification_email("user@example.com", "123456")
+
+        self.assertEqual(len(mail.outbox), 0)
+        HUEY.execute(HUEY.dequeue())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("123456", mail.outbox[0].body)